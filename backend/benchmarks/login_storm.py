@@ -0,0 +1,79 @@
+"""
+AfroMarket UK - Login Storm Benchmark
+Compares inline bcrypt against the pooled PasswordService under a burst of logins
+
+Measures how long the event loop is frozen (max heartbeat lag) and how many
+logins are rejected by admission control.
+
+Usage:
+    python benchmarks/login_storm.py --logins 50 --rounds 12
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from password_service import PasswordService  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Tick every interval and return the worst observed scheduling delay"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_storm(login, logins: int):
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    worst_lag = await beat
+    rejected = sum(1 for r in results if isinstance(r, HTTPException) and r.status_code == 503)
+    ok = sum(1 for r in results if r is True or (isinstance(r, tuple) and r[0]))
+    return elapsed, worst_lag, ok, rejected
+
+
+async def main(args):
+    password = "correct horse battery staple"
+    stored = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=args.rounds)).decode()
+
+    async def inline_login():
+        return bcrypt.checkpw(password.encode(), stored.encode())
+
+    print(f"Login storm: {args.logins} concurrent logins, bcrypt cost {args.rounds}")
+
+    elapsed, lag, ok, rejected = await run_storm(inline_login, args.logins)
+    print(f"  inline bcrypt : {elapsed:6.2f}s total, max loop lag {lag * 1000:8.1f} ms, ok={ok}")
+
+    service = PasswordService(rounds=args.rounds, workers=args.workers, max_pending=args.queue)
+    await service.verify_password(password, stored)  # start the pool outside the measurement
+
+    elapsed, lag, ok, rejected = await run_storm(lambda: service.verify_password(password, stored), args.logins)
+    print(f"  process pool  : {elapsed:6.2f}s total, max loop lag {lag * 1000:8.1f} ms, ok={ok}, "
+          f"rejected={rejected} (workers={service.workers}, queue={service.max_pending})")
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--queue", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
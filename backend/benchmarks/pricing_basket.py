@@ -0,0 +1,82 @@
+"""
+AfroMarket UK - Basket Pricing Benchmark
+Times the server-side pricing pass for large multi-vendor baskets
+
+Products and vendors are generated in memory, so this measures the pricing
+engine itself (validation, weights, per-vendor delivery quotes, discounts,
+commission) without Firestore. In production the engine adds two batched
+reads (products, vendors), whatever the basket size.
+
+Usage:
+    python benchmarks/pricing_basket.py --lines 100 --vendors 10 --iterations 2000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing_service import normalize_items, price_basket  # noqa: E402
+
+POSTCODES = ["E1 6AN", "M1 1AD", "B1 2HN", "LS1 4AP", "G1 1XQ", "CF10 1EP", "BS1 4DJ", "NG1 5FS"]
+WEIGHTS = ["250g", "400g", "500g", "1kg", "1.5kg", "2kg", "1L", "1 Kit"]
+
+
+def make_basket(lines: int, vendor_count: int):
+    rng = random.Random(42)
+    vendors = {
+        f"vendor-{v}": {
+            "id": f"vendor-{v}",
+            "business_name": f"Vendor {v}",
+            "postcode": rng.choice(POSTCODES),
+            "tier": rng.choice(["basic", "professional", "elite"])
+        }
+        for v in range(vendor_count)
+    }
+    products = {
+        f"product-{i}": {
+            "id": f"product-{i}",
+            "name": f"Product {i}",
+            "price": round(rng.uniform(0.99, 24.99), 2),
+            "weight": rng.choice(WEIGHTS),
+            "vendor_id": f"vendor-{i % vendor_count}",
+            "stock": 500,
+            "in_stock": True
+        }
+        for i in range(lines)
+    }
+    items = [{"productId": product_id, "quantity": rng.randint(1, 4)} for product_id in products]
+    return items, products, vendors
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def main(args):
+    items, products, vendors = make_basket(args.lines, args.vendors)
+
+    print(f"Basket pricing: {args.lines} lines from {args.vendors} vendors, {args.iterations} iterations")
+    for label, kwargs in [
+        ("standard", {}),
+        ("plus member", {"membership_tier": "plus"}),
+    ]:
+        samples = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            priced = price_basket(normalize_items(items), products, vendors, "SW1A 1AA", "express", **kwargs)
+            samples.append(time.perf_counter() - started)
+        print(f"  {label:20s}: p50 {percentile(samples, 0.5) * 1000:6.3f} ms, "
+              f"p95 {percentile(samples, 0.95) * 1000:6.3f} ms, total £{priced.total:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--vendors", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2000)
+    main(parser.parse_args())
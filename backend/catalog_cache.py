@@ -0,0 +1,130 @@
+"""
+Product Catalog Cache for AfroMarket UK
+Process-local snapshot of the product catalog shared by in-memory indexes
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# How long a snapshot is served before it is reloaded from Firestore.
+# Other workers only learn about product changes through this TTL.
+CATALOG_TTL_SECONDS = int(os.environ.get('CATALOG_TTL_SECONDS', '60'))
+
+# Upper bound on products pulled into memory
+CATALOG_MAX_PRODUCTS = int(os.environ.get('CATALOG_MAX_PRODUCTS', '20000'))
+
+
+class CatalogCache:
+    """Holds the full product list in memory and reloads it when stale"""
+
+    def __init__(self, loader: Callable[[int], Awaitable[List[Dict]]] = None,
+                 ttl_seconds: int = CATALOG_TTL_SECONDS):
+        self._loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._products: List[Dict] = []
+        self._loaded_at = 0.0
+        self._dirty = True
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable] = []
+        self.version = 0
+
+    def set_loader(self, loader: Callable[[int], Awaitable[List[Dict]]]) -> None:
+        """Set the coroutine used to fetch products (called with a limit)"""
+        self._loader = loader
+        self._dirty = True
+
+    def _is_stale(self) -> bool:
+        return self._dirty or (time.monotonic() - self._loaded_at) > self.ttl_seconds
+
+    async def get_products(self) -> List[Dict]:
+        """Get the current catalog snapshot, reloading it if stale"""
+        if not self._is_stale():
+            return self._products
+
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if not self._is_stale():
+                return self._products
+
+            if self._loader is None:
+                return self._products
+
+            try:
+                products = await self._loader(CATALOG_MAX_PRODUCTS)
+            except Exception as e:
+                # Keep serving the previous snapshot rather than failing requests
+                logger.error(f"Failed to reload product catalog: {e}")
+                self._loaded_at = time.monotonic()
+                return self._products
+
+            self._products = products or []
+            self._loaded_at = time.monotonic()
+            self._dirty = False
+            self.version += 1
+            logger.info(f"Product catalog loaded: {len(self._products)} products (v{self.version})")
+            return self._products
+
+    def add_listener(self, listener: Callable) -> None:
+        """
+        Register a callback for single-product changes
+
+        Called as listener(product, version, product_id=...) where product
+        is None for deletions. Indexes use it to update incrementally
+        instead of rebuilding from the whole snapshot.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, product: Optional[Dict], product_id: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(product, self.version, product_id=product_id)
+            except Exception as e:
+                logger.error(f"Catalog listener failed for product {product_id}: {e}")
+
+    def upsert_product(self, product: Dict) -> None:
+        """Patch a created or updated product into the snapshot"""
+        product_id = product.get('id')
+        if not product_id:
+            self.invalidate()
+            return
+
+        for i, existing in enumerate(self._products):
+            if existing.get('id') == product_id:
+                self._products[i] = {**existing, **product}
+                product = self._products[i]
+                break
+        else:
+            self._products.append(product)
+
+        self.version += 1
+        self._notify(product, product_id)
+
+    def remove_product(self, product_id: str) -> None:
+        """Drop a deleted product from the snapshot"""
+        self._products = [p for p in self._products if p.get('id') != product_id]
+        self.version += 1
+        self._notify(None, product_id)
+
+    def invalidate(self) -> None:
+        """Force a reload on the next read"""
+        self._dirty = True
+
+    def get_cached(self) -> List[Dict]:
+        """Get the snapshot without triggering a reload"""
+        return self._products
+
+
+# Singleton instance
+_catalog_cache: Optional[CatalogCache] = None
+
+def get_catalog_cache() -> CatalogCache:
+    """Get CatalogCache singleton instance"""
+    global _catalog_cache
+    if _catalog_cache is None:
+        _catalog_cache = CatalogCache()
+    return _catalog_cache
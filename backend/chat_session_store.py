@@ -0,0 +1,224 @@
+"""
+Chat Session Store for AfroMarket UK
+Bounded AfroBot conversation histories with optional Firestore sharing
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+from google.cloud.firestore_v1 import transactional
+
+logger = logging.getLogger(__name__)
+
+# Sessions idle longer than this are dropped
+CHAT_SESSION_TTL_SECONDS = int(os.environ.get('CHAT_SESSION_TTL_SECONDS', '3600'))
+# Most sessions kept in memory per worker
+CHAT_SESSION_MAX_SESSIONS = int(os.environ.get('CHAT_SESSION_MAX_SESSIONS', '5000'))
+# Hard cap on memory used by histories per worker
+CHAT_SESSION_MAX_BYTES = int(os.environ.get('CHAT_SESSION_MAX_BYTES', str(32 * 1024 * 1024)))
+# Token budget for the history kept per session
+CHAT_HISTORY_MAX_TOKENS = int(os.environ.get('CHAT_HISTORY_MAX_TOKENS', '1500'))
+# "memory" (default) or "firestore" to share sessions across workers and restarts
+CHAT_SESSION_BACKEND = os.environ.get('CHAT_SESSION_BACKEND', 'memory')
+
+# Rough per-message bookkeeping overhead in bytes
+_MESSAGE_OVERHEAD = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token for English text)"""
+    return len(text or '') // 4 + 1
+
+
+def trim_history(history: List[Dict[str, str]], max_tokens: int = CHAT_HISTORY_MAX_TOKENS) -> List[Dict[str, str]]:
+    """Keep the most recent messages that fit in the token budget"""
+    total = 0
+    keep = 0
+    for msg in reversed(history):
+        total += estimate_tokens(msg.get('content', ''))
+        if total > max_tokens:
+            break
+        keep += 1
+    trimmed = history[len(history) - keep:] if keep else []
+    # Don't start a history with an orphaned assistant reply
+    if trimmed and trimmed[0].get('role') == 'assistant':
+        trimmed = trimmed[1:]
+    return trimmed
+
+
+def _history_bytes(history: List[Dict[str, str]]) -> int:
+    return sum(len(m.get('content', '')) + _MESSAGE_OVERHEAD for m in history)
+
+
+class InMemorySessionStore:
+    """LRU + TTL session store with a hard memory cap"""
+
+    def __init__(self, ttl_seconds: int = CHAT_SESSION_TTL_SECONDS,
+                 max_sessions: int = CHAT_SESSION_MAX_SESSIONS,
+                 max_bytes: int = CHAT_SESSION_MAX_BYTES,
+                 max_tokens: int = CHAT_HISTORY_MAX_TOKENS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        # session_id -> (history, last_access, size_bytes)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Oldest entries sit at the front, so expired ones are found first
+        while self._sessions:
+            session_id, (_, last_access, _) = next(iter(self._sessions.items()))
+            over_limit = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not over_limit and now - last_access <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    async def get(self, session_id: str) -> List[Dict[str, str]]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return []
+        history, last_access, size = entry
+        if time.monotonic() - last_access > self.ttl_seconds:
+            self._drop(session_id)
+            return []
+        self._sessions[session_id] = (history, time.monotonic(), size)
+        self._sessions.move_to_end(session_id)
+        return list(history)
+
+    async def set(self, session_id: str, history: List[Dict[str, str]]) -> None:
+        history = trim_history(history, self.max_tokens)
+        self._drop(session_id)
+        size = _history_bytes(history)
+        self._sessions[session_id] = (history, time.monotonic(), size)
+        self._bytes += size
+        self._evict()
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        history = await self.get(session_id)
+        await self.set(session_id, history + messages)
+
+    async def delete(self, session_id: str) -> None:
+        self._drop(session_id)
+
+    def get_stats(self) -> dict:
+        return {
+            'backend': 'memory',
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
+
+class FirestoreSessionStore:
+    """
+    Sessions persisted in the chat_sessions collection
+
+    Firestore is the source of truth: every read goes to it so a worker
+    sees turns written by other workers, and appends run in a transaction
+    that re-reads, extends and trims the stored history so concurrent
+    writers never overwrite each other's turns. The in-memory store only
+    holds the last history each worker saw, used when Firestore fails.
+    """
+
+    COLLECTION = 'chat_sessions'
+
+    def __init__(self, db, ttl_seconds: int = CHAT_SESSION_TTL_SECONDS):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.local = InMemorySessionStore(ttl_seconds=ttl_seconds)
+
+    def _ref(self, session_id: str):
+        return self.db.collection(self.COLLECTION).document(session_id)
+
+    def _live_messages(self, snapshot) -> List[Dict[str, str]]:
+        if not snapshot.exists:
+            return []
+        data = snapshot.to_dict() or {}
+        if time.time() > data.get('expires_at', 0):
+            return []
+        return data.get('messages', [])
+
+    async def get(self, session_id: str) -> List[Dict[str, str]]:
+        try:
+            snapshot = await asyncio.to_thread(self._ref(session_id).get)
+        except Exception as e:
+            logger.error(f"Failed to load chat session {session_id}: {e}")
+            return await self.local.get(session_id)
+        history = self._live_messages(snapshot)
+        await self.local.set(session_id, history)
+        return history
+
+    async def set(self, session_id: str, history: List[Dict[str, str]]) -> None:
+        await self.local.set(session_id, history)
+        trimmed = await self.local.get(session_id)
+        try:
+            await asyncio.to_thread(
+                self._ref(session_id).set,
+                {'messages': trimmed, 'expires_at': time.time() + self.ttl_seconds}
+            )
+        except Exception as e:
+            logger.error(f"Failed to save chat session {session_id}: {e}")
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        try:
+            history = await asyncio.to_thread(self._append, session_id, messages)
+        except Exception as e:
+            logger.error(f"Failed to append to chat session {session_id}: {e}")
+            await self.local.append(session_id, messages)
+            return
+        await self.local.set(session_id, history)
+
+    def _append(self, session_id: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        ref = self._ref(session_id)
+
+        @transactional
+        def run(transaction):
+            snapshot = next(iter(self.db.get_all([ref], transaction=transaction)))
+            history = trim_history(self._live_messages(snapshot) + messages, self.local.max_tokens)
+            transaction.set(ref, {'messages': history, 'expires_at': time.time() + self.ttl_seconds})
+            return history
+
+        return run(self.db.transaction())
+
+    async def delete(self, session_id: str) -> None:
+        await self.local.delete(session_id)
+        try:
+            await asyncio.to_thread(self.db.collection(self.COLLECTION).document(session_id).delete)
+        except Exception as e:
+            logger.error(f"Failed to delete chat session {session_id}: {e}")
+
+    def get_stats(self) -> dict:
+        return {**self.local.get_stats(), 'backend': 'firestore'}
+
+
+# Singleton instance
+_session_store = None
+
+def get_session_store():
+    """Get the configured chat session store"""
+    global _session_store
+    if _session_store is None:
+        if CHAT_SESSION_BACKEND == 'firestore':
+            from firestore_db import get_firestore_client
+            db = get_firestore_client()
+            if db is not None:
+                _session_store = FirestoreSessionStore(db)
+            else:
+                logger.warning("Firestore unavailable - chat sessions kept in memory")
+        if _session_store is None:
+            _session_store = InMemorySessionStore()
+    return _session_store
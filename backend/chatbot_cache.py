@@ -0,0 +1,281 @@
+"""
+AfroBot Response Cache for AfroMarket UK
+Reuses LLM replies for repeated first-turn questions, matching near-duplicates with MinHash
+"""
+
+import os
+import re
+import time
+import random
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How long a cached reply may be served
+CHAT_CACHE_TTL_SECONDS = int(os.environ.get('CHAT_CACHE_TTL_SECONDS', '21600'))
+# Most replies kept per worker
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', '2000'))
+# Minimum word-set Jaccard similarity for a near-duplicate question to reuse a reply
+CHAT_CACHE_SIMILARITY = float(os.environ.get('CHAT_CACHE_SIMILARITY', '0.8'))
+# Longer questions are too specific to be worth caching
+CHAT_CACHE_MAX_QUESTION_CHARS = 300
+
+# MinHash signature layout: NUM_BANDS * ROWS_PER_BAND hash functions
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+
+_STOPWORDS = {
+    'a', 'an', 'the', 'i', 'me', 'my', 'you', 'your', 'we', 'our', 'is', 'are', 'am', 'do', 'does',
+    'can', 'could', 'would', 'will', 'to', 'of', 'in', 'on', 'for', 'with', 'about', 'it', 'and',
+    'or', 'please', 'tell', 'what', 'how', 'be', 'this', 'that', 'there', 'some', 'any', 'hi',
+    'hello', 'hey', 'thanks', 'thank'
+}
+
+# Questions carrying personal details are never cached or served from cache
+_PERSONAL_RE = re.compile(r'@|\bAFM-?(?:[A-Z0-9]{13}|[A-Z0-9]{8})\b|\b\d{5,}\b', re.IGNORECASE)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240607)
+_HASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_BANDS * ROWS_PER_BAND)
+]
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation (keeping £ amounts) and collapse whitespace"""
+    text = (text or '').lower().replace('’', "'")
+    text = re.sub(r"[^a-z0-9£.' ]+", ' ', text)
+    text = re.sub(r"(?<![0-9])\.|\.(?![0-9])|'", ' ', text)
+    return ' '.join(text.split())
+
+
+def question_terms(normalized: str) -> FrozenSet[str]:
+    """Content words of a normalized question"""
+    return frozenset(t for t in normalized.split() if t not in _STOPWORDS)
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big')
+
+
+def minhash(terms: FrozenSet[str]) -> Tuple[int, ...]:
+    hashes = [_token_hash(t) for t in terms]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _HASH_PARAMS
+    )
+
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [
+        (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        for band in range(NUM_BANDS)
+    ]
+
+
+def _entity_terms(terms: FrozenSet[str]) -> FrozenSet[str]:
+    # Amounts and postcodes change the answer, so they must match exactly
+    return frozenset(t for t in terms if any(c.isdigit() for c in t))
+
+
+class _Entry:
+    __slots__ = ('key', 'reply', 'terms', 'entities', 'bands', 'expires_at')
+
+    def __init__(self, key: str, reply: str, terms: FrozenSet[str], bands, expires_at: float):
+        self.key = key
+        self.reply = reply
+        self.terms = terms
+        self.entities = _entity_terms(terms)
+        self.bands = bands
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of first-turn AfroBot replies
+
+    Exact matches are looked up by normalized text. Near-duplicates are
+    found through MinHash LSH buckets and confirmed with the exact Jaccard
+    similarity of their content words. Entries are tied to a fingerprint of
+    the system prompt and model, and the whole cache is dropped when a
+    product's price or stock status changes, including changes picked up
+    when the catalog snapshot reloads.
+    """
+
+    def __init__(self, ttl_seconds: int = CHAT_CACHE_TTL_SECONDS,
+                 max_entries: int = CHAT_CACHE_MAX_ENTRIES,
+                 similarity: float = CHAT_CACHE_SIMILARITY):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._fingerprint = ''
+        # product_id -> (price, in_stock) as of catalog version _catalog_version
+        self._prices: Dict[str, tuple] = {}
+        self._catalog_version: Optional[int] = None
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---- invalidation ----
+
+    def set_fingerprint(self, *parts: str) -> None:
+        """Drop all entries when the system prompt or model changes"""
+        fingerprint = hashlib.sha256('\x00'.join(parts).encode()).hexdigest()
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                logger.info("AfroBot prompt changed - clearing response cache")
+            self._fingerprint = fingerprint
+            self.clear()
+
+    def clear(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._buckets.clear()
+
+    @staticmethod
+    def _price_state(product: dict) -> tuple:
+        return product.get('price'), product.get('in_stock', True)
+
+    def sync_catalog(self, products: List[dict], version: int) -> None:
+        """
+        Compare price and stock state with a catalog snapshot
+
+        Called before lookups. Reloads (TTL expiry, or changes made by other
+        workers) bump the catalog version without notifying listeners, so
+        the snapshot is diffed against the state the cache was built on and
+        the cache is cleared if any product was added, removed or changed.
+        """
+        if version == self._catalog_version:
+            return
+        prices = {p['id']: self._price_state(p) for p in products if p.get('id')}
+        if prices != self._prices:
+            self.clear()
+        self._prices = prices
+        self._catalog_version = version
+
+    def on_product_changed(self, product: Optional[dict], version: int, product_id: str = None) -> None:
+        """Catalog listener - replies quote prices and stock, so changing either clears the cache"""
+        if self._catalog_version is None or version != self._catalog_version + 1:
+            # Not seeded yet, or a reload happened in between - sync_catalog diffs the whole snapshot
+            return
+        product_id = product_id or (product or {}).get('id')
+        old_state = self._prices.get(product_id)
+        if product is None:
+            self._prices.pop(product_id, None)
+            new_state = None
+        else:
+            new_state = self._price_state(product)
+            self._prices[product_id] = new_state
+        if old_state != new_state:
+            self.clear()
+        self._catalog_version = version
+
+    # ---- lookups ----
+
+    @staticmethod
+    def is_cacheable(message: str) -> bool:
+        return 0 < len(message or '') <= CHAT_CACHE_MAX_QUESTION_CHARS and not _PERSONAL_RE.search(message)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() > entry.expires_at:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, message: str) -> Optional[str]:
+        """Cached reply for this question or a near-duplicate of it"""
+        if not self.is_cacheable(message):
+            return None
+        normalized = normalize_question(message)
+        key = f"{self._fingerprint}:{normalized}"
+
+        entry = self._live(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.reply
+
+        terms = question_terms(normalized)
+        if terms:
+            entities = _entity_terms(terms)
+            candidates = set()
+            for band in _bands(minhash(terms)):
+                candidates |= self._buckets.get(band, set())
+            best, best_score = None, self.similarity
+            for candidate_key in candidates:
+                candidate = self._entries.get(candidate_key)
+                if candidate is None or candidate.entities != entities:
+                    continue
+                score = len(terms & candidate.terms) / len(terms | candidate.terms)
+                if score >= best_score:
+                    best, best_score = candidate_key, score
+            if best is not None and self._live(best) is not None:
+                self.hits += 1
+                self.similar_hits += 1
+                return self._entries[best].reply
+
+        self.misses += 1
+        return None
+
+    def put(self, message: str, reply: str) -> None:
+        if not reply or not self.is_cacheable(message):
+            return
+        normalized = normalize_question(message)
+        terms = question_terms(normalized)
+        key = f"{self._fingerprint}:{normalized}"
+        self._remove(key)
+
+        bands = _bands(minhash(terms)) if terms else []
+        self._entries[key] = _Entry(key, reply, terms, bands, time.monotonic() + self.ttl_seconds)
+        for band in bands:
+            self._buckets.setdefault(band, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+# Singleton instance
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Get ResponseCache singleton instance"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,299 @@
+"""
+AfroBot Intent Router for AfroMarket UK
+Answers common questions locally (delivery, order tracking, contact, catalog)
+so only open-ended questions are sent to the LLM
+"""
+
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from delivery_service import get_delivery_service, get_postcode_area, is_known_postcode_area, FREE_DELIVERY_THRESHOLD
+from chatbot_retrieval import find_products
+
+logger = logging.getLogger(__name__)
+
+# Minimum TF-IDF cosine similarity for a local answer
+INTENT_THRESHOLD = 0.45
+# Lower bar used when a strong signal (postcode) is also present
+INTENT_THRESHOLD_WITH_ENTITY = 0.2
+
+SUPPORT_EMAIL = "sotubodammy@gmail.com"
+
+# Current 13-character order numbers, or legacy 8-character ones
+ORDER_ID_RE = re.compile(r'\bAFM-?([A-Z0-9]{13}|[A-Z0-9]{8})\b', re.IGNORECASE)
+POSTCODE_RE = re.compile(r'\b([A-Z]{1,2}[0-9][A-Z0-9]?)(?:\s*([0-9][A-Z]{2}))?\b', re.IGNORECASE)
+AMOUNT_RE = re.compile(r'£\s*(\d+(?:\.\d{1,2})?)')
+
+_STOPWORDS = {
+    'a', 'an', 'the', 'i', 'me', 'my', 'you', 'your', 'we', 'our', 'is', 'are', 'am', 'do', 'does',
+    'can', 'could', 'would', 'to', 'of', 'in', 'on', 'for', 'with', 'about', 'it', 'and', 'or',
+    'please', 'tell', 'what', 'how', 'be', 'this', 'that', 'there', 'some', 'any', 'need'
+}
+
+# Example utterances per intent; the quick-reply texts from the chat widget come first
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    'delivery': [
+        "Tell me about your delivery options",
+        "How much is delivery",
+        "delivery cost shipping price",
+        "how long does delivery take",
+        "is delivery free over 100",
+        "when will my order arrive delivery time",
+        "do you deliver to Scotland",
+        "next day express delivery",
+        "shipping rates and free delivery threshold",
+    ],
+    'tracking': [
+        "How can I track my order?",
+        "where is my order",
+        "track order status",
+        "has my order shipped",
+        "order tracking number",
+        "my parcel has not arrived",
+        "my order hasn't arrived yet",
+    ],
+    'support': [
+        "I need to speak with customer support",
+        "contact support email",
+        "talk to a human agent",
+        "customer service contact details",
+        "how do I contact you",
+        "complaint help with my account",
+    ],
+    'products': [
+        "What products do you have available?",
+        "what do you sell",
+        "browse products categories",
+        "what categories of food do you stock",
+        "show me your catalogue",
+    ],
+    # Never answered locally - listed so these are not mistaken for tracking
+    'order_changes': [
+        "I want to cancel my order",
+        "can I return my order",
+        "refund for my order",
+        "return a damaged item and get my money back",
+        "change or amend my order",
+        "wrong item missing item in my order",
+    ],
+}
+
+
+_SUFFIXES = ('ing', 'ery', 'er', 'ed', 'es', 's', 'y')
+
+
+def _stem(word: str) -> str:
+    """Strip one common suffix so deliver/delivery/delivered share a feature"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _tokens(text: str) -> List[str]:
+    return [_stem(t) for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in _STOPWORDS]
+
+
+class TfidfIntentClassifier:
+    """Tiny TF-IDF nearest-centroid classifier over example utterances"""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        docs = [(intent, _tokens(text)) for intent, texts in examples.items() for text in texts]
+        df = Counter(term for _, terms in docs for term in set(terms))
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1.0 for term, count in df.items()}
+
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        for intent, terms in docs:
+            centroid = self.centroids.setdefault(intent, {})
+            for term, weight in self._vector(terms).items():
+                centroid[term] = centroid.get(term, 0.0) + weight
+        for intent, centroid in self.centroids.items():
+            self.centroids[intent] = self._normalize(centroid)
+
+    @staticmethod
+    def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    def _vector(self, terms: List[str]) -> Dict[str, float]:
+        counts = Counter(t for t in terms if t in self.idf)
+        return self._normalize({t: c * self.idf[t] for t, c in counts.items()})
+
+    def classify(self, text: str) -> Tuple[Optional[str], float]:
+        vector = self._vector(_tokens(text))
+        if not vector:
+            return None, 0.0
+        best, best_score = None, 0.0
+        for intent, centroid in self.centroids.items():
+            score = sum(w * centroid.get(t, 0.0) for t, w in vector.items())
+            if score > best_score:
+                best, best_score = intent, score
+        return best, best_score
+
+
+def extract_postcode(message: str) -> Optional[str]:
+    """First UK postcode (full or outward code) whose area we deliver to"""
+    for match in POSTCODE_RE.finditer(message):
+        outward = match.group(1).upper()
+        if is_known_postcode_area(get_postcode_area(outward)):
+            return f"{outward} {match.group(2).upper()}" if match.group(2) else outward
+    return None
+
+
+class IntentRouter:
+    """Deterministic answers for common AfroBot questions"""
+
+    def __init__(self):
+        self.classifier = TfidfIntentClassifier(INTENT_EXAMPLES)
+        self.local_answers = 0
+        self.forwarded = 0
+        self.by_intent: Counter = Counter()
+
+    async def answer(self, message: str, user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Local reply for the message, or None to forward it to the LLM
+
+        user_id is the signed-in customer, if any; order statuses are only
+        given for that customer's own orders.
+        """
+        try:
+            reply, intent = await self._route(message, user_id)
+        except Exception as e:
+            logger.error(f"Intent routing failed, forwarding to LLM: {e}")
+            reply, intent = None, None
+
+        if reply is None:
+            self.forwarded += 1
+            return None
+        self.local_answers += 1
+        self.by_intent[intent] += 1
+        return reply
+
+    async def _route(self, message: str, user_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        order_match = ORDER_ID_RE.search(message)
+        if order_match:
+            if not user_id:
+                # Anonymous chats could otherwise look up anyone's order by number
+                return self._tracking_help(), 'tracking'
+            return await self._order_status(f"AFM-{order_match.group(1).upper()}", user_id), 'order_status'
+
+        intent, score = self.classifier.classify(message)
+        postcode = extract_postcode(message)
+
+        if intent == 'delivery' and postcode and score >= INTENT_THRESHOLD_WITH_ENTITY:
+            return self._delivery_quote(postcode, message), 'delivery_quote'
+        if score < INTENT_THRESHOLD:
+            return None, None
+
+        if intent == 'delivery':
+            return self._delivery_info(), intent
+        if intent == 'tracking':
+            return self._tracking_help(), intent
+        if intent == 'support':
+            return self._support(), intent
+        if intent == 'products':
+            # "What products do you have for jollof rice?" is a product question, not a catalog tour
+            if await find_products(message):
+                return None, None
+            return await self._catalog_overview(), intent
+        return None, None
+
+    # ---- answers ----
+
+    @staticmethod
+    def _delivery_quote(postcode: str, message: str) -> str:
+        amount = AMOUNT_RE.search(message)
+        subtotal = float(amount.group(1)) if amount else 0.0
+        options = get_delivery_service().get_options(postcode=postcode, subtotal=subtotal)
+
+        lines = [f"🚚 Delivery to **{postcode}** ({options['zone_name']}):"]
+        for option in options['options']:
+            cost = "FREE" if option['free'] else f"£{option['cost']:.2f}"
+            lines.append(f"• {option['name']}: {cost} ({option['estimated_days']})")
+        if options['qualifies_for_free']:
+            lines.append("Your order qualifies for FREE delivery! 🎉")
+        elif amount:
+            lines.append(f"Add £{options['amount_to_free_delivery']:.2f} more for FREE delivery.")
+        else:
+            lines.append(f"Prices are for orders up to 2kg. Orders over £{FREE_DELIVERY_THRESHOLD:.0f} get FREE delivery!")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _delivery_info() -> str:
+        zones = get_delivery_service().get_zones_info()
+        lines = [
+            f"🚚 We deliver UK-wide, and delivery is **FREE on orders over £{FREE_DELIVERY_THRESHOLD:.0f}**.",
+            "Standard delivery for smaller orders:"
+        ]
+        for zone in zones.values():
+            lines.append(f"• {zone['name']}: from £{zone['base_price']:.2f} ({zone['estimated_days']})")
+        lines.append("Express and next-day options are available at checkout. "
+                     "Send me your postcode for an exact quote!")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _tracking_help() -> str:
+        return ("📦 Please sign in and send me your order number (it starts with **AFM-** and is in "
+                "your confirmation email) and I'll check its status. You can also see all your orders "
+                "under **My Orders** when signed in.")
+
+    @staticmethod
+    def _support() -> str:
+        return (f"💬 Our support team is happy to help! Email **{SUPPORT_EMAIL}** or use the contact "
+                "form on our Help & Support page. We usually reply within 24 hours.")
+
+    @staticmethod
+    async def _order_status(order_id: str, user_id: str) -> str:
+        from firestore_db import firestore_db
+
+        order = await firestore_db.get_order_by_order_id(order_id)
+        # Someone else's order is reported as not found
+        if not order or order.get('user_id') != user_id:
+            return (f"I couldn't find an order with number **{order_id}**. Please double-check it, "
+                    f"or contact {SUPPORT_EMAIL} and we'll look into it.")
+
+        status = order.get('delivery_status') or order.get('status', 'pending')
+        lines = [f"📦 Order **{order_id}** is currently **{status.replace('_', ' ')}**."]
+        if order.get('carrier') or order.get('tracking_number'):
+            lines.append(f"Carrier: {order.get('carrier') or 'N/A'}, tracking number: {order.get('tracking_number') or 'N/A'}")
+        if order.get('estimated_delivery'):
+            lines.append(f"Estimated delivery: {order['estimated_delivery']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    async def _catalog_overview() -> Optional[str]:
+        from catalog_cache import get_catalog_cache
+
+        products = await get_catalog_cache().get_products()
+        if not products:
+            return None
+        categories = Counter(p.get('category') for p in products if p.get('category'))
+        lines = [f"🛒 We have {len(products)} authentic African products across these categories:"]
+        for category, count in categories.most_common():
+            lines.append(f"• {category} ({count})")
+        lines.append("Tell me what you're looking for and I'll point you to it!")
+        return "\n".join(lines)
+
+    def get_stats(self) -> dict:
+        total = self.local_answers + self.forwarded
+        return {
+            'local_answers': self.local_answers,
+            'forwarded_to_llm': self.forwarded,
+            'local_rate': round(self.local_answers / total, 3) if total else 0.0,
+            'by_intent': dict(self.by_intent)
+        }
+
+
+# Singleton instance
+_intent_router: Optional[IntentRouter] = None
+
+def get_intent_router() -> IntentRouter:
+    """Get IntentRouter singleton instance"""
+    global _intent_router
+    if _intent_router is None:
+        _intent_router = IntentRouter()
+    return _intent_router
@@ -0,0 +1,205 @@
+"""
+AfroBot Catalog Retrieval for AfroMarket UK
+BM25 product index used to ground AfroBot answers in live prices and stock
+"""
+
+import os
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from product_suggest import tokenize
+from chat_session_store import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Most products injected into a prompt
+CHAT_RETRIEVAL_MAX_PRODUCTS = int(os.environ.get('CHAT_RETRIEVAL_MAX_PRODUCTS', '5'))
+# Token budget for the injected product list
+CHAT_RETRIEVAL_MAX_TOKENS = int(os.environ.get('CHAT_RETRIEVAL_MAX_TOKENS', '250'))
+# Best match must score at least this much for any products to be injected
+CHAT_RETRIEVAL_MIN_SCORE = float(os.environ.get('CHAT_RETRIEVAL_MIN_SCORE', '2.0'))
+# Other matches must score within this fraction of the best one
+RELATIVE_SCORE_CUTOFF = 0.35
+# Characters of description kept per product
+DESCRIPTION_CHARS = 90
+
+# Repeating a field's words weights it more heavily in BM25
+FIELD_WEIGHTS = {'name': 3, 'brand': 2, 'category': 2, 'description': 1}
+
+_STOPWORDS = {
+    'a', 'an', 'the', 'i', 'me', 'my', 'you', 'your', 'we', 'our', 'is', 'are', 'am', 'do', 'does',
+    'can', 'could', 'would', 'will', 'to', 'of', 'in', 'on', 'for', 'with', 'about', 'it', 'and',
+    'or', 'please', 'tell', 'what', 'how', 'be', 'this', 'that', 'there', 'some', 'any', 'have',
+    'sell', 'buy', 'get', 'much', 'price', 'cost', 'stock', 'available', 'cook', 'make', 'use',
+    # Words shared by most of the catalogue carry no product signal
+    'african', 'recipe', 'recipes', 'delivery', 'free', 'order', 'uk'
+}
+
+
+def _terms(text: str) -> List[str]:
+    """Tokens with stopwords removed and simple plurals folded (oils -> oil)"""
+    terms = []
+    for token in tokenize(text):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def _document_terms(product: Dict) -> Counter:
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in _terms(product.get(field) or ''):
+            counts[term] += weight
+    return counts
+
+
+class BM25Index:
+    """Okapi BM25 over product name, brand, category and description"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._products: Dict[str, Dict] = {}
+        self._total_length = 0
+
+    @classmethod
+    def build(cls, products: List[Dict]) -> 'BM25Index':
+        index = cls()
+        for product in products:
+            index.upsert_product(product)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def upsert_product(self, product: Dict) -> None:
+        product_id = product.get('id')
+        if not product_id:
+            return
+        self.remove_product(product_id)
+        counts = _document_terms(product)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[product_id] = tf
+        length = sum(counts.values())
+        self._lengths[product_id] = length
+        self._total_length += length
+        self._products[product_id] = product
+
+    def remove_product(self, product_id: str) -> None:
+        if product_id not in self._products:
+            return
+        for term in _document_terms(self._products.pop(product_id)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(product_id, 0)
+
+    def search(self, query: str, limit: int = CHAT_RETRIEVAL_MAX_PRODUCTS) -> List[Tuple[Dict, float]]:
+        """Best matching products with their BM25 scores, highest first"""
+        n = len(self._products)
+        if not n:
+            return []
+        avg_length = self._total_length / n
+        scores: Dict[str, float] = {}
+        for term in set(_terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for product_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[product_id] / avg_length)
+                scores[product_id] = scores.get(product_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        best = ranked[0][1]
+        if best < CHAT_RETRIEVAL_MIN_SCORE:
+            return []
+        return [
+            (self._products[product_id], score)
+            for product_id, score in ranked
+            if score >= best * RELATIVE_SCORE_CUTOFF
+        ]
+
+
+def format_product_context(products: List[Dict], max_tokens: int = CHAT_RETRIEVAL_MAX_TOKENS) -> str:
+    """Compact product list for the prompt, cut off at the token budget"""
+    header = "Matching AfroMarket products (live prices and stock - only quote these):"
+    lines = [header]
+    used = estimate_tokens(header)
+    for product in products:
+        stock = "in stock" if product.get('in_stock', True) else "out of stock"
+        try:
+            price = f"£{float(product.get('price') or 0):.2f}"
+        except (TypeError, ValueError):
+            price = "price on request"
+        details = ", ".join(filter(None, [product.get('category'), product.get('brand')]))
+        line = f"- {product.get('name', 'Unnamed product')} ({details}) {price}, {stock}"
+        description = (product.get('description') or '').strip()
+        if description:
+            if len(description) > DESCRIPTION_CHARS:
+                description = description[:DESCRIPTION_CHARS].rsplit(' ', 1)[0] + '...'
+            line += f": {description}"
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines) if len(lines) > 1 else ""
+
+
+# Index for the current catalog snapshot
+_retrieval_index: Optional[BM25Index] = None
+_retrieval_index_version = None
+
+def get_retrieval_index(products: List[Dict], version) -> BM25Index:
+    """Get the BM25 index for a catalog snapshot, rebuilding on version change"""
+    global _retrieval_index, _retrieval_index_version
+    if _retrieval_index is None or _retrieval_index_version != version:
+        _retrieval_index = BM25Index.build(products)
+        _retrieval_index_version = version
+        logger.info(f"AfroBot retrieval index built: {len(_retrieval_index)} products")
+    return _retrieval_index
+
+
+def on_product_changed(product: Optional[Dict], version, product_id: str = None):
+    """Catalog listener applying a single product change incrementally"""
+    global _retrieval_index_version
+    if _retrieval_index is None or _retrieval_index_version != version - 1:
+        # Index is already behind this change and will be rebuilt on next use
+        return
+    if product is None:
+        _retrieval_index.remove_product(product_id)
+    else:
+        _retrieval_index.upsert_product(product)
+    _retrieval_index_version = version
+
+
+async def find_products(message: str) -> List[Dict]:
+    """Products relevant to a chat message, best first; empty if none match or the catalog is unavailable"""
+    from catalog_cache import get_catalog_cache
+
+    catalog = get_catalog_cache()
+    try:
+        products = await catalog.get_products()
+    except Exception as e:
+        logger.error(f"Catalog unavailable for AfroBot retrieval: {e}")
+        return []
+    if not products:
+        return []
+    return [product for product, _ in get_retrieval_index(products, catalog.version).search(message)]
+
+
+async def get_catalog_context(message: str) -> str:
+    """Product context for a chat message, empty if nothing relevant matches"""
+    return format_product_context(await find_products(message))
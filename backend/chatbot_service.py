@@ -3,13 +3,22 @@ AfroBot - AI Customer Service Chatbot for AfroMarket UK
 Uses OpenAI GPT-4o directly with user's API key
 """
 import os
+import time
 import uuid
+import asyncio
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from dotenv import load_dotenv
 import openai
 import logging
 
+from chat_session_store import get_session_store, estimate_tokens
+from chatbot_intents import get_intent_router
+from chatbot_cache import get_response_cache
+from chatbot_retrieval import get_catalog_context
+from catalog_cache import get_catalog_cache
+from llm_governor import get_llm_governor, LLMUnavailable, ProviderStats, LLM_CALL_TIMEOUT, LLM_STREAM_TIMEOUT
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -18,6 +27,12 @@ logger = logging.getLogger(__name__)
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
 
+# Canned replies used when no LLM provider can answer
+FALLBACK_UNAVAILABLE = "I'm sorry, but I'm having trouble connecting right now. Please try again later or contact support at sotubodammy@gmail.com"
+FALLBACK_AUTH = "I apologize, but I'm experiencing authentication issues. Please contact support at sotubodammy@gmail.com"
+FALLBACK_BUSY = "I'm a bit busy right now! Please try again in a moment."
+FALLBACK_ERROR = "I apologize, but I'm experiencing some technical difficulties. Please try again in a moment, or contact our support team at sotubodammy@gmail.com for immediate assistance."
+
 # AfroBot System Prompt - Customer Service for African Grocery E-commerce
 AFROBOT_SYSTEM_PROMPT = """You are AfroBot, a friendly and knowledgeable AI customer service assistant for AfroMarket UK - the premier online marketplace for authentic African groceries in the United Kingdom.
 
@@ -28,14 +43,7 @@ Your personality:
 - Patient and helpful with all customer inquiries
 
 Your capabilities:
-1. **Product Information**: Help customers find African food products like:
-   - Grains & Flours (Garri, Fufu, Semolina, Pounded Yam flour)
-   - Fresh Produce (Plantains, Yams, Cassava, Scotch Bonnets)
-   - Condiments & Seasonings (Palm oil, Maggi, Crayfish, Locust beans)
-   - Frozen Foods & Meats
-   - Snacks & Confectionery
-   - Drinks & Beverages
-   - Beauty & Household items (Black soap, Shea butter)
+1. **Product Information**: Help customers find authentic African food products
 
 2. **Order Support**: Help with:
    - Tracking orders
@@ -70,9 +78,16 @@ Important guidelines:
 
 Remember: You represent AfroMarket UK, connecting African diaspora in the UK with authentic flavors from home! 🌍"""
 
+# Generic product range, only sent when catalog retrieval finds nothing relevant
+AFROBOT_PRODUCT_GUIDE = """Products we typically stock:
+- Grains & Flours (Garri, Fufu, Semolina, Pounded Yam flour)
+- Fresh Produce (Plantains, Yams, Cassava, Scotch Bonnets)
+- Condiments & Seasonings (Palm oil, Maggi, Crayfish, Locust beans)
+- Frozen Foods & Meats
+- Snacks & Confectionery
+- Drinks & Beverages
+- Beauty & Household items (Black soap, Shea butter)"""
 
-# Store conversation history in memory (for simple session management)
-_conversation_history: Dict[str, List[Dict[str, str]]] = {}
 
 
 class AfroBotService:
@@ -85,7 +100,8 @@ class AfroBotService:
         
         if self.api_key:
             # Initialize OpenAI client
-            self.client = openai.AsyncOpenAI(api_key=self.api_key)
+            # The governor enforces deadlines; keep SDK retries from stretching them
+            self.client = openai.AsyncOpenAI(api_key=self.api_key, timeout=LLM_CALL_TIMEOUT, max_retries=1)
             self.model = "gpt-4o-mini"
             logger.info("AfroBot initialized with OpenAI")
         elif EMERGENT_LLM_KEY:
@@ -97,19 +113,22 @@ class AfroBotService:
         else:
             self.client = None
             logger.warning("No API key available for AfroBot")
+        
+        # Cached replies are only valid for the prompt and model that produced them
+        model = "emergent/gpt-4o" if self.use_emergent else getattr(self, "model", "")
+        get_response_cache().set_fingerprint(AFROBOT_SYSTEM_PROMPT, AFROBOT_PRODUCT_GUIDE, model)
     
     @staticmethod
     async def create_chat_session() -> str:
-        """Create a new chat session ID"""
-        session_id = str(uuid.uuid4())
-        _conversation_history[session_id] = []
-        return session_id
+        """Create a new chat session ID (history is stored on the first exchange)"""
+        return str(uuid.uuid4())
     
     async def get_chat_response(
         self,
         message: str, 
         session_id: str,
-        chat_history: Optional[List[Dict[str, Any]]] = None
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        user_id: Optional[str] = None
     ) -> str:
         """
         Get AI response from AfroBot
@@ -118,96 +137,217 @@ class AfroBotService:
             message: User's message
             session_id: Unique session identifier
             chat_history: Previous messages in the conversation
+            user_id: Signed-in customer, if any (needed for order lookups)
             
         Returns:
             AI response string
         """
-        if not self.api_key:
-            return "I'm sorry, but I'm having trouble connecting right now. Please try again later or contact support at sotubodammy@gmail.com"
+        local_reply, first_turn = await self._answer_without_llm(message, session_id, user_id)
+        if local_reply is not None:
+            return local_reply
+        
+        return await self._llm_response(message, session_id, cache_reply=first_turn)
+    
+    async def _answer_without_llm(self, message: str, session_id: str, user_id: Optional[str] = None):
+        """
+        Try the intent router, then the response cache
         
-        # Use Emergent integration if available
-        if self.use_emergent:
+        Returns:
+            (reply, first_turn) - reply is None when the LLM must answer
+        """
+        local_reply = await get_intent_router().answer(message, user_id)
+        first_turn = False
+        if local_reply is None:
+            # Cached replies are only reused for questions asked without prior context
+            first_turn = not await get_session_store().get(session_id)
+            if first_turn:
+                catalog = get_catalog_cache()
+                get_response_cache().sync_catalog(await catalog.get_products(), catalog.version)
+                local_reply = get_response_cache().get(message)
+        if local_reply is not None:
+            await self._remember(session_id, message, local_reply)
+        return local_reply, first_turn
+    
+    async def _completed(self, session_id: str, message: str, reply: str, cache_reply: bool) -> None:
+        """Record a successful LLM reply"""
+        await self._remember(session_id, message, reply)
+        if cache_reply:
+            get_response_cache().put(message, reply)
+    
+    def _providers(self) -> List[str]:
+        """Configured LLM providers in order of preference"""
+        providers = []
+        if self.client:
+            providers.append("openai")
+        if EMERGENT_LLM_KEY:
+            providers.append("emergent")
+        return providers
+    
+    async def _call_openai(self, message: str, session_id: str, usage: ProviderStats) -> str:
+        messages = await self._build_messages(message, session_id)
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+        )
+        if response.usage:
+            usage.add_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+    
+    async def _call_emergent(self, message: str, session_id: str, usage: ProviderStats) -> str:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+        
+        system_message = await self._system_prompt(message)
+        chat = LlmChat(
+            api_key=EMERGENT_LLM_KEY,
+            session_id=session_id,
+            system_message=system_message
+        )
+        chat.with_model("openai", "gpt-4o")
+        response = await chat.send_message(UserMessage(text=message))
+        # Emergent does not report token usage, so estimate it
+        usage.add_usage(estimate_tokens(system_message) + estimate_tokens(message), estimate_tokens(response))
+        return response
+    
+    async def _llm_response(self, message: str, session_id: str, cache_reply: bool = False,
+                            exclude: tuple = ()) -> str:
+        """
+        Answer a message with the first healthy LLM provider
+        
+        Every call goes through the LLM governor (concurrency cap, deadline,
+        circuit breaker). When no provider can answer, a canned reply
+        matching the last failure is returned instead.
+        """
+        governor = get_llm_governor()
+        fallback = FALLBACK_UNAVAILABLE
+        
+        for provider in self._providers():
+            if provider in exclude:
+                continue
+            if not governor.is_available(provider):
+                fallback = FALLBACK_BUSY
+                continue
+            call = self._call_openai if provider == "openai" else self._call_emergent
             try:
-                from emergentintegrations.llm.chat import LlmChat, UserMessage
-                
-                chat = LlmChat(
-                    api_key=self.api_key,
-                    session_id=session_id,
-                    system_message=AFROBOT_SYSTEM_PROMPT
-                )
-                chat.with_model("openai", "gpt-4o")
-                user_message = UserMessage(text=message)
-                response = await chat.send_message(user_message)
-                return response
+                reply = await governor.call(provider, lambda usage: call(message, session_id, usage))
+            except LLMUnavailable as e:
+                logger.warning(f"AfroBot skipping {provider}: {e}")
+                fallback = FALLBACK_BUSY
+                continue
+            except asyncio.TimeoutError:
+                logger.error(f"AfroBot {provider} call timed out")
+                fallback = FALLBACK_BUSY
+                continue
+            except openai.AuthenticationError:
+                logger.error("OpenAI Authentication Error")
+                fallback = FALLBACK_AUTH
+                continue
+            except openai.RateLimitError:
+                logger.error("OpenAI Rate Limit Error - trying fallback provider")
+                fallback = FALLBACK_BUSY
+                continue
             except Exception as e:
-                logger.error(f"Emergent Error: {str(e)}")
-                return "I apologize, but I'm experiencing some technical difficulties. Please try again in a moment."
+                logger.error(f"AfroBot {provider} error: {str(e)}")
+                fallback = FALLBACK_ERROR
+                continue
+            
+            await self._completed(session_id, message, reply, cache_reply)
+            return reply
+        
+        return fallback
+    
+    @staticmethod
+    async def _system_prompt(message: str) -> str:
+        """System prompt with the catalog products relevant to this message, or the generic range"""
+        context = await get_catalog_context(message)
+        return f"{AFROBOT_SYSTEM_PROMPT}\n\n{context or AFROBOT_PRODUCT_GUIDE}"
+    
+    async def _build_messages(self, message: str, session_id: str) -> List[Dict[str, str]]:
+        """Build the OpenAI messages array for a session"""
+        # Stored history is already trimmed to the token budget
+        history = await get_session_store().get(session_id)
+        
+        messages = [
+            {"role": "system", "content": await self._system_prompt(message)}
+        ]
+        messages.extend(history)
+        
+        # Add current user message
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    @staticmethod
+    async def _remember(session_id: str, message: str, assistant_message: str) -> None:
+        """Append a completed exchange to the session history"""
+        await get_session_store().append(session_id, [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": assistant_message}
+        ])
+    
+    async def stream_chat_response(self, message: str, session_id: str,
+                                   user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream AfroBot's reply as it is generated
+        
+        Yields text chunks as OpenAI produces them. The assembled reply is
+        added to the session history only once the stream completes.
+        Providers without streaming support, questions answered by the
+        intent router and cached replies yield the full reply at once.
+        """
+        local_reply, first_turn = await self._answer_without_llm(message, session_id, user_id)
+        if local_reply is not None:
+            yield local_reply
+            return
+        
+        governor = get_llm_governor()
+        if not self.client or not governor.is_available("openai"):
+            yield await self._llm_response(message, session_id, cache_reply=first_turn)
+            return
         
-        # Use OpenAI directly
+        chunks = []
         try:
-            # Get or initialize conversation history for this session
-            if session_id not in _conversation_history:
-                _conversation_history[session_id] = []
-            
-            history = _conversation_history[session_id]
-            
-            # Build messages array
-            messages = [
-                {"role": "system", "content": AFROBOT_SYSTEM_PROMPT}
-            ]
-            
-            # Add conversation history (last 10 messages to keep context manageable)
-            for msg in history[-10:]:
-                messages.append(msg)
-            
-            # Add current user message
-            messages.append({"role": "user", "content": message})
-            
-            # Call OpenAI API
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-            )
-            
-            assistant_message = response.choices[0].message.content
-            
-            # Store in history
-            history.append({"role": "user", "content": message})
-            history.append({"role": "assistant", "content": assistant_message})
-            
-            # Keep only last 20 messages
-            if len(history) > 20:
-                _conversation_history[session_id] = history[-20:]
-            
-            return assistant_message
-            
-        except openai.AuthenticationError:
-            logger.error("OpenAI Authentication Error")
-            return "I apologize, but I'm experiencing authentication issues. Please contact support at sotubodammy@gmail.com"
-        except openai.RateLimitError:
-            logger.error("OpenAI Rate Limit Error - trying Emergent fallback")
-            # Try Emergent as fallback
-            if EMERGENT_LLM_KEY:
-                try:
-                    from emergentintegrations.llm.chat import LlmChat, UserMessage
-                    
-                    chat = LlmChat(
-                        api_key=EMERGENT_LLM_KEY,
-                        session_id=session_id,
-                        system_message=AFROBOT_SYSTEM_PROMPT
-                    )
-                    chat.with_model("openai", "gpt-4o")
-                    user_message = UserMessage(text=message)
-                    response = await chat.send_message(user_message)
-                    return response
-                except Exception as e:
-                    logger.error(f"Emergent fallback error: {str(e)}")
-            return "I'm a bit busy right now! Please try again in a moment."
+            # The slot is held for the whole stream
+            async with governor.slot("openai") as usage:
+                deadline = time.monotonic() + LLM_STREAM_TIMEOUT
+                messages = await self._build_messages(message, session_id)
+                stream = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=500,
+                        temperature=0.7,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    ),
+                    timeout=LLM_CALL_TIMEOUT
+                )
+                chunk_iter = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            chunk_iter.__anext__(), timeout=max(0.0, deadline - time.monotonic())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if getattr(chunk, "usage", None):
+                        usage.add_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        chunks.append(delta)
+                        yield delta
         except Exception as e:
-            logger.error(f"AfroBot Error: {str(e)}")
-            return "I apologize, but I'm experiencing some technical difficulties. Please try again in a moment, or contact our support team at sotubodammy@gmail.com for immediate assistance."
+            logger.error(f"AfroBot streaming error: {type(e).__name__} {str(e)}")
+            if not chunks:
+                # Nothing sent yet - answer through the remaining providers instead
+                yield await self._llm_response(message, session_id, cache_reply=first_turn, exclude=("openai",))
+                return
+            yield "\n\nI apologize, but I was interrupted. Please try again in a moment."
+            return
+        
+        await self._completed(session_id, message, "".join(chunks), first_turn)
     
     @staticmethod
     def get_quick_replies() -> List[Dict[str, str]]:
@@ -235,10 +375,9 @@ I'm here to help you with:
 How can I assist you today?"""
     
     @staticmethod
-    def clear_session(session_id: str) -> None:
+    async def clear_session(session_id: str) -> None:
         """Clear conversation history for a session"""
-        if session_id in _conversation_history:
-            del _conversation_history[session_id]
+        await get_session_store().delete(session_id)
 
 
 # Singleton instance
@@ -0,0 +1,275 @@
+"""
+Checkout Pipeline for AfroMarket UK
+Commits an order in one Firestore batch, then fans out vendor notifications concurrently
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from firestore_db import firestore_db
+from email_service import email_service
+from notification_service import ws_manager, PushNotificationService
+from delivery_service import EXPRESS_OPTIONS
+from pricing_service import get_pricing_engine, PricedOrder, PRICE_MISMATCH_TOLERANCE
+from inventory_service import get_inventory_service, HELD, EXPIRED
+
+logger = logging.getLogger(__name__)
+
+# Fresh order numbers tried when one is already taken (two workers sharing a worker id)
+ORDER_ID_ATTEMPTS = 3
+
+
+def group_items_by_vendor(items: List[Dict]) -> Dict[str, List[Dict]]:
+    """Order items grouped by vendorId, in first-seen order"""
+    groups: Dict[str, List[Dict]] = {}
+    for item in items:
+        vendor_id = item.get('vendorId')
+        if vendor_id:
+            groups.setdefault(vendor_id, []).append(item)
+    return groups
+
+
+def vendor_name(vendor: Dict) -> str:
+    return vendor.get('business_name', vendor.get('businessName', 'Vendor'))
+
+
+class CheckoutService:
+    """
+    Order placement pipeline
+
+    1. Price the basket on the server (batched product and vendor reads)
+       and hold its stock, unless a reservation was made when checkout began
+    2. Write the order, one notification per vendor, the cart deletion and
+       the hold conversion in a single Firestore batch
+    3. After the commit, send WebSocket, push and email notifications
+       concurrently in the background
+
+    Only steps 1 and 2 are on the request path, so checkout latency no
+    longer grows with the number of vendors in the basket.
+    """
+
+    def __init__(self):
+        # Strong references keep fire-and-forget tasks from being garbage collected
+        self._side_effects: Set[asyncio.Task] = set()
+
+    async def place_order(self, user: Dict, items: List[Dict], shipping_info: Dict, payment_info: Dict,
+                          client_total: float, delivery_option: str = "standard",
+                          reservation_id: Optional[str] = None) -> Dict:
+        priced = await get_pricing_engine().quote(user, items, shipping_info.get('postcode', ''), delivery_option)
+        quantities = {line['product_id']: line['quantity'] for line in priced.lines}
+        inventory = get_inventory_service()
+        if reservation_id:
+            hold = await self._reserved_hold(user, reservation_id, quantities)
+        else:
+            hold = await inventory.reserve(user['id'], quantities)
+        order_items = priced.order_items()
+        vendor_groups = group_items_by_vendor(order_items)
+        order_id = firestore_db.generate_order_id()
+        notifications = self._vendor_notifications(order_id, priced, vendor_groups)
+
+        # Payment has already been taken for the client's total, so that is the
+        # order total; a difference from the server price is flagged for review
+        charged = round(float(client_total or 0), 2)
+        price_mismatch = abs(priced.total - charged) > PRICE_MISMATCH_TOLERANCE
+        if price_mismatch:
+            logger.warning(f"Order #{order_id}: charged £{charged} differs from server price £{priced.total}")
+
+        pricing = priced.to_dict()
+        pricing.pop('lines')
+        order_doc = {
+            'order_id': order_id,
+            'user_id': user['id'],
+            'items': order_items,
+            'shipping_info': shipping_info,
+            'payment_info': {k: v for k, v in payment_info.items() if k != 'cardNumber'},
+            'subtotal': priced.subtotal,
+            'delivery_fee': priced.delivery_fee,
+            'total': charged,
+            'server_total': priced.total,
+            'pricing': pricing,
+            'price_mismatch': price_mismatch,
+            'vendor_ids': [n['vendor_id'] for n in notifications],
+            'status': 'confirmed'  # Payment confirmed
+        }
+        try:
+            for attempt in range(ORDER_ID_ATTEMPTS):
+                try:
+                    order = await firestore_db.create_checkout(
+                        order_doc, notifications, user['id'], hold=hold,
+                        hold_updates=inventory.conversion_updates(hold, quantities)
+                    )
+                    break
+                except AlreadyExists:
+                    if attempt == ORDER_ID_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"Order number {order_id} already taken - set ORDER_ID_WORKER_ID per worker")
+                    order_id = firestore_db.generate_order_id()
+                    order_doc['order_id'] = order_id
+                    notifications = self._vendor_notifications(order_id, priced, vendor_groups)
+        except FailedPrecondition:
+            # The sweeper expired the reservation between our read and the commit
+            raise HTTPException(status_code=409, detail="Your reservation has expired, please check out again")
+        except Exception:
+            if not reservation_id:
+                await inventory.release(hold['id'])
+            raise
+        inventory.record_converted(hold)
+
+        self._spawn(self._after_commit(order, user, priced, vendor_groups, notifications))
+        return order
+
+    @staticmethod
+    def _vendor_notifications(order_id: str, priced: PricedOrder,
+                              vendor_groups: Dict[str, List[Dict]]) -> List[Dict]:
+        notifications = []
+        for vendor in priced.vendors:
+            if not vendor['vendor_id']:
+                continue
+            vendor_items = vendor_groups.get(vendor['vendor_id'], [])
+            notifications.append({
+                'vendor_id': vendor['vendor_id'],
+                'type': 'order',
+                'title': f"🛒 New Order #{order_id}!",
+                'message': f"New order with {len(vendor_items)} item(s) totaling £{vendor['subtotal']:.2f}",
+                'link': f"/vendor/dashboard?tab=orders&order={order_id}",
+                'data': {'order_id': order_id, 'total': vendor['subtotal']}
+            })
+        return notifications
+
+    @staticmethod
+    async def _reserved_hold(user: Dict, reservation_id: str, quantities: Dict[str, int]) -> Dict:
+        """The user's live hold covering the basket, raising HTTPException(409) otherwise"""
+        inventory = get_inventory_service()
+        hold = await inventory.get_hold(reservation_id)
+        if not hold or hold.get('user_id') != user['id']:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        if hold.get('status') != HELD:
+            raise HTTPException(status_code=409, detail="Your reservation has expired, please check out again")
+        if hold['expires_at'] < datetime.now(timezone.utc):
+            await inventory.release(reservation_id, status=EXPIRED)
+            raise HTTPException(status_code=409, detail="Your reservation has expired, please check out again")
+        held = hold.get('items', {})
+        if any(held.get(product_id, 0) < quantity for product_id, quantity in quantities.items()):
+            raise HTTPException(status_code=409, detail="Your basket changed since checkout began, please check out again")
+        return hold
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._side_effects.add(task)
+        task.add_done_callback(self._side_effects.discard)
+
+    # ---- side effects ----
+
+    async def _after_commit(self, order: Dict, user: Dict, priced: PricedOrder,
+                            vendor_groups: Dict[str, List[Dict]], notifications: List[Dict]) -> None:
+        order_id = order['order_id']
+        tasks = [self._notify_vendor(notification) for notification in notifications]
+        tasks.append(self._send_emails(order, user, priced, vendor_groups))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Checkout notification failed for order #{order_id}: {result}")
+        logger.info(f"Checkout notifications sent for order #{order_id} to {len(notifications)} vendor(s)")
+
+    @staticmethod
+    async def _notify_vendor(notification: Dict) -> None:
+        vendor_id = notification['vendor_id']
+        await asyncio.gather(
+            ws_manager.send_to_vendor(vendor_id, {
+                'type': 'notification',
+                'notification': {
+                    'type': 'order',
+                    'title': notification['title'],
+                    'message': notification['message'],
+                    'link': "/vendor/dashboard?tab=orders"
+                }
+            }),
+            CheckoutService._push_to_vendor(vendor_id, notification)
+        )
+
+    @staticmethod
+    async def _push_to_vendor(vendor_id: str, notification: Dict) -> int:
+        if not PushNotificationService.is_configured():
+            return 0
+        subscriptions = await firestore_db.get_vendor_push_subscriptions(vendor_id)
+
+        async def send(subscription: Dict) -> Optional[bool]:
+            return await PushNotificationService.send_push(
+                subscription_info={
+                    'endpoint': subscription.get('endpoint'),
+                    'keys': {'p256dh': subscription.get('p256dh_key'), 'auth': subscription.get('auth_key')}
+                },
+                title=notification['title'],
+                body=notification['message'],
+                url=notification['link'],
+                tag=f"afromarket-order-{vendor_id}",
+                data=notification.get('data')
+            )
+
+        results = await asyncio.gather(*(send(s) for s in subscriptions), return_exceptions=True)
+        for subscription, result in zip(subscriptions, results):
+            if result is None:
+                # Subscription expired or was revoked
+                await firestore_db.deactivate_push_subscription(subscription['id'])
+        return sum(1 for result in results if result is True)
+
+    @staticmethod
+    async def _send_emails(order: Dict, user: Dict, priced: PricedOrder,
+                           vendor_groups: Dict[str, List[Dict]]) -> None:
+        items = order['items']
+        vendors_data = []
+        for vendor_id, vendor_items in vendor_groups.items():
+            vendor = priced.vendor_docs.get(vendor_id)
+            if not vendor:
+                continue
+            # Add vendor name to items for email
+            for item in vendor_items:
+                item['vendor_name'] = vendor_name(vendor)
+            vendors_data.append({
+                'id': vendor_id,
+                'name': vendor_name(vendor),
+                'email': vendor.get('email', ''),
+                'items': vendor_items
+            })
+
+        email_order_data = {
+            'order_id': order['order_id'],
+            'items': items,
+            'shipping_info': order['shipping_info'],
+            'delivery_info': {
+                'estimated_days': priced.delivery_zone['estimated_days'],
+                'zone_name': priced.delivery_zone['zone_name'],
+                'delivery_option': EXPRESS_OPTIONS[priced.delivery_option]['name'],
+                'delivery_fee': priced.delivery_fee
+            },
+            'subtotal': priced.subtotal,
+            'delivery_fee': priced.delivery_fee,
+            'total': order['total'],
+            'payment_method': order['payment_info'].get('method', 'Card')
+        }
+        customer_info = {
+            'name': user.get('name', 'Customer'),
+            'email': user.get('email', '')
+        }
+
+        await email_service.send_all_payment_notifications(
+            order_data=email_order_data,
+            customer_info=customer_info,
+            vendors_data=vendors_data
+        )
+
+
+# Singleton instance
+_checkout_service: Optional[CheckoutService] = None
+
+def get_checkout_service() -> CheckoutService:
+    """Get CheckoutService singleton instance"""
+    global _checkout_service
+    if _checkout_service is None:
+        _checkout_service = CheckoutService()
+    return _checkout_service
@@ -4,14 +4,39 @@ Distance-based delivery pricing with free delivery threshold
 """
 
 import os
+import re
+import csv
 import logging
-from typing import Dict, Optional, Tuple
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
-# UK Delivery Zones based on distance from London (hub city)
-# Prices are in GBP
+# Zone prices and the postcode-to-zone mapping are loaded from CSV files
+# so they can be changed without code edits
+DELIVERY_DATA_DIR = os.environ.get('DELIVERY_DATA_DIR', os.path.join(os.path.dirname(__file__), 'data'))
+DELIVERY_ZONES_CSV = os.path.join(DELIVERY_DATA_DIR, 'delivery_zones.csv')
+DELIVERY_POSTCODES_CSV = os.path.join(DELIVERY_DATA_DIR, 'delivery_postcodes.csv')
+DELIVERY_CENTROIDS_CSV = os.path.join(DELIVERY_DATA_DIR, 'postcode_centroids.csv')
+
+# Vendor/customer outward-code pairs whose distance is memoized
+DELIVERY_DISTANCE_CACHE_SIZE = int(os.environ.get('DELIVERY_DISTANCE_CACHE_SIZE', '65536'))
+
+# Quotes memoized by DeliveryService (one per outward code/weight/free/option combination)
+DELIVERY_QUOTE_CACHE_SIZE = int(os.environ.get('DELIVERY_QUOTE_CACHE_SIZE', '50000'))
+
+EARTH_RADIUS_KM = 6371.0
+
+# Zone used for postcodes not listed in the mapping
+DEFAULT_ZONE = "mid"
+
+_INWARD_CODE_RE = re.compile(r'[0-9][A-Z]{2}$')
+
 
 @dataclass
 class DeliveryZone:
@@ -19,47 +44,205 @@ class DeliveryZone:
     base_price: float
     price_per_kg: float
     estimated_days: str
+    # Zones with a limit are picked by vendor-to-customer distance
+    max_distance_km: Optional[float] = None
 
-# Define delivery zones
-DELIVERY_ZONES = {
-    "local": DeliveryZone("Local (London)", 2.99, 0.50, "Same day - Next day"),
-    "near": DeliveryZone("Near (South East)", 4.99, 0.75, "1-2 days"),
-    "mid": DeliveryZone("Mid Distance", 6.99, 1.00, "2-3 days"),
-    "far": DeliveryZone("Far Distance", 8.99, 1.25, "3-4 days"),
-    "remote": DeliveryZone("Remote Areas", 12.99, 1.50, "4-5 days"),
-}
 
-# Postcode area mapping to zones
-# London and immediate surroundings
-LOCAL_POSTCODES = [
-    "E", "EC", "N", "NW", "SE", "SW", "W", "WC",  # Central London
-    "BR", "CR", "DA", "EN", "HA", "IG", "KT", "RM", "SM", "TW", "UB"  # Greater London
-]
-
-# South East England
-NEAR_POSTCODES = [
-    "AL", "BN", "CB", "CM", "CO", "CT", "GU", "HP", "LU", "ME", "MK", 
-    "OX", "RG", "RH", "SG", "SL", "SS", "TN", "WD"
-]
-
-# Midlands and nearby
-MID_POSTCODES = [
-    "B", "BA", "BD", "BS", "CV", "DE", "DY", "GL", "HR", "LE", "NG",
-    "NN", "NR", "PE", "PO", "SO", "SP", "ST", "SN", "WR", "WS", "WV"
-]
-
-# North England and Wales
-FAR_POSTCODES = [
-    "BB", "BL", "CA", "CF", "CH", "CW", "DN", "FY", "HD", "HG", "HU",
-    "HX", "L", "LA", "LD", "LL", "LN", "LS", "M", "NE", "NP", "OL",
-    "PR", "S", "SA", "SK", "SR", "SY", "TS", "WA", "WF", "WN", "YO"
-]
-
-# Scotland and remote areas
-REMOTE_POSTCODES = [
-    "AB", "DD", "DG", "DH", "DL", "EH", "FK", "G", "HS", "IV", "KA",
-    "KW", "KY", "ML", "PA", "PH", "TD", "ZE", "BT", "IM", "JE", "GY"
-]
+def _read_csv(path: str) -> List[Dict[str, str]]:
+    """Rows of a CSV file, skipping blank lines and # comments"""
+    with open(path, newline='', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+    return list(csv.DictReader(lines))
+
+
+def _outward_and_area(postcode: str) -> Tuple[str, str]:
+    outward = get_outward_code(postcode)
+    return outward, get_postcode_area(outward)
+
+
+class CentroidTable:
+    """Latitude/longitude of postcode areas and outward codes as NumPy arrays (radians)"""
+
+    def __init__(self, codes: List[str], lat: List[float], lon: List[float]):
+        self.index = {code: i for i, code in enumerate(codes)}
+        self.lat = np.radians(np.asarray(lat, dtype=np.float64))
+        self.lon = np.radians(np.asarray(lon, dtype=np.float64))
+
+    @classmethod
+    def load(cls, path: str = None) -> 'CentroidTable':
+        rows = _read_csv(path or DELIVERY_CENTROIDS_CSV)
+        return cls(
+            [row['code'].strip().upper() for row in rows],
+            [float(row['lat']) for row in rows],
+            [float(row['lon']) for row in rows]
+        )
+
+    def lookup(self, postcode: str) -> int:
+        """Row for a postcode's outward code, else its area, else -1"""
+        outward, area = _outward_and_area(postcode)
+        return self.index.get(outward, self.index.get(area, -1))
+
+    def distances_km(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """Vectorized haversine distance between rows; NaN where either row is unknown"""
+        valid = (origins >= 0) & (destinations >= 0)
+        o = np.where(valid, origins, 0)
+        d = np.where(valid, destinations, 0)
+        dlat = self.lat[d] - self.lat[o]
+        dlon = self.lon[d] - self.lon[o]
+        a = np.sin(dlat / 2) ** 2 + np.cos(self.lat[o]) * np.cos(self.lat[d]) * np.sin(dlon / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        return np.where(valid, km, np.nan)
+
+
+class ZoneTable:
+    """
+    Postcode-to-zone lookup built once from the bundled CSV files
+
+    Keys are either a postcode area ("IV") or a full outward code ("IV41").
+    A postcode resolves to its outward code entry when there is one and to
+    its area entry otherwise, so any lookup is at most two dict probes.
+
+    When the vendor's postcode is known, distance-priced zones are chosen
+    from the distance between the two postcodes' centroids instead.
+    """
+
+    def __init__(self, zones: Dict[str, DeliveryZone], prefixes: Dict[str, str],
+                 centroids: Optional[CentroidTable] = None):
+        self.zones = zones
+        self.prefixes = prefixes
+        self.areas = {prefix for prefix in prefixes if prefix.isalpha()}
+        self.centroids = centroids
+        # Bumped on every reload so caches built on the table can be dropped
+        self.version = 0
+
+        # Price tables indexed by zone position for vectorized quoting
+        self.zone_keys = list(zones)
+        self.zone_index = {key: i for i, key in enumerate(self.zone_keys)}
+        self.base_prices = np.array([zones[k].base_price for k in self.zone_keys])
+        self.price_per_kg = np.array([zones[k].price_per_kg for k in self.zone_keys])
+
+        distance_zones = sorted(
+            (zone.max_distance_km, key) for key, zone in zones.items() if zone.max_distance_km is not None
+        )
+        self.distance_limits = np.array([limit for limit, _ in distance_zones])
+        self.distance_zone_index = np.array([self.zone_index[key] for _, key in distance_zones], dtype=np.int64)
+        self.distance_priced = np.array([zones[k].max_distance_km is not None for k in self.zone_keys])
+
+    @classmethod
+    def load(cls, zones_csv: str = None, postcodes_csv: str = None, centroids_csv: str = None) -> 'ZoneTable':
+        zones = {
+            row['zone']: DeliveryZone(
+                name=row['name'],
+                base_price=float(row['base_price']),
+                price_per_kg=float(row['price_per_kg']),
+                estimated_days=row['estimated_days'],
+                max_distance_km=float(row['max_distance_km']) if row.get('max_distance_km') else None
+            )
+            for row in _read_csv(zones_csv or DELIVERY_ZONES_CSV)
+        }
+        prefixes = {}
+        for row in _read_csv(postcodes_csv or DELIVERY_POSTCODES_CSV):
+            prefix = row['prefix'].strip().upper()
+            if row['zone'] not in zones:
+                raise ValueError(f"Postcode prefix {prefix} maps to unknown zone {row['zone']}")
+            prefixes[prefix] = row['zone']
+        if DEFAULT_ZONE not in zones:
+            raise ValueError(f"Default delivery zone {DEFAULT_ZONE} is not defined")
+        centroids = CentroidTable.load(centroids_csv)
+        logger.info(f"Delivery zones loaded: {len(zones)} zones, {len(prefixes)} postcode prefixes, "
+                    f"{len(centroids.index)} centroids")
+        return cls(zones, prefixes, centroids)
+
+    def zone_key(self, postcode: str) -> str:
+        """Zone key for a postcode, full ("IV41 8AB") or outward code only ("IV41")"""
+        outward, area = _outward_and_area(postcode)
+        zone = self.prefixes.get(outward)
+        if zone is None:
+            zone = self.prefixes.get(area, DEFAULT_ZONE)
+        return zone
+
+    def resolve(self, postcode: str) -> Tuple[str, DeliveryZone]:
+        zone_key = self.zone_key(postcode)
+        return zone_key, self.zones[zone_key]
+
+    def resolve_many(self, postcodes: List[str]) -> List[str]:
+        """Zone keys for many postcodes in one pass"""
+        # Checkout batches repeat the same few postcodes, so resolve each once
+        resolved: Dict[str, str] = {}
+        zone_key = self.zone_key
+        result = []
+        for postcode in postcodes:
+            zone = resolved.get(postcode)
+            if zone is None:
+                zone = resolved[postcode] = zone_key(postcode)
+            result.append(zone)
+        return result
+
+    def zone_for_distance(self, distance_km: float) -> str:
+        position = min(int(np.searchsorted(self.distance_limits, distance_km)), len(self.distance_limits) - 1)
+        return self.zone_keys[self.distance_zone_index[position]]
+
+    def resolve_route(self, origin_postcode: Optional[str], postcode: str) -> Tuple[str, Optional[float]]:
+        """
+        Zone key and distance for a vendor-to-customer route
+
+        Falls back to the destination's zone when the origin is unknown or
+        the destination is in a zone that is not distance-priced (islands).
+        """
+        zone_key = self.zone_key(postcode)
+        if not origin_postcode or self.zones[zone_key].max_distance_km is None:
+            return zone_key, None
+        distance = _pair_distance_km(get_outward_code(origin_postcode), get_outward_code(postcode))
+        if distance is None:
+            return zone_key, None
+        return self.zone_for_distance(distance), distance
+
+    def resolve_routes(self, origin_postcodes: List[Optional[str]], postcodes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Zone indices and distances (NaN if unknown) for many routes at once"""
+        unique = {}
+        for postcode in postcodes:
+            if postcode not in unique:
+                unique[postcode] = self.zone_index[self.zone_key(postcode)]
+        dest_zones = np.array([unique[p] for p in postcodes], dtype=np.int64)
+
+        lookup = self.centroids.lookup
+        origins = np.array([lookup(p) if p else -1 for p in origin_postcodes], dtype=np.int64)
+        destinations = np.array([lookup(p) for p in postcodes], dtype=np.int64)
+        distances = self.centroids.distances_km(origins, destinations)
+
+        bands = np.minimum(np.searchsorted(self.distance_limits, np.nan_to_num(distances)), len(self.distance_limits) - 1)
+        use_distance = ~np.isnan(distances) & self.distance_priced[dest_zones]
+        zones = np.where(use_distance, self.distance_zone_index[bands], dest_zones)
+        return zones, distances
+
+
+_zone_table = ZoneTable.load()
+
+
+@lru_cache(maxsize=DELIVERY_DISTANCE_CACHE_SIZE)
+def _pair_distance_km(origin_outward: str, dest_outward: str) -> Optional[float]:
+    """Memoized centroid distance between two outward codes"""
+    centroids = _zone_table.centroids
+    origin = centroids.lookup(origin_outward)
+    destination = centroids.lookup(dest_outward)
+    if origin < 0 or destination < 0:
+        return None
+    return float(centroids.distances_km(np.array([origin]), np.array([destination]))[0])
+
+
+def get_zone_table() -> ZoneTable:
+    return _zone_table
+
+
+def reload_zone_table() -> ZoneTable:
+    """Re-read the zone CSV files, e.g. after a pricing change"""
+    global _zone_table
+    table = ZoneTable.load()
+    table.version = _zone_table.version + 1
+    _zone_table = table
+    _pair_distance_km.cache_clear()
+    return table
+
 
 # Free delivery threshold
 FREE_DELIVERY_THRESHOLD = 100.00  # £100
@@ -88,30 +271,100 @@ def get_postcode_area(postcode: str) -> str:
     return area
 
 
+def get_outward_code(postcode: str) -> str:
+    """Outward code of a UK postcode ("SW1A 1AA" -> "SW1A"); outward-only input is returned as is"""
+    postcode = postcode.replace(" ", "").upper()
+    if len(postcode) >= 5 and _INWARD_CODE_RE.search(postcode):
+        return postcode[:-3]
+    return postcode
+
+
+def is_known_postcode_area(area: str) -> bool:
+    """Check whether a postcode area (e.g. "SW", "M") is one we deliver to"""
+    return area.upper() in _zone_table.areas
+
+
 def get_delivery_zone(postcode: str) -> Tuple[str, DeliveryZone]:
     """Determine delivery zone based on postcode"""
-    area = get_postcode_area(postcode)
-    
-    if area in LOCAL_POSTCODES:
-        return "local", DELIVERY_ZONES["local"]
-    elif area in NEAR_POSTCODES:
-        return "near", DELIVERY_ZONES["near"]
-    elif area in MID_POSTCODES:
-        return "mid", DELIVERY_ZONES["mid"]
-    elif area in FAR_POSTCODES:
-        return "far", DELIVERY_ZONES["far"]
-    elif area in REMOTE_POSTCODES:
-        return "remote", DELIVERY_ZONES["remote"]
+    return _zone_table.resolve(postcode)
+
+
+def get_route_zone(origin_postcode: Optional[str], postcode: str) -> Tuple[str, DeliveryZone, Optional[float]]:
+    """Zone and centroid distance (km) for delivery from a vendor's postcode to a customer's"""
+    zone_key, distance = _zone_table.resolve_route(origin_postcode, postcode)
+    return zone_key, _zone_table.zones[zone_key], distance
+
+
+def resolve_delivery_zones(postcodes: List[str]) -> List[str]:
+    """Zone keys for a batch of postcodes (unknown postcodes get the default zone)"""
+    return _zone_table.resolve_many(postcodes)
+
+
+def get_estimated_days(zone_key: str, zone: DeliveryZone, option_key: str) -> str:
+    """Delivery estimate for a zone, adjusted for the express option"""
+    if option_key == "express" and zone_key in ["local", "near"]:
+        return "Next day"
+    elif option_key == "next_day" and zone_key in ["local", "near", "mid"]:
+        return "Next day (guaranteed)"
+    elif option_key == "next_day":
+        return "1-2 days"
+    return zone.estimated_days
+
+
+def quote_option(
+    postcode: str,
+    total_weight_kg: float,
+    qualifies_for_free: bool,
+    option_key: str = "standard",
+    origin_postcode: Optional[str] = None
+) -> Dict:
+    """
+    Price one delivery option
+    
+    Only whether the subtotal reaches the free delivery threshold matters
+    here, not the subtotal itself, which is what lets quotes be memoized.
+    """
+    zone_key, zone, distance_km = get_route_zone(origin_postcode, postcode)
+    return {
+        **quote_zone_option(zone_key, zone, total_weight_kg, qualifies_for_free, option_key),
+        "distance_km": round(distance_km, 1) if distance_km is not None else None
+    }
+
+
+def quote_zone_option(zone_key: str, zone: DeliveryZone, total_weight_kg: float,
+                      qualifies_for_free: bool, option_key: str = "standard") -> Dict:
+    """Price one delivery option for an already resolved zone"""
+    option = EXPRESS_OPTIONS.get(option_key, EXPRESS_OPTIONS["standard"])
+    
+    if qualifies_for_free:
+        base_cost = 0.0
+        weight_cost = 0.0
+        cost = 0.0
     else:
-        # Default to mid distance for unknown postcodes
-        return "mid", DELIVERY_ZONES["mid"]
+        base_cost = zone.base_price
+        # Add weight-based cost for orders over 2kg
+        weight_cost = max(0, (total_weight_kg - 2)) * zone.price_per_kg
+        # Apply express option multiplier
+        cost = round((base_cost + weight_cost) * option["multiplier"], 2)
+    
+    return {
+        "zone": zone_key,
+        "zone_name": zone.name,
+        "base_cost": round(base_cost, 2),
+        "weight_cost": round(weight_cost, 2),
+        "cost": cost,
+        "zone_estimated_days": zone.estimated_days,
+        "estimated_days": get_estimated_days(zone_key, zone, option_key)
+    }
 
 
 def calculate_delivery_cost(
     postcode: str,
     subtotal: float,
     total_weight_kg: float = 1.0,
-    delivery_option: str = "standard"
+    delivery_option: str = "standard",
+    origin_postcode: Optional[str] = None,
+    quote: Callable[..., Dict] = quote_option
 ) -> Dict:
     """
     Calculate delivery cost based on postcode, subtotal, and weight
@@ -121,91 +374,63 @@ def calculate_delivery_cost(
         subtotal: Order subtotal in GBP
         total_weight_kg: Total weight of items in kg
         delivery_option: standard, express, or next_day
+        origin_postcode: Vendor's postcode, enables distance-based pricing
+        quote: Option pricing function, e.g. a memoized one from DeliveryService
         
     Returns:
         Dict with delivery details including cost and estimated time
     """
     
-    # Get delivery zone
-    zone_key, zone = get_delivery_zone(postcode)
-    
     # Check for free delivery
     qualifies_for_free = subtotal >= FREE_DELIVERY_THRESHOLD
     amount_to_free = max(0, FREE_DELIVERY_THRESHOLD - subtotal) if not qualifies_for_free else 0
     
-    # Calculate base delivery cost
-    if qualifies_for_free:
-        base_cost = 0.0
-        weight_cost = 0.0
-    else:
-        base_cost = zone.base_price
-        # Add weight-based cost for orders over 2kg
-        weight_cost = max(0, (total_weight_kg - 2)) * zone.price_per_kg
-    
-    total_delivery = base_cost + weight_cost
-    
-    # Apply express option multiplier
-    express = EXPRESS_OPTIONS.get(delivery_option, EXPRESS_OPTIONS["standard"])
-    if not qualifies_for_free:
-        total_delivery *= express["multiplier"]
-    
-    # Round to 2 decimal places
-    total_delivery = round(total_delivery, 2)
+    option_key = delivery_option if delivery_option in EXPRESS_OPTIONS else "standard"
+    quoted = quote(postcode, total_weight_kg, qualifies_for_free, option_key, origin_postcode)
     
     return {
-        "zone": zone_key,
-        "zone_name": zone.name,
-        "base_cost": round(base_cost, 2),
-        "weight_cost": round(weight_cost, 2),
-        "delivery_cost": total_delivery,
-        "estimated_days": zone.estimated_days,
-        "delivery_option": express["name"],
+        "zone": quoted["zone"],
+        "zone_name": quoted["zone_name"],
+        "base_cost": quoted["base_cost"],
+        "weight_cost": quoted["weight_cost"],
+        "delivery_cost": quoted["cost"],
+        "estimated_days": quoted["zone_estimated_days"],
+        "delivery_option": EXPRESS_OPTIONS[option_key]["name"],
         "free_delivery": qualifies_for_free,
         "free_delivery_threshold": FREE_DELIVERY_THRESHOLD,
         "amount_to_free_delivery": round(amount_to_free, 2),
-        "postcode_area": get_postcode_area(postcode)
+        "postcode_area": get_postcode_area(postcode),
+        "distance_km": quoted["distance_km"]
     }
 
 
-def get_delivery_options(postcode: str, subtotal: float, total_weight_kg: float = 1.0) -> Dict:
+def get_delivery_options(postcode: str, subtotal: float, total_weight_kg: float = 1.0,
+                         origin_postcode: Optional[str] = None,
+                         quote: Callable[..., Dict] = quote_option) -> Dict:
     """
     Get all available delivery options with prices
     
     Returns dict with all delivery options and their costs
     """
-    zone_key, zone = get_delivery_zone(postcode)
     qualifies_for_free = subtotal >= FREE_DELIVERY_THRESHOLD
     
     options = []
+    quoted = {}
     
     for option_key, option in EXPRESS_OPTIONS.items():
-        if qualifies_for_free:
-            cost = 0.0
-        else:
-            base_cost = zone.base_price
-            weight_cost = max(0, (total_weight_kg - 2)) * zone.price_per_kg
-            cost = round((base_cost + weight_cost) * option["multiplier"], 2)
-        
-        # Adjust estimated days based on express option
-        days = zone.estimated_days
-        if option_key == "express" and zone_key in ["local", "near"]:
-            days = "Next day"
-        elif option_key == "next_day" and zone_key in ["local", "near", "mid"]:
-            days = "Next day (guaranteed)"
-        elif option_key == "next_day":
-            days = "1-2 days"
-        
+        quoted = quote(postcode, total_weight_kg, qualifies_for_free, option_key, origin_postcode)
         options.append({
             "key": option_key,
             "name": option["name"],
-            "cost": cost,
-            "estimated_days": days,
-            "free": cost == 0
+            "cost": quoted["cost"],
+            "estimated_days": quoted["estimated_days"],
+            "free": quoted["cost"] == 0
         })
     
     return {
-        "zone": zone_key,
-        "zone_name": zone.name,
+        "zone": quoted["zone"],
+        "zone_name": quoted["zone_name"],
+        "distance_km": quoted["distance_km"],
         "options": options,
         "free_delivery_threshold": FREE_DELIVERY_THRESHOLD,
         "qualifies_for_free": qualifies_for_free,
@@ -213,6 +438,184 @@ def get_delivery_options(postcode: str, subtotal: float, total_weight_kg: float
     }
 
 
+def quote_delivery_batch(postcode: str, shipments: List[Dict]) -> Dict:
+    """
+    Quote every delivery option for every shipment in a multi-vendor basket
+    
+    Args:
+        postcode: Customer's delivery postcode
+        shipments: One dict per vendor with vendor_id, subtotal, weight_kg
+            and optionally origin_postcode
+    
+    Each shipment is priced on the distance from its vendor's postcode.
+    The free delivery threshold applies to the basket subtotal, so one
+    qualifying basket ships free from every vendor. All shipment x option
+    prices are computed in a single NumPy pass.
+    
+    Returns dict with per-shipment options and combined totals per option
+    """
+    table = get_zone_table()
+    dest_zone_key, dest_zone = table.resolve(postcode)
+    subtotal = float(sum(s.get("subtotal", 0) for s in shipments))
+    qualifies_for_free = subtotal >= FREE_DELIVERY_THRESHOLD
+    
+    option_keys = list(EXPRESS_OPTIONS)
+    multipliers = np.array([EXPRESS_OPTIONS[k]["multiplier"] for k in option_keys])
+    weights = np.array([float(s.get("weight_kg", 1.0)) for s in shipments])
+    zone_idx, distances = table.resolve_routes(
+        [s.get("origin_postcode") for s in shipments], [postcode] * len(shipments)
+    )
+    
+    # shipments x options
+    per_shipment = table.base_prices[zone_idx] + np.maximum(0.0, weights - 2) * table.price_per_kg[zone_idx]
+    costs = np.round(per_shipment[:, None] * multipliers[None, :], 2)
+    if qualifies_for_free:
+        costs[:] = 0.0
+    totals = np.round(costs.sum(axis=0), 2)
+    
+    names = [EXPRESS_OPTIONS[k]["name"] for k in option_keys]
+    zone_keys = [table.zone_keys[i] for i in zone_idx]
+    days = [
+        [get_estimated_days(key, table.zones[key], option_key) for option_key in option_keys]
+        for key in zone_keys
+    ]
+    # The basket arrives when its most expensive (furthest) shipment does
+    slowest = int(np.argmax(table.base_prices[zone_idx]))
+    
+    return {
+        "zone": dest_zone_key,
+        "zone_name": dest_zone.name,
+        "subtotal": round(subtotal, 2),
+        "free_delivery_threshold": FREE_DELIVERY_THRESHOLD,
+        "qualifies_for_free": qualifies_for_free,
+        "amount_to_free_delivery": round(max(0, FREE_DELIVERY_THRESHOLD - subtotal), 2),
+        "shipments": [
+            {
+                "vendor_id": shipment.get("vendor_id"),
+                "origin_postcode": shipment.get("origin_postcode"),
+                "subtotal": shipment.get("subtotal", 0),
+                "weight_kg": float(weights[i]),
+                "zone": zone_keys[i],
+                "zone_name": table.zones[zone_keys[i]].name,
+                "distance_km": None if np.isnan(distances[i]) else round(float(distances[i]), 1),
+                "options": [
+                    {
+                        "key": option_keys[j],
+                        "name": names[j],
+                        "cost": float(costs[i, j]),
+                        "estimated_days": days[i][j],
+                        "free": bool(costs[i, j] == 0)
+                    }
+                    for j in range(len(option_keys))
+                ]
+            }
+            for i, shipment in enumerate(shipments)
+        ],
+        "totals": [
+            {
+                "key": option_keys[j],
+                "name": names[j],
+                "cost": float(totals[j]),
+                "estimated_days": days[slowest][j],
+                "free": bool(totals[j] == 0)
+            }
+            for j in range(len(option_keys))
+        ]
+    }
+
+
+class QuoteCache:
+    """
+    LRU cache of option quotes keyed by normalized inputs
+
+    Keys are (resolved zone, excess weight, free delivery band, option).
+    Routes are resolved to their zone first (the route's distance is added
+    to the returned quote, not cached), every weight up to 2kg costs the
+    same, and the subtotal only matters through which side of the free
+    delivery threshold it falls on, so the handful of zones covers almost
+    every quote and can be warmed at startup. All entries are dropped when
+    the zone table is reloaded.
+    """
+
+    def __init__(self, max_entries: int = DELIVERY_QUOTE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._version = get_zone_table().version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def weight_band(total_weight_kg: float) -> float:
+        """Weight above the 2kg included in the base price, to the gram"""
+        return round(max(0.0, float(total_weight_kg) - 2), 3)
+
+    def _check_version(self) -> None:
+        version = get_zone_table().version
+        if version != self._version:
+            self._version = version
+            self.clear()
+
+    def clear(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+
+    def _put(self, key: tuple, quoted: Dict) -> None:
+        self._entries[key] = quoted
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def quote(self, postcode: str, total_weight_kg: float, qualifies_for_free: bool,
+              option_key: str = "standard", origin_postcode: Optional[str] = None) -> Dict:
+        """Memoized quote_option"""
+        self._check_version()
+        zone_key, zone, distance_km = get_route_zone(origin_postcode, postcode or "")
+        excess_kg = self.weight_band(total_weight_kg)
+        key = (zone_key, excess_kg, bool(qualifies_for_free), option_key)
+
+        quoted = self._entries.get(key)
+        if quoted is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            quoted = quote_zone_option(zone_key, zone, excess_kg + 2, qualifies_for_free, option_key)
+            self._put(key, quoted)
+        return {**quoted, "distance_km": round(distance_km, 1) if distance_km is not None else None}
+
+    def warm(self) -> int:
+        """Pre-compute every option for every zone at the base weight; returns the entries added"""
+        self._check_version()
+        started = time.monotonic()
+        added = 0
+        for zone_key, zone in get_zone_table().zones.items():
+            for qualifies_for_free in (False, True):
+                for option_key in EXPRESS_OPTIONS:
+                    key = (zone_key, 0.0, qualifies_for_free, option_key)
+                    if key not in self._entries:
+                        self._put(key, quote_zone_option(zone_key, zone, 2.0, qualifies_for_free, option_key))
+                        added += 1
+        logger.info(f"Delivery quote cache warmed with {added} zone quotes "
+                    f"in {(time.monotonic() - started) * 1000:.1f}ms")
+        return added
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'zone_table_version': self._version
+        }
+
+
 # Singleton instance
 delivery_service = None
 
@@ -228,12 +631,43 @@ class DeliveryService:
     
     def __init__(self):
         self.free_threshold = FREE_DELIVERY_THRESHOLD
+        self.quote_cache = QuoteCache()
+    
+    def calculate(self, postcode: str, subtotal: float, weight_kg: float = 1.0, option: str = "standard",
+                  origin_postcode: Optional[str] = None):
+        return calculate_delivery_cost(postcode, subtotal, weight_kg, option, origin_postcode,
+                                       quote=self.quote_cache.quote)
+    
+    def get_options(self, postcode: str, subtotal: float, weight_kg: float = 1.0,
+                    origin_postcode: Optional[str] = None):
+        return get_delivery_options(postcode, subtotal, weight_kg, origin_postcode,
+                                    quote=self.quote_cache.quote)
+    
+    def warm_quote_cache(self) -> int:
+        return self.quote_cache.warm()
+    
+    def reload_zones(self) -> Dict:
+        """Re-read the zone tables and re-warm the quote cache; the old tables stay in use if loading fails"""
+        table = reload_zone_table()
+        warmed = self.quote_cache.warm()
+        return {
+            'version': table.version,
+            'zones': len(table.zones),
+            'prefixes': len(table.prefixes),
+            'warmed_quotes': warmed
+        }
+    
+    def get_cache_stats(self) -> dict:
+        return self.quote_cache.get_stats()
+    
+    def get_zone(self, postcode: str) -> Tuple[str, DeliveryZone]:
+        return get_delivery_zone(postcode)
     
-    def calculate(self, postcode: str, subtotal: float, weight_kg: float = 1.0, option: str = "standard"):
-        return calculate_delivery_cost(postcode, subtotal, weight_kg, option)
+    def quote_batch(self, postcode: str, shipments: List[Dict]) -> Dict:
+        return quote_delivery_batch(postcode, shipments)
     
-    def get_options(self, postcode: str, subtotal: float, weight_kg: float = 1.0):
-        return get_delivery_options(postcode, subtotal, weight_kg)
+    def resolve_zones(self, postcodes: List[str]) -> List[str]:
+        return resolve_delivery_zones(postcodes)
     
     def get_zones_info(self):
         """Get information about all delivery zones"""
@@ -244,5 +678,5 @@ class DeliveryService:
                 "price_per_kg": zone.price_per_kg,
                 "estimated_days": zone.estimated_days
             }
-            for zone_key, zone in DELIVERY_ZONES.items()
+            for zone_key, zone in get_zone_table().zones.items()
         }
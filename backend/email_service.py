@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import hashlib
 import json
+import asyncio
+import threading
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -18,6 +20,8 @@ logger = logging.getLogger(__name__)
 
 # Track sent emails to prevent duplicates (in-memory cache)
 _sent_emails_cache: Dict[str, datetime] = {}
+# Async senders run the blocking SMTP sends in worker threads
+_sent_emails_lock = threading.Lock()
 DUPLICATE_WINDOW_MINUTES = 5  # Prevent same email within 5 minutes
 
 class EmailService:
@@ -53,20 +57,22 @@ class EmailService:
         """Check if email was recently sent (prevent duplicates)"""
         global _sent_emails_cache
         
-        # Clean old entries
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=DUPLICATE_WINDOW_MINUTES)
-        _sent_emails_cache = {k: v for k, v in _sent_emails_cache.items() if v > cutoff}
-        
-        if email_hash in _sent_emails_cache:
-            logger.warning(f"Duplicate email prevented (hash: {email_hash[:8]}...)")
-            return True
+        with _sent_emails_lock:
+            # Clean old entries
+            now = datetime.utcnow()
+            cutoff = now - timedelta(minutes=DUPLICATE_WINDOW_MINUTES)
+            _sent_emails_cache = {k: v for k, v in _sent_emails_cache.items() if v > cutoff}
+            
+            if email_hash in _sent_emails_cache:
+                logger.warning(f"Duplicate email prevented (hash: {email_hash[:8]}...)")
+                return True
         
         return False
     
     def _mark_email_sent(self, email_hash: str):
         """Mark email as sent to prevent duplicates"""
-        _sent_emails_cache[email_hash] = datetime.utcnow()
+        with _sent_emails_lock:
+            _sent_emails_cache[email_hash] = datetime.utcnow()
     
     def send_email(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, prevent_duplicate: bool = True, duplicate_key: str = ""):
         """Send an email with duplicate prevention"""
@@ -1944,9 +1950,11 @@ class EmailService:
         order_id = order_data.get('order_id', order_data.get('orderId', 'N/A'))
         logger.info(f"Sending payment notifications for order #{order_id}")
         
+        # Each send is a blocking SMTP session, so run them off the event loop
         # 1. Send to customer
         try:
-            results['customer'] = self.send_payment_confirmation_to_customer(
+            results['customer'] = await asyncio.to_thread(
+                self.send_payment_confirmation_to_customer,
                 customer_email=customer_info.get('email'),
                 customer_name=customer_info.get('name'),
                 order_data=order_data
@@ -1959,7 +1967,8 @@ class EmailService:
         for vendor in vendors_data:
             vendor_id = vendor.get('id', vendor.get('vendor_id', 'unknown'))
             try:
-                success = self.send_payment_notification_to_vendor(
+                success = await asyncio.to_thread(
+                    self.send_payment_notification_to_vendor,
                     vendor_email=vendor.get('email'),
                     vendor_name=vendor.get('name', vendor.get('business_name', 'Vendor')),
                     order_data=order_data,
@@ -1974,7 +1983,8 @@ class EmailService:
         
         # 3. Send to admin
         try:
-            results['admin'] = self.send_payment_notification_to_admin(
+            results['admin'] = await asyncio.to_thread(
+                self.send_payment_notification_to_admin,
                 order_data=order_data,
                 customer_info=customer_info,
                 vendors_info=vendors_data
@@ -4,11 +4,28 @@ from firebase_admin import credentials, auth as firebase_auth
 from fastapi import HTTPException
 import os
 import json
+import time
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
+
+import jwt
+import httpx
+
+from oauth.keys import X509KeyCache, verify_jwt
 
 logger = logging.getLogger(__name__)
 
+# Google's public certificates for Firebase ID tokens (rotated every few hours)
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# How long a verified token is trusted without re-checking its signature
+VERIFIED_TOKEN_TTL_SECONDS = int(os.environ.get('FIREBASE_VERIFIED_TOKEN_TTL', '300'))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('FIREBASE_VERIFIED_TOKEN_CACHE_SIZE', '10000'))
+
 # Firebase Admin SDK initialization
 _firebase_app = None
 
@@ -65,6 +82,92 @@ def get_firebase_app():
         return None
 
 
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens without blocking the event loop
+
+    Google's signing certificates are cached for as long as their
+    Cache-Control max-age allows and refreshed in the background before
+    they expire. Signature checks run in a worker thread, and tokens that
+    already passed verification are remembered (by SHA-256 of the token)
+    for a short time so clients repeating the same token skip the work.
+    """
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.keys = X509KeyCache(FIREBASE_CERTS_URL, "Firebase")
+        self._verified: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self) -> None:
+        """Prefetch certificates and start the background refresher"""
+        await self.keys.start()
+
+    async def stop(self) -> None:
+        self.keys.stop()
+
+    def _cache_get(self, token_hash: str) -> Optional[dict]:
+        entry = self._verified.get(token_hash)
+        if entry is None:
+            return None
+        claims, valid_until = entry
+        if time.time() >= valid_until:
+            del self._verified[token_hash]
+            return None
+        self._verified.move_to_end(token_hash)
+        return claims
+
+    def _cache_put(self, token_hash: str, claims: dict) -> None:
+        valid_until = min(time.time() + VERIFIED_TOKEN_TTL_SECONDS, float(claims.get('exp', 0)))
+        self._verified[token_hash] = (claims, valid_until)
+        self._verified.move_to_end(token_hash)
+        while len(self._verified) > VERIFIED_TOKEN_CACHE_SIZE:
+            self._verified.popitem(last=False)
+
+    async def verify(self, id_token: str) -> dict:
+        """Verify an ID token and return its claims (raises jwt.PyJWTError)"""
+        token_hash = hashlib.sha256(id_token.encode()).hexdigest()
+        claims = self._cache_get(token_hash)
+        if claims is not None:
+            self.hits += 1
+            return claims
+        self.misses += 1
+
+        claims = await verify_jwt(id_token, self.keys, audience=self.project_id, issuer=self.issuer)
+        if not claims.get('sub'):
+            raise jwt.InvalidTokenError("Token has an empty subject")
+        if claims.get('auth_time', 0) > time.time() + 5:
+            raise jwt.InvalidTokenError("Token auth_time is in the future")
+        claims['uid'] = claims['sub']
+
+        self._cache_put(token_hash, claims)
+        return claims
+
+    def get_stats(self) -> dict:
+        return {
+            **self.keys.get_stats(),
+            'verified_tokens_cached': len(self._verified),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+_token_verifier: Optional[FirebaseTokenVerifier] = None
+
+def get_token_verifier() -> Optional[FirebaseTokenVerifier]:
+    """Get the cached token verifier, None if the project id is unknown"""
+    global _token_verifier
+    if _token_verifier is None:
+        app = get_firebase_app()
+        project_id = os.environ.get('FIREBASE_PROJECT_ID') or (getattr(app, 'project_id', None) if app else None)
+        if not project_id:
+            return None
+        _token_verifier = FirebaseTokenVerifier(project_id)
+    return _token_verifier
+
+
 async def verify_firebase_token(id_token: str) -> dict:
     """
     Verify Firebase ID token and return user info.
@@ -83,9 +186,13 @@ async def verify_firebase_token(id_token: str) -> dict:
             detail="Firebase not configured. Please set up Firebase credentials."
         )
 
+    verifier = get_token_verifier()
     try:
         # Verify the ID token
-        decoded_token = firebase_auth.verify_id_token(id_token)
+        if verifier:
+            decoded_token = await verifier.verify(id_token)
+        else:
+            decoded_token = await asyncio.to_thread(firebase_auth.verify_id_token, id_token)
 
         # Extract user information
         uid = decoded_token.get('uid')
@@ -114,12 +221,18 @@ async def verify_firebase_token(id_token: str) -> dict:
             'sign_in_provider': sign_in_provider
         }
 
-    except firebase_auth.InvalidIdTokenError:
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Firebase token expired")
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid Firebase token")
+    except httpx.HTTPError:
+        raise HTTPException(status_code=500, detail="Failed to fetch Firebase certificates")
     except firebase_auth.ExpiredIdTokenError:
         raise HTTPException(status_code=401, detail="Firebase token expired")
     except firebase_auth.RevokedIdTokenError:
         raise HTTPException(status_code=401, detail="Firebase token revoked")
+    except firebase_auth.InvalidIdTokenError:
+        raise HTTPException(status_code=401, detail="Invalid Firebase token")
     except firebase_auth.CertificateFetchError:
         raise HTTPException(status_code=500, detail="Failed to fetch Firebase certificates")
     except Exception as e:
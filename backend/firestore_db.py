@@ -15,6 +15,8 @@ import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from google.cloud.firestore_v1 import FieldFilter, Query
 
+from order_ids import get_order_id_generator, is_order_id
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env', override=False)
@@ -73,6 +75,13 @@ def get_firestore_client():
     return None
 
 
+# Most writes Firestore accepts in one batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Most units of one product a cart line may hold
+CART_MAX_QUANTITY = 100
+
+
 # Helper function to convert Firestore document to dict
 def doc_to_dict(doc) -> Optional[Dict]:
     """Convert Firestore document to dictionary with ID"""
@@ -93,6 +102,19 @@ def get_utc_now():
     return datetime.now(timezone.utc)
 
 
+# Product fields copied onto wishlist entries so the wishlist page needs no product reads
+WISHLIST_SNAPSHOT_FIELDS = ('name', 'price', 'original_price', 'image', 'in_stock')
+
+
+def wishlist_snapshot(product: Dict) -> Dict:
+    """Compact product snapshot stored on a wishlist entry"""
+    snapshot = {field: product.get(field) for field in WISHLIST_SNAPSHOT_FIELDS}
+    if not snapshot['image'] and product.get('images'):
+        snapshot['image'] = product['images'][0]
+    snapshot['in_stock'] = bool(product.get('in_stock', True))
+    return snapshot
+
+
 # ============ COLLECTIONS ============
 
 class FirestoreDB:
@@ -174,6 +196,14 @@ class FirestoreDB:
         doc = self.db.collection('vendors').document(vendor_id).get()
         return doc_to_dict(doc)
     
+    async def get_vendors_by_ids(self, vendor_ids: List[str]) -> Dict[str, Dict]:
+        """Get several vendors in one round trip, keyed by ID (missing vendors are left out)"""
+        if not vendor_ids:
+            return {}
+        refs = [self.db.collection('vendors').document(vendor_id) for vendor_id in vendor_ids]
+        vendors = docs_to_list(self.db.get_all(refs))
+        return {vendor['id']: vendor for vendor in vendors}
+    
     async def get_vendor_by_email(self, email: str) -> Optional[Dict]:
         """Get vendor by email"""
         docs = self.db.collection('vendors').where(
@@ -231,6 +261,14 @@ class FirestoreDB:
         doc = self.db.collection('products').document(product_id).get()
         return doc_to_dict(doc)
     
+    async def get_products_by_ids(self, product_ids: List[str]) -> Dict[str, Dict]:
+        """Get several products in one round trip, keyed by ID (missing products are left out)"""
+        if not product_ids:
+            return {}
+        refs = [self.db.collection('products').document(product_id) for product_id in product_ids]
+        products = docs_to_list(self.db.get_all(refs))
+        return {product['id']: product for product in products}
+    
     async def get_all_products(self, category: str = None, vendor_id: str = None, 
                                 in_stock: bool = None, limit: int = 100) -> List[Dict]:
         """Get all products with optional filters"""
@@ -251,6 +289,13 @@ class FirestoreDB:
         docs = self.db.collection('products').where('vendor_id', '==', vendor_id).limit(limit).get()
         return docs_to_list(docs)
     
+    async def get_vendor_product_skus(self, vendor_id: str) -> Dict[str, str]:
+        """SKU -> product ID for all of a vendor's products that have a SKU"""
+        docs = self.db.collection('products').where(
+            filter=FieldFilter('vendor_id', '==', vendor_id)
+        ).select(['sku']).stream()
+        return {doc.get('sku'): doc.id for doc in docs if (doc.to_dict() or {}).get('sku')}
+    
     async def search_products(self, query_text: str, limit: int = 50) -> List[Dict]:
         """Search products by name (basic search)"""
         # Firestore doesn't support full-text search natively
@@ -273,6 +318,17 @@ class FirestoreDB:
         self.db.collection('products').document(product_id).update(updates)
         return True
     
+    async def bulk_update_products(self, updates: Dict[str, Dict]) -> int:
+        """Update many products in batches of FIRESTORE_BATCH_LIMIT; returns products written"""
+        product_ids = list(updates)
+        now = get_utc_now()
+        for start in range(0, len(product_ids), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for product_id in product_ids[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.update(self.db.collection('products').document(product_id), {**updates[product_id], 'updated_at': now})
+            batch.commit()
+        return len(product_ids)
+    
     async def delete_product(self, product_id: str) -> bool:
         """Delete a product"""
         self.db.collection('products').document(product_id).delete()
@@ -280,28 +336,76 @@ class FirestoreDB:
     
     # ============ ORDERS ============
     
-    async def create_order(self, order_data: Dict) -> Dict:
-        """Create a new order"""
+    @staticmethod
+    def generate_order_id() -> str:
+        """Customer-facing order number, also used as the order's document id"""
+        return get_order_id_generator().next_id()
+    
+    @classmethod
+    def _prepare_order(cls, order_data: Dict) -> Dict:
         order_data['created_at'] = get_utc_now()
         order_data['updated_at'] = get_utc_now()
         order_data['status'] = order_data.get('status', 'pending')
+        order_data['order_id'] = order_data.get('order_id') or cls.generate_order_id()
+        return order_data
+    
+    async def create_order(self, order_data: Dict) -> Dict:
+        """Create a new order"""
+        order_data = self._prepare_order(order_data)
         
-        # Generate order ID
-        import random
-        import string
-        order_data['order_id'] = 'AFM-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        
-        doc_ref = self.db.collection('orders').add(order_data)[1]
+        # create() rather than set() so an id collision fails instead of overwriting
+        doc_ref = self.db.collection('orders').document(order_data['order_id'])
+        doc_ref.create(order_data)
         order_data['id'] = doc_ref.id
         return order_data
     
+    async def create_checkout(self, order_data: Dict, notifications: List[Dict], user_id: str,
+                              hold: Optional[Dict] = None, hold_updates: Optional[List[tuple]] = None) -> Dict:
+        """
+        Create an order, its vendor notifications and clear the user's cart atomically
+        
+        Everything is written in a single batch, so a failed checkout leaves
+        neither a half-notified order nor an emptied cart behind. The
+        inventory hold is converted in the same batch, together with
+        hold_updates (stock shard updates returning units the order does
+        not take); the conversion fails the whole batch if the hold changed
+        (e.g. was expired by the sweeper) since it was read. The cart is a
+        single document, so clearing it is one delete.
+        """
+        order_data = self._prepare_order(order_data)
+        
+        batch = self.db.batch()
+        order_ref = self.db.collection('orders').document(order_data['order_id'])
+        batch.create(order_ref, order_data)
+        for notification in notifications:
+            notification['created_at'] = get_utc_now()
+            notification['is_read'] = False
+            batch.set(self.db.collection('notifications').document(), notification)
+        if hold:
+            option = self.db.write_option(last_update_time=hold['update_time']) if hold.get('update_time') else None
+            batch.update(self.db.collection('inventory_holds').document(hold['id']), {
+                'status': 'converted',
+                'order_id': order_data['order_id'],
+                'converted_at': get_utc_now()
+            }, option=option)
+            for ref, data in hold_updates or []:
+                batch.update(ref, data)
+        batch.delete(self._cart_ref(user_id))
+        batch.commit()
+        
+        order_data['id'] = order_ref.id
+        return order_data
+    
     async def get_order_by_id(self, order_id: str) -> Optional[Dict]:
         """Get order by document ID"""
         doc = self.db.collection('orders').document(order_id).get()
         return doc_to_dict(doc)
     
     async def get_order_by_order_id(self, order_id: str) -> Optional[Dict]:
-        """Get order by order_id field"""
+        """Get order by its customer-facing order number"""
+        if is_order_id(order_id):
+            return await self.get_order_by_id(order_id)
+        # Orders created before order numbers became document ids
         docs = self.db.collection('orders').where(
             filter=FieldFilter('order_id', '==', order_id)
         ).limit(1).get()
@@ -356,101 +460,150 @@ class FirestoreDB:
         return True
     
     # ============ CART ============
+    # One document per user, carts/{user_id}, with an items map keyed by product id
+    
+    def _cart_ref(self, user_id: str):
+        return self.db.collection('carts').document(user_id)
+    
+    def _set_cart_item(self, user_id: str, product_id: str, item: Any) -> None:
+        now = get_utc_now()
+        if isinstance(item, dict):
+            item = {'product_id': product_id, **item, 'updated_at': now}
+        # merge=True deep-merges the items map, so other lines are untouched
+        self._cart_ref(user_id).set({
+            'user_id': user_id,
+            'items': {product_id: item},
+            'updated_at': now
+        }, merge=True)
     
     async def get_user_cart(self, user_id: str) -> List[Dict]:
         """Get cart items for a user"""
-        docs = self.db.collection('carts').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).get()
-        return docs_to_list(docs)
+        doc = self._cart_ref(user_id).get()
+        if not doc.exists:
+            return []
+        items = (doc.to_dict() or {}).get('items', {})
+        return [
+            {**item, 'id': product_id, 'user_id': user_id, 'product_id': product_id}
+            for product_id, item in items.items()
+        ]
     
     async def add_to_cart(self, user_id: str, product_id: str, quantity: int = 1) -> Dict:
-        """Add item to cart"""
-        # Check if item already in cart
-        docs = self.db.collection('carts').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).where(
-            filter=FieldFilter('product_id', '==', product_id)
-        ).limit(1).get()
-        
-        for doc in docs:
-            # Update quantity
-            current = doc.to_dict()
-            new_qty = current.get('quantity', 0) + quantity
-            doc.reference.update({'quantity': new_qty, 'updated_at': get_utc_now()})
-            return {'id': doc.id, 'quantity': new_qty}
-        
-        # Add new cart item
-        cart_item = {
-            'user_id': user_id,
-            'product_id': product_id,
-            'quantity': quantity,
-            'created_at': get_utc_now(),
-            'updated_at': get_utc_now()
-        }
-        doc_ref = self.db.collection('carts').add(cart_item)[1]
-        cart_item['id'] = doc_ref.id
-        return cart_item
-    
-    async def update_cart_item(self, cart_item_id: str, quantity: int) -> bool:
-        """Update cart item quantity"""
+        """Add item to cart, adding to the quantity if it is already there; returns the resulting line"""
+        from google.cloud.firestore_v1 import Increment
+        self._set_cart_item(user_id, product_id, {'quantity': Increment(quantity)})
+        # Increment is applied on the server, so read the line back for its new quantity
+        doc = self._cart_ref(user_id).get()
+        item = ((doc.to_dict() or {}).get('items', {}) if doc.exists else {}).get(product_id, {})
+        return {**item, 'id': product_id, 'user_id': user_id, 'product_id': product_id}
+    
+    async def update_cart_item(self, user_id: str, cart_item_id: str, quantity: int) -> bool:
+        """Update cart item quantity; cart item ids are product ids"""
         if quantity <= 0:
-            self.db.collection('carts').document(cart_item_id).delete()
-        else:
-            self.db.collection('carts').document(cart_item_id).update({
-                'quantity': quantity,
-                'updated_at': get_utc_now()
-            })
+            return await self.remove_from_cart(user_id, cart_item_id)
+        await self.update_cart_item_quantity(user_id, cart_item_id, quantity)
         return True
     
     async def update_cart_item_quantity(self, user_id: str, product_id: str, quantity: int) -> Dict:
         """Update cart item quantity by user_id and product_id"""
-        docs = self.db.collection('carts').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).where(
-            filter=FieldFilter('product_id', '==', product_id)
-        ).limit(1).get()
-        
-        for doc in docs:
-            if quantity <= 0:
-                doc.reference.delete()
-                return {'deleted': True}
-            else:
-                doc.reference.update({
-                    'quantity': quantity,
-                    'updated_at': get_utc_now()
-                })
-                return {'id': doc.id, 'product_id': product_id, 'quantity': quantity}
-        
-        return None
+        if quantity <= 0:
+            await self.remove_from_cart(user_id, product_id)
+            return {'deleted': True}
+        self._set_cart_item(user_id, product_id, {'quantity': quantity})
+        return {'id': product_id, 'product_id': product_id, 'quantity': quantity}
     
     async def remove_from_cart(self, user_id: str, product_id: str) -> bool:
         """Remove item from cart by user_id and product_id"""
-        docs = self.db.collection('carts').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).where(
-            filter=FieldFilter('product_id', '==', product_id)
-        ).get()
-        
-        for doc in docs:
-            doc.reference.delete()
+        from google.cloud.firestore_v1 import DELETE_FIELD
+        self._set_cart_item(user_id, product_id, DELETE_FIELD)
         return True
     
+    async def bulk_update_cart(self, user_id: str, operations: List[Dict]) -> Dict:
+        """
+        Apply add/set/remove operations to a cart in two round trips
+        
+        The cart and every product named by an add or set are read in one
+        get_all; all changes are then written with one merge, adds as
+        Increment so concurrent writers are not overwritten. Nothing is
+        written if a product does not exist or a line would end up above
+        CART_MAX_QUANTITY. Returns {'items': resulting cart lines,
+        'missing': unknown product ids, 'over_limit': product ids whose
+        line would exceed the cap}.
+        """
+        from google.cloud.firestore_v1 import DELETE_FIELD, Increment
+        
+        # Fold operations per product in order: ('inc', n), ('set', n) or ('remove', 0)
+        changes: Dict[str, tuple] = {}
+        for operation in operations:
+            product_id, quantity = operation['product_id'], operation.get('quantity', 0)
+            kind, current = changes.get(product_id, ('inc', 0))
+            if operation['op'] == 'add':
+                changes[product_id] = ('set', current + quantity) if kind != 'inc' else ('inc', current + quantity)
+            elif operation['op'] == 'set' and quantity > 0:
+                changes[product_id] = ('set', quantity)
+            else:
+                changes[product_id] = ('remove', 0)
+        
+        cart_ref = self._cart_ref(user_id)
+        product_refs = {
+            product_id: self.db.collection('products').document(product_id)
+            for product_id, (kind, _) in changes.items() if kind != 'remove'
+        }
+        snapshots = {doc.reference.path: doc for doc in self.db.get_all([cart_ref, *product_refs.values()])}
+        missing = [product_id for product_id, ref in product_refs.items() if not snapshots[ref.path].exists]
+        cart_doc = snapshots[cart_ref.path]
+        items = dict((cart_doc.to_dict() or {}).get('items', {})) if cart_doc.exists else {}
+        if missing:
+            return {'items': [], 'missing': missing, 'over_limit': []}
+        
+        # Repeated adds are only capped once folded onto the existing line
+        over_limit = [
+            product_id for product_id, (kind, quantity) in changes.items()
+            if kind != 'remove' and quantity + (items.get(product_id, {}).get('quantity', 0) if kind == 'inc' else 0) > CART_MAX_QUANTITY
+        ]
+        if over_limit:
+            return {'items': [], 'missing': [], 'over_limit': over_limit}
+        
+        now = get_utc_now()
+        writes = {}
+        for product_id, (kind, quantity) in changes.items():
+            if kind == 'remove':
+                writes[product_id] = DELETE_FIELD
+                items.pop(product_id, None)
+                continue
+            if kind == 'inc':
+                writes[product_id] = {'product_id': product_id, 'quantity': Increment(quantity), 'updated_at': now}
+                quantity += items.get(product_id, {}).get('quantity', 0)
+            else:
+                writes[product_id] = {'product_id': product_id, 'quantity': quantity, 'updated_at': now}
+            items[product_id] = {**items.get(product_id, {}), 'product_id': product_id, 'quantity': quantity, 'updated_at': now}
+        
+        if writes:
+            cart_ref.set({'user_id': user_id, 'items': writes, 'updated_at': now}, merge=True)
+        return {
+            'items': [{**item, 'id': product_id, 'user_id': user_id} for product_id, item in items.items()],
+            'missing': [],
+            'over_limit': []
+        }
+    
     async def clear_cart(self, user_id: str) -> bool:
         """Alias for clear_user_cart"""
         return await self.clear_user_cart(user_id)
     
     async def clear_user_cart(self, user_id: str) -> bool:
         """Clear all cart items for a user"""
-        docs = self.db.collection('carts').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).get()
-        
-        for doc in docs:
-            doc.reference.delete()
+        self._cart_ref(user_id).delete()
         return True
     
     # ============ WISHLIST ============
+    # Entries are wishlists/{user_id}_{product_id} with a product snapshot
+    
+    def _wishlist_ref(self, user_id: str, product_id: str):
+        return self.db.collection('wishlists').document(f"{user_id}_{product_id}")
+    
+    @staticmethod
+    def _wishlist_entry(item: Dict) -> Dict:
+        product = {'id': item.get('product_id'), **{f: item.get(f) for f in WISHLIST_SNAPSHOT_FIELDS}}
+        return {**item, 'product': product}
     
     async def get_user_wishlist(self, user_id: str) -> List[Dict]:
         """Get user's wishlist with product details"""
@@ -460,51 +613,98 @@ class FirestoreDB:
             ).get()
             
             wishlist_items = docs_to_list(docs)
+            legacy = [item for item in wishlist_items if item['id'] != f"{user_id}_{item.get('product_id')}"]
+            if legacy:
+                wishlist_items = [item for item in wishlist_items if item not in legacy]
+                wishlist_items += await self._migrate_wishlist_entries(user_id, legacy)
             
-            # Get product details for each item
-            for item in wishlist_items:
-                product = await self.get_product_by_id(item.get('product_id'))
-                if product:
-                    item['product'] = product
-            
-            return wishlist_items
+            wishlist_items.sort(key=lambda x: str(x.get('created_at', '')), reverse=True)
+            return [self._wishlist_entry(item) for item in wishlist_items]
         except Exception as e:
             logger.error(f"Error fetching wishlist: {e}")
             return []
     
-    async def add_to_wishlist(self, user_id: str, product_id: str) -> Dict:
-        """Add product to wishlist"""
-        # Check if already exists
-        docs = self.db.collection('wishlists').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).where(
-            filter=FieldFilter('product_id', '==', product_id)
-        ).limit(1).get()
+    async def _migrate_wishlist_entries(self, user_id: str, legacy: List[Dict]) -> List[Dict]:
+        """Rewrite auto-id entries without snapshots under their deterministic ids"""
+        products = await self.get_products_by_ids(list({item.get('product_id') for item in legacy}))
+        migrated = {}
+        batch = self.db.batch()
+        for item in legacy:
+            product = products.get(item.get('product_id'))
+            if product and product['id'] not in migrated:
+                entry = {
+                    'user_id': user_id,
+                    'product_id': product['id'],
+                    **wishlist_snapshot(product),
+                    'created_at': item.get('created_at') or get_utc_now()
+                }
+                batch.set(self._wishlist_ref(user_id, product['id']), entry)
+                migrated[product['id']] = {**entry, 'id': f"{user_id}_{product['id']}"}
+            batch.delete(self.db.collection('wishlists').document(item['id']))
+        batch.commit()
+        return list(migrated.values())
+    
+    async def add_to_wishlist(self, user_id: str, product_id: str) -> Optional[Dict]:
+        """Add product to wishlist; None if the product does not exist"""
+        from google.api_core.exceptions import AlreadyExists
         
-        for doc in docs:
-            return {'id': doc.id, 'message': 'Already in wishlist'}
-        
-        # Add new item
+        product = await self.get_product_by_id(product_id)
+        if not product:
+            return None
         item = {
             'user_id': user_id,
             'product_id': product_id,
+            **wishlist_snapshot(product),
             'created_at': get_utc_now()
         }
-        doc_ref = self.db.collection('wishlists').add(item)[1]
+        doc_ref = self._wishlist_ref(user_id, product_id)
+        try:
+            doc_ref.create(item)
+        except AlreadyExists:
+            return {'id': doc_ref.id, 'message': 'Already in wishlist'}
         item['id'] = doc_ref.id
         return item
     
     async def remove_from_wishlist(self, user_id: str, product_id: str) -> bool:
         """Remove product from wishlist"""
+        self._wishlist_ref(user_id, product_id).delete()
+        return True
+    
+    async def toggle_wishlist(self, user_id: str, product_id: str) -> Optional[bool]:
+        """Add or remove a product; returns whether it is now wishlisted, None if it does not exist"""
+        if self._wishlist_ref(user_id, product_id).get().exists:
+            await self.remove_from_wishlist(user_id, product_id)
+            return False
+        item = await self.add_to_wishlist(user_id, product_id)
+        return None if item is None else True
+    
+    async def refresh_wishlist_snapshots(self, product_id: str, product: Optional[Dict]) -> int:
+        """
+        Fan a product change out to every wishlist entry for it
+        
+        Entries whose snapshot already matches are skipped, so stock
+        changes that do not flip in_stock cost no writes. Entries for a
+        deleted product (product None) are removed. Returns entries written.
+        """
         docs = self.db.collection('wishlists').where(
-            filter=FieldFilter('user_id', '==', user_id)
-        ).where(
             filter=FieldFilter('product_id', '==', product_id)
         ).get()
-        
+        snapshot = wishlist_snapshot(product) if product else None
+        refs = []
         for doc in docs:
-            doc.reference.delete()
-        return True
+            data = doc.to_dict() or {}
+            if snapshot is None or any(data.get(f) != v for f, v in snapshot.items()):
+                refs.append(doc.reference)
+        
+        for start in range(0, len(refs), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for ref in refs[start:start + FIRESTORE_BATCH_LIMIT]:
+                if snapshot is None:
+                    batch.delete(ref)
+                else:
+                    batch.update(ref, snapshot)
+            batch.commit()
+        return len(refs)
     
     # ============ NOTIFICATIONS ============
     
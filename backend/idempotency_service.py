@@ -0,0 +1,287 @@
+"""
+Idempotency Keys for AfroMarket UK
+Replays stored responses for retried order and payment requests
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+# How long a completed response is replayed for
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# Most completed responses kept in memory per worker
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', '20000'))
+# How long a duplicate waits for the first request before giving up with a 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '30'))
+# How long a Firestore claim stays locked without renewal; the running worker renews it
+# every third of this, so only a claim left by a dead worker ever expires
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '60'))
+# "memory" (default) or "firestore" to share keys across workers and restarts
+IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')
+# Longest Idempotency-Key header accepted
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+IN_PROGRESS, COMPLETED = 'in_progress', 'completed'
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, so a key reused for a different request is caught"""
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _mismatch() -> HTTPException:
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+
+def _still_running() -> HTTPException:
+    return HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+
+class IdempotencyStore:
+    """
+    Runs each (scope, key) once and replays its response to retries
+
+    The first request for a key executes; duplicates arriving while it runs
+    await the same future rather than repeating the writes, notifications
+    and emails. Successful responses are kept for IDEMPOTENCY_TTL_SECONDS.
+    Failures are not stored, so a client can retry after an error with the
+    same key. A key reused with a different request body gets a 422.
+
+    With a Firestore client the key is also claimed in the idempotency_keys
+    collection, so a retry that lands on another worker waits for (or
+    replays) the first worker's result. The claim is a lease renewed while
+    the request runs, however long it takes; other workers only take the
+    key over once a lease has lapsed, i.e. its worker died.
+    """
+
+    COLLECTION = 'idempotency_keys'
+
+    def __init__(self, db=None, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+                 max_entries: int = IDEMPOTENCY_MAX_ENTRIES, wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+                 lease_seconds: float = IDEMPOTENCY_LEASE_SECONDS):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_seconds = wait_seconds
+        self.lease_seconds = lease_seconds
+        # store key -> (fingerprint, response, expires_at)
+        self._completed: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+        # store key -> (fingerprint, future of the first execution)
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+
+    async def run(self, scope: str, key: str, fingerprint: str,
+                  execute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Execute once per (scope, key); returns (response, replayed)
+
+        scope should include the caller's user id so keys from different
+        users never collide.
+        """
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+        store_key = f"{scope}:{key}"
+
+        stored = self._local(store_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint), True
+
+        in_flight = self._in_flight.get(store_key)
+        if in_flight is not None:
+            if in_flight[0] != fingerprint:
+                self.mismatched += 1
+                raise _mismatch()
+            self.waited += 1
+            try:
+                response = await asyncio.wait_for(asyncio.shield(in_flight[1]), self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise _still_running()
+            return response, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[store_key] = (fingerprint, future)
+        lease: Optional[asyncio.Task] = None
+        try:
+            if self.db is not None:
+                remote = await self._claim(store_key, fingerprint)
+                if remote is not None:
+                    response = self._replay(remote, fingerprint)
+                    self._remember(store_key, fingerprint, response)
+                    future.set_result(response)
+                    return response, True
+                lease = asyncio.create_task(self._renew_lease(store_key))
+
+            try:
+                response = jsonable_encoder(await execute())
+            except BaseException:
+                if self.db is not None:
+                    lease.cancel()
+                    await self._forget_remote(store_key)
+                raise
+            if lease is not None:
+                lease.cancel()
+            self.executed += 1
+            self._remember(store_key, fingerprint, response)
+            if self.db is not None:
+                await self._save_remote(store_key, fingerprint, response)
+            future.set_result(response)
+            return response, False
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Waiters see the failure; nobody else may be awaiting it
+                future.exception()
+            raise
+        finally:
+            if lease is not None:
+                lease.cancel()
+            self._in_flight.pop(store_key, None)
+
+    # ---- local entries ----
+
+    def _local(self, store_key: str) -> Optional[Tuple[str, Any]]:
+        entry = self._completed.get(store_key)
+        if entry is None:
+            return None
+        fingerprint, response, expires_at = entry
+        if time.time() > expires_at:
+            self._completed.pop(store_key, None)
+            return None
+        return fingerprint, response
+
+    def _remember(self, store_key: str, fingerprint: str, response: Any) -> None:
+        self._completed[store_key] = (fingerprint, response, time.time() + self.ttl_seconds)
+        self._completed.move_to_end(store_key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+    def _replay(self, stored: Tuple[str, Any], fingerprint: str) -> Any:
+        if stored[0] != fingerprint:
+            self.mismatched += 1
+            raise _mismatch()
+        self.replayed += 1
+        return stored[1]
+
+    # ---- Firestore entries ----
+
+    def _doc(self, store_key: str):
+        # Document ids may not contain "/"
+        return self.db.collection(self.COLLECTION).document(hashlib.sha256(store_key.encode()).hexdigest())
+
+    async def _claim(self, store_key: str, fingerprint: str) -> Optional[Tuple[str, Any]]:
+        """
+        Claim the key for this worker; returns (fingerprint, response) if
+        another worker already completed it, waiting while it is running
+        """
+        from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+
+        doc_ref = self._doc(store_key)
+        deadline = time.monotonic() + self.wait_seconds
+        delay = 0.05
+        while True:
+            now = time.time()
+            try:
+                await asyncio.to_thread(doc_ref.create, {
+                    'status': IN_PROGRESS,
+                    'fingerprint': fingerprint,
+                    'expires_at': now + self.ttl_seconds,
+                    'locked_until': now + self.lease_seconds
+                })
+                return None
+            except AlreadyExists:
+                pass
+
+            snapshot = await asyncio.to_thread(doc_ref.get)
+            data = snapshot.to_dict() if snapshot.exists else None
+            if data is None:
+                continue
+            if data.get('status') == COMPLETED and now <= data.get('expires_at', 0):
+                return data.get('fingerprint'), data.get('response')
+            if data.get('status') != COMPLETED and data.get('fingerprint') != fingerprint:
+                self.mismatched += 1
+                raise _mismatch()
+            if data.get('status') == COMPLETED or now > data.get('locked_until', 0):
+                # Expired result, or a worker died mid-request - take the key over, unless
+                # the lease was renewed or another waiter took it over since we read it
+                try:
+                    await asyncio.to_thread(
+                        doc_ref.delete, option=self.db.write_option(last_update_time=snapshot.update_time)
+                    )
+                except (FailedPrecondition, NotFound):
+                    pass
+                continue
+
+            if time.monotonic() > deadline:
+                raise _still_running()
+            self.waited += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def _renew_lease(self, store_key: str) -> None:
+        """Keep this worker's claim locked while its request runs"""
+        doc_ref = self._doc(store_key)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(doc_ref.update, {'locked_until': time.time() + self.lease_seconds})
+            except Exception as e:
+                logger.error(f"Failed to renew idempotency lease for {store_key}: {e}")
+
+    async def _save_remote(self, store_key: str, fingerprint: str, response: Any) -> None:
+        try:
+            await asyncio.to_thread(self._doc(store_key).set, {
+                'status': COMPLETED,
+                'fingerprint': fingerprint,
+                'response': response,
+                'expires_at': time.time() + self.ttl_seconds
+            })
+        except Exception as e:
+            logger.error(f"Failed to store idempotent response for {store_key}: {e}")
+
+    async def _forget_remote(self, store_key: str) -> None:
+        try:
+            await asyncio.to_thread(self._doc(store_key).delete)
+        except Exception as e:
+            logger.error(f"Failed to release idempotency key {store_key}: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            'backend': 'firestore' if self.db is not None else 'memory',
+            'stored': len(self._completed),
+            'in_flight': len(self._in_flight),
+            'executed': self.executed,
+            'replayed': self.replayed,
+            'waited': self.waited,
+            'mismatched': self.mismatched
+        }
+
+
+# Singleton instance
+_idempotency_store: Optional[IdempotencyStore] = None
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Get the configured idempotency key store"""
+    global _idempotency_store
+    if _idempotency_store is None:
+        db = None
+        if IDEMPOTENCY_BACKEND == 'firestore':
+            from firestore_db import get_firestore_client
+            db = get_firestore_client()
+            if db is None:
+                logger.warning("Firestore unavailable - idempotency keys kept in memory")
+        _idempotency_store = IdempotencyStore(db)
+    return _idempotency_store
@@ -0,0 +1,73 @@
+"""
+AfroMarket UK - Catalog Import
+Imports a vendor's CSV or XLSX product catalog from the command line
+
+Rows are validated against ProductCreate plus a required sku column and an
+optional stock_quantity column. SKUs the vendor already sells update the
+existing product; everything else is created. Progress and rejected rows
+are printed as the file is read. Running servers pick up the new products
+when their catalog cache next reloads (CATALOG_TTL_SECONDS).
+
+Usage:
+    python import_products.py catalog.csv --vendor-email sales@afwhouse.co.uk --dry-run
+    python import_products.py catalog.xlsx --vendor-id <vendor id>
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+from firestore_db import firestore_db, get_firebase_app
+from product_bulk_service import import_products, iter_upload_rows, upload_format, xlsx_import_available
+from product_models import ProductCreate
+from wishlist_service import get_wishlist_fanout
+
+
+async def run(args) -> int:
+    if get_firebase_app() is None:
+        raise SystemExit("Firestore is not configured")
+
+    if args.vendor_id:
+        vendor = await firestore_db.get_vendor_by_id(args.vendor_id)
+    else:
+        vendor = await firestore_db.get_vendor_by_email(args.vendor_email)
+    if not vendor:
+        raise SystemExit("Vendor not found")
+    if vendor.get('status') != 'approved':
+        print(f"Warning: vendor {vendor.get('business_name')} is not approved yet", file=sys.stderr)
+
+    file_format = upload_format('', args.path)
+    if not file_format:
+        raise SystemExit("Expected a .csv or .xlsx file")
+    if file_format == 'xlsx' and not xlsx_import_available():
+        raise SystemExit("XLSX import needs openpyxl (pip install openpyxl)")
+
+    started = time.perf_counter()
+    with open(args.path, 'rb') as file:
+        rows = iter_upload_rows(file, file_format)
+        async for event in import_products(vendor['id'], rows, ProductCreate, dry_run=args.dry_run):
+            if event['type'] == 'error':
+                where = f"row {event['row']}" if event['row'] else "file"
+                print(f"  {where}{' (' + event['sku'] + ')' if event['sku'] else ''}: {event['error']}")
+            elif event['type'] == 'progress':
+                print(f"{event['rows']} rows read: {event['created']} new, {event['updated']} updated, "
+                      f"{event['errors']} error(s)")
+            else:
+                action = "Would import" if args.dry_run else "Imported"
+                print(f"{action} {event['rows']} rows for {vendor.get('business_name')} in "
+                      f"{time.perf_counter() - started:.1f}s: {event['created']} new, {event['updated']} updated, "
+                      f"{event['errors']} error(s){' - stopped early' if event['aborted'] else ''}")
+                await get_wishlist_fanout().wait()
+                return 1 if event['errors'] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or XLSX catalog file")
+    vendor_group = parser.add_mutually_exclusive_group(required=True)
+    vendor_group.add_argument("--vendor-id")
+    vendor_group.add_argument("--vendor-email")
+    parser.add_argument("--dry-run", action="store_true", help="Validate rows without writing")
+    sys.exit(asyncio.run(run(parser.parse_args())))
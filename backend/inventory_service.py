@@ -0,0 +1,394 @@
+"""
+Inventory Reservations for AfroMarket UK
+Sharded stock counters with short-lived checkout holds and a background sweeper
+"""
+
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from google.cloud.firestore_v1 import FieldFilter, Increment, transactional
+
+logger = logging.getLogger(__name__)
+
+# Counter shards per product; each shard can take about one write per second
+INVENTORY_SHARDS = int(os.environ.get('INVENTORY_SHARDS', '10'))
+# How long checkout holds stock while the customer pays
+INVENTORY_HOLD_TTL_SECONDS = int(os.environ.get('INVENTORY_HOLD_TTL_SECONDS', '600'))
+# How often expired holds are released and product stock fields refreshed
+INVENTORY_SWEEP_INTERVAL = float(os.environ.get('INVENTORY_SWEEP_INTERVAL', '30'))
+# Most expired holds released per sweep
+INVENTORY_SWEEP_BATCH = 200
+
+HELD, CONVERTED, RELEASED, EXPIRED = 'held', 'converted', 'released', 'expired'
+
+
+def _product_stock(product: Dict) -> Optional[int]:
+    """Tracked stock of a product document, None when the product does not track stock"""
+    stock = product.get('stock_quantity', product.get('stock'))
+    return int(stock) if isinstance(stock, (int, float)) else None
+
+
+def split_stock(total: int, shards: int = INVENTORY_SHARDS) -> List[int]:
+    """Spread units evenly over shards (10 over 4 -> [3, 3, 2, 2])"""
+    total = max(0, int(total))
+    return [total // shards + (1 if i < total % shards else 0) for i in range(shards)]
+
+
+class InventoryService:
+    """
+    Stock reservations on sharded counters
+
+    Each tracked product has INVENTORY_SHARDS counter documents under
+    inventory/{product_id}/shards whose "available" fields add up to the
+    units left to sell and whose "held" fields add up to the units in
+    open holds. A reservation transaction starts at a random shard
+    and only reads further shards if the first cannot cover the quantity,
+    so concurrent buyers of the same product mostly lock different
+    documents instead of aborting each other on the product document.
+
+    Reserved units are recorded on an inventory_holds document with an
+    expiry. Checkout converts the hold in its order batch, returning any
+    units the order does not take, a cancelled payment releases it, and the sweeper returns the units of holds that
+    were abandoned. Product stock_quantity/in_stock fields are refreshed
+    from the shards by the sweeper rather than on every sale.
+    """
+
+    def __init__(self, shards: int = INVENTORY_SHARDS, hold_ttl: int = INVENTORY_HOLD_TTL_SECONDS,
+                 sweep_interval: float = INVENTORY_SWEEP_INTERVAL):
+        self.shards = shards
+        self.hold_ttl = hold_ttl
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+        # Products whose shards changed since the last stock roll-up
+        self._dirty: Set[str] = set()
+        self.holds_created = 0
+        self.holds_converted = 0
+        self.holds_released = 0
+        self.holds_expired = 0
+        self.rejected = 0
+
+    @property
+    def db(self):
+        from firestore_db import firestore_db
+        return firestore_db.db
+
+    def _shard_ref(self, product_id: str, shard: int):
+        return self.db.collection('inventory').document(product_id).collection('shards').document(str(shard))
+
+    def hold_ref(self, hold_id: str):
+        return self.db.collection('inventory_holds').document(hold_id)
+
+    # ---- reservations ----
+
+    async def reserve(self, user_id: str, items: Dict[str, int]) -> Dict:
+        """
+        Hold stock for {product_id: quantity}, all or nothing
+
+        Raises HTTPException(409) naming the first product that is short.
+        Products that do not track stock are passed through unheld.
+        """
+        # Transactions retry on contention and block while they do
+        hold = await asyncio.to_thread(self._reserve, user_id, items)
+        self.holds_created += 1
+        self._dirty.update(hold['allocations'])
+        return hold
+
+    def _reserve(self, user_id: str, items: Dict[str, int]) -> Dict:
+        hold_id = uuid.uuid4().hex
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.hold_ttl)
+
+        @transactional
+        def run(transaction):
+            allocations: Dict[str, Dict[str, int]] = {}
+            writes = []
+            for product_id, quantity in items.items():
+                meta_ref = self.db.collection('inventory').document(product_id)
+                meta = next(iter(self.db.get_all([meta_ref], transaction=transaction)))
+                if not meta.exists:
+                    product = next(iter(self.db.get_all(
+                        [self.db.collection('products').document(product_id)], transaction=transaction
+                    )))
+                    stock = _product_stock(product.to_dict() or {}) if product.exists else None
+                    if stock is None:
+                        continue
+                    # First reservation for this product - create its shards from the stock field
+                    counts = split_stock(stock, self.shards)
+                    writes.append((meta_ref, {'shards': self.shards, 'created_at': datetime.now(timezone.utc)}, True))
+                    shard_values = {str(i): count for i, count in enumerate(counts)}
+                    shard_order = [str(i) for i in random.sample(range(self.shards), self.shards)]
+                else:
+                    shard_count = (meta.to_dict() or {}).get('shards', self.shards)
+                    shard_values = {}
+                    shard_order = [str(i) for i in random.sample(range(shard_count), shard_count)]
+
+                needed = quantity
+                taken: Dict[str, int] = {}
+                for shard in shard_order:
+                    if needed <= 0:
+                        break
+                    if shard not in shard_values:
+                        snapshot = next(iter(self.db.get_all(
+                            [self._shard_ref(product_id, int(shard))], transaction=transaction
+                        )))
+                        shard_values[shard] = (snapshot.to_dict() or {}).get('available', 0) if snapshot.exists else 0
+                    take = min(needed, shard_values[shard])
+                    if take > 0:
+                        taken[shard] = take
+                        needed -= take
+                if needed > 0:
+                    raise HTTPException(status_code=409, detail=f"Not enough stock for product {product_id}")
+
+                if not meta.exists:
+                    for shard, count in shard_values.items():
+                        writes.append((self._shard_ref(product_id, int(shard)),
+                                       {'available': count - taken.get(shard, 0), 'held': taken.get(shard, 0)}, True))
+                else:
+                    for shard, take in taken.items():
+                        writes.append((self._shard_ref(product_id, int(shard)),
+                                       {'available': shard_values[shard] - take, 'held': Increment(take)}, False))
+                allocations[product_id] = taken
+
+            for ref, data, create in writes:
+                if create:
+                    transaction.set(ref, data)
+                else:
+                    transaction.update(ref, data)
+            hold = {
+                'user_id': user_id,
+                'status': HELD,
+                'items': items,
+                'allocations': allocations,
+                'expires_at': expires_at,
+                'created_at': datetime.now(timezone.utc)
+            }
+            transaction.set(self.hold_ref(hold_id), hold)
+            return hold
+
+        try:
+            hold = run(self.db.transaction())
+        except HTTPException:
+            self.rejected += 1
+            raise
+        return {**hold, 'id': hold_id}
+
+    async def get_hold(self, hold_id: str) -> Optional[Dict]:
+        snapshot = self.hold_ref(hold_id).get()
+        if not snapshot.exists:
+            return None
+        return {**snapshot.to_dict(), 'id': snapshot.id, 'update_time': snapshot.update_time}
+
+    def conversion_updates(self, hold: Dict, quantities: Dict[str, int]) -> List[Tuple[Any, Dict]]:
+        """
+        Shard updates for converting a hold into an order of {product_id: quantity}
+
+        The held units leave the shards' held counters. A hold only has to
+        cover the basket, so a customer who lowered a quantity or removed a
+        line after reserving leaves units over; those are returned to the
+        shards they were taken from. All updates are blind increments,
+        written in the checkout batch with the conversion.
+        """
+        updates = []
+        for product_id, taken in hold.get('allocations', {}).items():
+            surplus = sum(taken.values()) - quantities.get(product_id, 0)
+            for shard, count in taken.items():
+                update = {'held': Increment(-count)}
+                returned = min(max(surplus, 0), count)
+                if returned:
+                    update['available'] = Increment(returned)
+                    surplus -= returned
+                updates.append((self._shard_ref(product_id, int(shard)), update))
+        return updates
+
+    def record_converted(self, hold: Dict) -> None:
+        """Count a hold converted into an order by the checkout batch"""
+        self.holds_converted += 1
+        # Surplus units may have gone back to the shards
+        self._dirty.update(hold.get('allocations', {}))
+
+    async def release(self, hold_id: str, status: str = RELEASED) -> bool:
+        """Return a hold's units to its shards; False if it was already converted or released"""
+        released = await asyncio.to_thread(self._release, hold_id, status)
+        if released is not None:
+            self._dirty.update(released)
+            if status == EXPIRED:
+                self.holds_expired += 1
+            else:
+                self.holds_released += 1
+        return released is not None
+
+    def _release(self, hold_id: str, status: str) -> Optional[List[str]]:
+        hold_ref = self.hold_ref(hold_id)
+
+        @transactional
+        def run(transaction):
+            snapshot = next(iter(self.db.get_all([hold_ref], transaction=transaction)))
+            hold = snapshot.to_dict() if snapshot.exists else None
+            if not hold or hold.get('status') != HELD:
+                return None
+            # Blind increments - no shard reads, so releases never contend with reservations
+            for product_id, taken in hold.get('allocations', {}).items():
+                for shard, count in taken.items():
+                    transaction.update(self._shard_ref(product_id, int(shard)),
+                                       {'available': Increment(count), 'held': Increment(-count)})
+            transaction.update(hold_ref, {'status': status, 'released_at': datetime.now(timezone.utc)})
+            return list(hold.get('allocations', {}))
+
+        return run(self.db.transaction())
+
+    # ---- stock levels ----
+
+    def _available(self, product_id: str) -> Optional[int]:
+        refs = [self._shard_ref(product_id, i) for i in range(self.shards)]
+        snapshots = [s for s in self.db.get_all(refs) if s.exists]
+        if not snapshots:
+            return None
+        # A stock count below the units held leaves a shortfall until those holds are released
+        return max(0, sum((s.to_dict() or {}).get('available', 0) for s in snapshots))
+
+    async def get_available(self, product_id: str) -> Optional[int]:
+        """Units left to sell, None if the product's shards do not exist yet"""
+        return await asyncio.to_thread(self._available, product_id)
+
+    async def set_stock(self, product_id: str, stock: int) -> None:
+        """Set a product's stock count, e.g. after a vendor stock take"""
+        await self.set_stock_many({product_id: stock})
+
+    async def set_stock_many(self, stock: Dict[str, int]) -> None:
+        """
+        Set the stock counts of many products, packing their shards into few transactions
+
+        A vendor's count includes units sitting in open holds, and those go
+        back to the shards when the holds are released or expire. So the
+        shards are set to the count minus the units still held, read from
+        the shards' held counters rather than by querying the holds. A
+        shortfall (count below held units) is carried as a negative value on
+        shard 0 and is cancelled out by the release.
+        """
+        await asyncio.to_thread(self._set_stock_many, stock)
+        # Product stock fields are rolled up from the shards by the sweeper
+        self._dirty.update(stock)
+
+    def _set_stock_many(self, stock: Dict[str, int]) -> None:
+        from firestore_db import FIRESTORE_BATCH_LIMIT
+
+        per_product = self.shards + 1
+        chunk = max(1, FIRESTORE_BATCH_LIMIT // per_product)
+        product_ids = list(stock)
+
+        for start in range(0, len(product_ids), chunk):
+            group = product_ids[start:start + chunk]
+
+            @transactional
+            def run(transaction):
+                # Reading the shards makes reservations and releases that touch them
+                # conflict with this write instead of being overwritten by it
+                refs = [self._shard_ref(product_id, i) for product_id in group for i in range(self.shards)]
+                held: Dict[str, int] = {}
+                for snapshot in self.db.get_all(refs, transaction=transaction):
+                    if snapshot.exists:
+                        product_id = snapshot.reference.parent.parent.id
+                        held[product_id] = held.get(product_id, 0) + (snapshot.to_dict() or {}).get('held', 0)
+
+                now = datetime.now(timezone.utc)
+                for product_id in group:
+                    # Holds taken before shards counted them can leave a negative total
+                    remaining = int(stock[product_id]) - max(0, held.get(product_id, 0))
+                    counts = split_stock(remaining, self.shards)
+                    if remaining < 0:
+                        counts[0] = remaining
+                    transaction.set(self.db.collection('inventory').document(product_id),
+                                    {'shards': self.shards, 'updated_at': now}, merge=True)
+                    for shard, count in enumerate(counts):
+                        # merge keeps each shard's held counter
+                        transaction.set(self._shard_ref(product_id, shard), {'available': count}, merge=True)
+
+            run(self.db.transaction())
+
+    async def _refresh_product_stock(self) -> int:
+        """Copy shard totals onto product documents and the catalog cache"""
+        from firestore_db import firestore_db
+        from catalog_cache import get_catalog_cache
+
+        dirty, self._dirty = self._dirty, set()
+        for product_id in dirty:
+            available = await self.get_available(product_id)
+            if available is None:
+                continue
+            updates = {'stock_quantity': available, 'in_stock': available > 0}
+            await firestore_db.update_product(product_id, updates)
+            product = await firestore_db.get_product_by_id(product_id)
+            if product:
+                get_catalog_cache().upsert_product(product)
+        return len(dirty)
+
+    # ---- sweeper ----
+
+    async def sweep(self) -> int:
+        """Release expired holds and refresh stock fields; returns the number of holds expired"""
+        now = datetime.now(timezone.utc)
+        expired = await asyncio.to_thread(lambda: list(
+            self.db.collection('inventory_holds')
+            .where(filter=FieldFilter('status', '==', HELD))
+            .where(filter=FieldFilter('expires_at', '<', now))
+            .limit(INVENTORY_SWEEP_BATCH)
+            .get()
+        ))
+        count = 0
+        for snapshot in expired:
+            if await self.release(snapshot.id, status=EXPIRED):
+                count += 1
+        await self._refresh_product_stock()
+        if count:
+            logger.info(f"Inventory sweeper released {count} expired hold(s)")
+        return count
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            started = time.monotonic()
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Inventory sweep failed: {e}")
+            logger.debug(f"Inventory sweep took {(time.monotonic() - started) * 1000:.0f}ms")
+
+    def start(self) -> None:
+        """Start the background sweeper"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    def stop(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def get_stats(self) -> dict:
+        return {
+            'shards_per_product': self.shards,
+            'hold_ttl_seconds': self.hold_ttl,
+            'holds_created': self.holds_created,
+            'holds_converted': self.holds_converted,
+            'holds_released': self.holds_released,
+            'holds_expired': self.holds_expired,
+            'rejected': self.rejected,
+            'pending_stock_refresh': len(self._dirty),
+            'sweeper_running': self._sweeper is not None and not self._sweeper.done()
+        }
+
+
+# Singleton instance
+_inventory_service: Optional[InventoryService] = None
+
+def get_inventory_service() -> InventoryService:
+    """Get InventoryService singleton instance"""
+    global _inventory_service
+    if _inventory_service is None:
+        _inventory_service = InventoryService()
+    return _inventory_service
@@ -0,0 +1,249 @@
+"""
+LLM Call Governor for AfroMarket UK
+Concurrency limit, deadlines, circuit breakers and usage metrics for LLM providers
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Most LLM calls in flight per worker, across all providers
+LLM_MAX_CONCURRENT = int(os.environ.get('LLM_MAX_CONCURRENT', '32'))
+# How long a request may wait for a free slot before it gets the fallback reply
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '2'))
+# Deadline for a complete (non-streaming) LLM call
+LLM_CALL_TIMEOUT = float(os.environ.get('LLM_CALL_TIMEOUT', '20'))
+# Deadline for a whole streamed reply
+LLM_STREAM_TIMEOUT = float(os.environ.get('LLM_STREAM_TIMEOUT', '60'))
+
+# Circuit breaker: trip when at least LLM_BREAKER_ERROR_RATE of the calls in the
+# last LLM_BREAKER_WINDOW seconds failed (and there were LLM_BREAKER_MIN_CALLS),
+# then stop calling the provider for LLM_BREAKER_COOLDOWN seconds
+LLM_BREAKER_ERROR_RATE = float(os.environ.get('LLM_BREAKER_ERROR_RATE', '0.5'))
+LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', '10'))
+LLM_BREAKER_WINDOW = float(os.environ.get('LLM_BREAKER_WINDOW', '60'))
+LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', '30'))
+
+# Latency samples kept per provider for percentiles
+_LATENCY_SAMPLES = 500
+
+
+class LLMUnavailable(Exception):
+    """Raised when a call is refused because the provider is tripped or all slots are busy"""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, error_rate: float = LLM_BREAKER_ERROR_RATE,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS, window: float = LLM_BREAKER_WINDOW,
+                 cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self._outcomes: deque = deque()  # (timestamp, ok)
+        self._probe_in_flight = False
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider right now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+        # Half-open: let a single probe through
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, ok))
+        self._prune(now)
+        if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def release_probe(self) -> None:
+        """Free the half-open probe when a call ended without an outcome (e.g. cancelled)"""
+        self._probe_in_flight = False
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+        logger.warning(f"LLM circuit breaker for {self.name} opened for {self.cooldown:.0f}s")
+
+
+class ProviderStats:
+    """Call counts, latency and token usage for one provider"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: deque = deque(maxlen=_LATENCY_SAMPLES)
+
+    def add_usage(self, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected,
+            'latency_ms_p50': percentile(0.5),
+            'latency_ms_p95': percentile(0.95),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens
+        }
+
+
+class LLMGovernor:
+    """
+    Gatekeeper for every outbound LLM call
+
+    A shared semaphore caps concurrent calls so a traffic spike queues
+    briefly and then degrades to a fallback instead of piling up hanging
+    requests. Each provider has its own circuit breaker and statistics.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT, queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(provider)
+        return self._breakers[provider]
+
+    def stats(self, provider: str) -> ProviderStats:
+        if provider not in self._stats:
+            self._stats[provider] = ProviderStats()
+        return self._stats[provider]
+
+    def is_available(self, provider: str) -> bool:
+        """Cheap check used to skip a provider whose breaker is open"""
+        breaker = self.breaker(provider)
+        return breaker.state != CircuitBreaker.OPEN or time.monotonic() - breaker.opened_at >= breaker.cooldown
+
+    @asynccontextmanager
+    async def slot(self, provider: str):
+        """
+        Hold a concurrency slot for one call to provider
+
+        Yields the provider's ProviderStats so callers can add token usage.
+        Raises LLMUnavailable if the breaker is open or no slot frees up in
+        time. Exceptions raised inside the block count as provider errors.
+        """
+        stats = self.stats(provider)
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            stats.rejected += 1
+            raise LLMUnavailable(f"{provider} circuit breaker is open")
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            stats.rejected += 1
+            breaker.release_probe()
+            raise LLMUnavailable("All LLM slots are busy")
+
+        self._in_flight += 1
+        stats.calls += 1
+        started = time.monotonic()
+        try:
+            yield stats
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            stats.errors += 1
+            breaker.record(False)
+            raise
+        except Exception:
+            stats.errors += 1
+            breaker.record(False)
+            raise
+        else:
+            breaker.record(True)
+            stats.latencies.append(time.monotonic() - started)
+        finally:
+            # Cancelled calls and closed streams record no outcome
+            breaker.release_probe()
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def call(self, provider: str, fn: Callable[[ProviderStats], Awaitable], timeout: float = LLM_CALL_TIMEOUT):
+        """Run fn(stats) for provider within a slot and a deadline"""
+        async with self.slot(provider) as stats:
+            return await asyncio.wait_for(fn(stats), timeout=timeout)
+
+    def get_stats(self) -> dict:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self._in_flight,
+            'providers': {
+                provider: {
+                    **stats.to_dict(),
+                    'breaker': self.breaker(provider).state,
+                    'breaker_trips': self.breaker(provider).trips
+                }
+                for provider, stats in self._stats.items()
+            }
+        }
+
+
+# Singleton instance
+_llm_governor: Optional[LLMGovernor] = None
+
+def get_llm_governor() -> LLMGovernor:
+    """Get LLMGovernor singleton instance"""
+    global _llm_governor
+    if _llm_governor is None:
+        _llm_governor = LLMGovernor()
+    return _llm_governor
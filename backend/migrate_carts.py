@@ -0,0 +1,78 @@
+"""
+AfroMarket UK - Cart Migration
+Folds per-line cart documents into one carts/{user_id} document per user
+
+Legacy cart lines are carts/{auto_id} documents with user_id, product_id
+and quantity fields. Each batch adds a group of lines to the user's items
+map with Increment and deletes those same lines, so the two always commit
+together and the script can be re-run safely after an interruption.
+
+Usage:
+    python migrate_carts.py --dry-run
+    python migrate_carts.py
+"""
+
+import argparse
+from collections import defaultdict
+
+from google.cloud.firestore_v1 import Increment
+
+from firestore_db import get_firestore_client, get_utc_now, FIRESTORE_BATCH_LIMIT
+
+
+def load_legacy_lines(db):
+    """Legacy cart line snapshots grouped by user id"""
+    lines = defaultdict(list)
+    for doc in db.collection('carts').stream():
+        data = doc.to_dict() or {}
+        # Already-migrated carts have an items map and no product_id
+        if data.get('product_id') and data.get('user_id'):
+            lines[data['user_id']].append(doc)
+    return lines
+
+
+def migrate(db, dry_run: bool = False) -> dict:
+    lines = load_legacy_lines(db)
+    stats = {'users': len(lines), 'lines': sum(len(docs) for docs in lines.values()), 'batches': 0}
+    if dry_run:
+        return stats
+
+    # One write for the cart document plus one delete per line
+    chunk = FIRESTORE_BATCH_LIMIT - 1
+    for user_id, docs in lines.items():
+        for start in range(0, len(docs), chunk):
+            group = docs[start:start + chunk]
+            items = defaultdict(int)
+            for doc in group:
+                items[doc.get('product_id')] += int(doc.get('quantity') or 0)
+
+            now = get_utc_now()
+            batch = db.batch()
+            batch.set(db.collection('carts').document(user_id), {
+                'user_id': user_id,
+                'items': {
+                    product_id: {'product_id': product_id, 'quantity': Increment(quantity), 'updated_at': now}
+                    for product_id, quantity in items.items()
+                },
+                'updated_at': now
+            }, merge=True)
+            for doc in group:
+                batch.delete(doc.reference)
+            batch.commit()
+            stats['batches'] += 1
+    return stats
+
+
+def main(args):
+    db = get_firestore_client()
+    if db is None:
+        raise SystemExit("Firestore is not configured")
+    stats = migrate(db, dry_run=args.dry_run)
+    action = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{action} {stats['lines']} cart line(s) for {stats['users']} user(s) in {stats['batches']} batch(es)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Count legacy cart lines without writing")
+    main(parser.parse_args())
@@ -157,7 +157,9 @@ class PushNotificationService:
                 }
             }
             
-            webpush(
+            # webpush is a blocking HTTP call
+            await asyncio.to_thread(
+                webpush,
                 subscription_info=subscription_info,
                 data=json.dumps(payload),
                 vapid_private_key=VAPID_PRIVATE_KEY,
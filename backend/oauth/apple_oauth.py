@@ -1,25 +1,48 @@
 import jwt
 import time
 import os
+import asyncio
+import httpx
 from fastapi import HTTPException
 
+from .keys import get_apple_keys, verify_jwt
+
+APPLE_ISSUER = 'https://appleid.apple.com'
+CLIENT_SECRET_LIFETIME = 3600
+# Stop handing out a cached secret this long before it expires
+CLIENT_SECRET_RENEW_MARGIN = 300
+
 class AppleOAuth:
     SERVICE_ID = os.environ.get('APPLE_SERVICE_ID')
     TEAM_ID = os.environ.get('APPLE_TEAM_ID')
     KEY_ID = os.environ.get('APPLE_KEY_ID')
     PRIVATE_KEY_PATH = os.environ.get('APPLE_PRIVATE_KEY_PATH')
     
+    _private_key = None
+    _client_secret = None
+    _client_secret_expires = 0
+    
     @staticmethod
-    def generate_client_secret():
-        """Generate Apple client secret JWT"""
-        try:
-            # Read private key
-            if os.path.exists(AppleOAuth.PRIVATE_KEY_PATH):
+    def _load_private_key():
+        """Read the .p8 key once and keep it in memory"""
+        if AppleOAuth._private_key is None:
+            if AppleOAuth.PRIVATE_KEY_PATH and os.path.exists(AppleOAuth.PRIVATE_KEY_PATH):
                 with open(AppleOAuth.PRIVATE_KEY_PATH, 'r') as f:
-                    private_key = f.read()
+                    AppleOAuth._private_key = f.read()
             else:
                 # Placeholder for when key file doesn't exist
                 raise FileNotFoundError("Apple private key not found. Please add your .p8 file.")
+        return AppleOAuth._private_key
+    
+    @staticmethod
+    def generate_client_secret():
+        """Generate Apple client secret JWT (cached until close to its one-hour expiry)"""
+        now = int(time.time())
+        if AppleOAuth._client_secret and now < AppleOAuth._client_secret_expires - CLIENT_SECRET_RENEW_MARGIN:
+            return AppleOAuth._client_secret
+        
+        try:
+            private_key = AppleOAuth._load_private_key()
             
             headers = {
                 'kid': AppleOAuth.KEY_ID
@@ -27,29 +50,44 @@ class AppleOAuth:
             
             payload = {
                 'iss': AppleOAuth.TEAM_ID,
-                'iat': int(time.time()),
-                'exp': int(time.time()) + 3600,
-                'aud': 'https://appleid.apple.com',
+                'iat': now,
+                'exp': now + CLIENT_SECRET_LIFETIME,
+                'aud': APPLE_ISSUER,
                 'sub': AppleOAuth.SERVICE_ID
             }
             
             client_secret = jwt.encode(payload, private_key, algorithm='ES256', headers=headers)
+            AppleOAuth._client_secret = client_secret
+            AppleOAuth._client_secret_expires = payload['exp']
             return client_secret
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Apple OAuth error: {str(e)}")
     
+    @staticmethod
+    async def get_client_secret():
+        """Get the client secret, signing a new one off the event loop when needed"""
+        if AppleOAuth._client_secret and time.time() < AppleOAuth._client_secret_expires - CLIENT_SECRET_RENEW_MARGIN:
+            return AppleOAuth._client_secret
+        return await asyncio.to_thread(AppleOAuth.generate_client_secret)
+    
     @staticmethod
     async def verify_token(id_token: str):
-        """Verify Apple ID token"""
+        """Verify Apple ID token against Apple's published signing keys"""
         try:
-            # Decode without verification for now (in production, verify with Apple's public keys)
-            decoded = jwt.decode(id_token, options={"verify_signature": False})
+            decoded = await verify_jwt(
+                id_token,
+                get_apple_keys(),
+                audience=AppleOAuth.SERVICE_ID,
+                issuer=APPLE_ISSUER
+            )
             
             return {
                 'apple_id': decoded.get('sub'),
                 'email': decoded.get('email', ''),
                 'name': decoded.get('name', 'Apple User')
             }
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="Unable to fetch Apple signing keys")
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Invalid Apple token: {str(e)}")
     
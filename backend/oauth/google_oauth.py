@@ -1,8 +1,12 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests
 import os
+import jwt
+import httpx
 from fastapi import HTTPException
 
+from .keys import get_google_keys, verify_jwt
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
 class GoogleOAuth:
     CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
@@ -11,23 +15,23 @@ class GoogleOAuth:
     async def verify_token(token: str):
         """Verify Google OAuth token and get user info"""
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                requests.Request(), 
-                GoogleOAuth.CLIENT_ID
+            idinfo = await verify_jwt(
+                token,
+                get_google_keys(),
+                audience=GoogleOAuth.CLIENT_ID,
+                issuer=GOOGLE_ISSUERS
             )
             
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                raise ValueError('Wrong issuer.')
-            
             return {
                 'google_id': idinfo['sub'],
                 'email': idinfo['email'],
                 'name': idinfo.get('name', ''),
                 'avatar': idinfo.get('picture', '')
             }
-        except ValueError as e:
+        except (jwt.PyJWTError, KeyError) as e:
             raise HTTPException(status_code=401, detail=f"Invalid Google token: {str(e)}")
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="Unable to fetch Google signing keys")
     
     @staticmethod
     def get_authorization_url():
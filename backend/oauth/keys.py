@@ -0,0 +1,205 @@
+"""
+OAuth Key Management for AfroMarket UK
+Shared HTTP client and cached signing keys for Google, Apple and Firebase tokens
+"""
+
+import re
+import json
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import jwt
+import httpx
+from cryptography.x509 import load_pem_x509_certificate
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+APPLE_JWKS_URL = "https://appleid.apple.com/auth/keys"
+
+# Used when a key endpoint sends no Cache-Control max-age
+DEFAULT_MAX_AGE_SECONDS = 3600
+# Refresh keys this long before they expire
+REFRESH_MARGIN_SECONDS = 300
+# Minimum gap between forced refreshes triggered by an unknown key id
+FORCED_REFRESH_INTERVAL = 60
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared connection-pooled HTTP client for key endpoints"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+        )
+    return _http_client
+
+
+def parse_max_age(cache_control: str) -> Optional[int]:
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else None
+
+
+class KeyCache(ABC):
+    """
+    Public signing keys fetched from a URL and cached per Cache-Control
+
+    Keys are refreshed by a background task shortly before they expire,
+    so verification only waits on the network for the very first fetch
+    or when a token names a key id we have not seen yet.
+    """
+
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        self._keys: Dict[str, object] = {}
+        self._expires_at = 0.0
+        self._last_forced_refresh = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    def parse_keys(self, body) -> Dict[str, object]:
+        """Key id -> public key from the endpoint's JSON body"""
+
+    async def _fetch(self) -> None:
+        response = await get_http_client().get(self.url)
+        response.raise_for_status()
+        max_age = parse_max_age(response.headers.get('cache-control', '')) or DEFAULT_MAX_AGE_SECONDS
+        self._keys = self.parse_keys(response.json())
+        self._expires_at = time.time() + max_age
+        logger.info(f"Fetched {len(self._keys)} {self.name} signing keys (max-age {max_age}s)")
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._lock:
+            if not force and self._keys and time.time() < self._expires_at:
+                return
+            await self._fetch()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            delay = max(30.0, self._expires_at - time.time() - REFRESH_MARGIN_SECONDS)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh(force=True)
+            except Exception as e:
+                logger.error(f"Background {self.name} key refresh failed: {e}")
+
+    async def start(self) -> None:
+        """Prefetch keys and start the background refresher"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Initial {self.name} key fetch failed: {e}")
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def get_key(self, kid: str):
+        """Public key for a key id, None if the issuer does not publish it"""
+        if not self._keys or time.time() >= self._expires_at:
+            await self.refresh()
+        if self._refresh_task is None:
+            # First use - keep the keys warm from now on
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        key = self._keys.get(kid)
+        if key is None and time.time() - self._last_forced_refresh > FORCED_REFRESH_INTERVAL:
+            # Keys may have rotated before our cached set expired
+            self._last_forced_refresh = time.time()
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def get_stats(self) -> dict:
+        return {
+            'cached_keys': len(self._keys),
+            'expires_in': max(0, int(self._expires_at - time.time()))
+        }
+
+
+class JWKSKeyCache(KeyCache):
+    """Keys published as a JSON Web Key Set ({"keys": [...]})"""
+
+    def parse_keys(self, body) -> Dict[str, object]:
+        keys = {}
+        for jwk in body.get('keys', []):
+            try:
+                keys[jwk['kid']] = jwt.PyJWK.from_json(json.dumps(jwk)).key
+            except Exception as e:
+                logger.warning(f"Skipping unusable {self.name} JWK {jwk.get('kid')}: {e}")
+        return keys
+
+
+class X509KeyCache(KeyCache):
+    """Keys published as a {kid: PEM certificate} map"""
+
+    def parse_keys(self, body) -> Dict[str, object]:
+        return {
+            kid: load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in body.items()
+        }
+
+
+async def verify_jwt(token: str, key_cache: KeyCache, audience, issuer, algorithms=('RS256',),
+                     leeway: int = 5) -> dict:
+    """
+    Verify a JWT signed by one of key_cache's keys
+
+    The signature check runs in a worker thread. Raises jwt.PyJWTError on
+    any validation failure and httpx.HTTPError if keys cannot be fetched.
+    """
+    header = jwt.get_unverified_header(token)
+    if header.get('alg') not in algorithms:
+        raise jwt.InvalidAlgorithmError(f"Unexpected token algorithm: {header.get('alg')}")
+    key = await key_cache.get_key(header.get('kid', ''))
+    if key is None:
+        raise jwt.InvalidTokenError("Token signed with an unknown key")
+
+    return await asyncio.to_thread(
+        jwt.decode,
+        token,
+        key,
+        algorithms=list(algorithms),
+        audience=audience,
+        issuer=issuer,
+        options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']},
+        leeway=leeway
+    )
+
+
+_google_keys: Optional[JWKSKeyCache] = None
+_apple_keys: Optional[JWKSKeyCache] = None
+
+def get_google_keys() -> JWKSKeyCache:
+    global _google_keys
+    if _google_keys is None:
+        _google_keys = JWKSKeyCache(GOOGLE_JWKS_URL, "Google")
+    return _google_keys
+
+
+def get_apple_keys() -> JWKSKeyCache:
+    global _apple_keys
+    if _apple_keys is None:
+        _apple_keys = JWKSKeyCache(APPLE_JWKS_URL, "Apple")
+    return _apple_keys
+
+
+async def close_http_client() -> None:
+    """Stop background refreshers and close pooled connections"""
+    global _http_client
+    for cache in (_google_keys, _apple_keys):
+        if cache:
+            cache.stop()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
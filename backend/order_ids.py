@@ -0,0 +1,102 @@
+"""
+Order Numbers for AfroMarket UK
+Snowflake-style order ids that are unique across workers and sort by creation time
+"""
+
+import os
+import time
+import socket
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Customer-facing prefix of every order number
+ORDER_ID_PREFIX = 'AFM-'
+# Worker id (0-1023) baked into ids. Set a distinct one per worker in multi-worker
+# deploys: the host/pid fallback collides between workers now and then, which costs
+# the checkout a retry with a fresh number
+ORDER_ID_WORKER_ID = os.environ.get('ORDER_ID_WORKER_ID')
+
+# Milliseconds are counted from 2024-01-01, which leaves 41 bits for ~69 years
+ORDER_ID_EPOCH_MS = 1704067200000
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Crockford base32: digits before letters, so string order matches numeric order
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_ENCODED_LENGTH = 13  # 64 bits in 5-bit characters
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(_ENCODED_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def _default_worker_id() -> int:
+    """Worker id from ORDER_ID_WORKER_ID, else a hash of host and process"""
+    if ORDER_ID_WORKER_ID is not None:
+        return int(ORDER_ID_WORKER_ID) & MAX_WORKER_ID
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+    return int.from_bytes(hashlib.sha256(seed).digest()[:4], 'big') & MAX_WORKER_ID
+
+
+def is_order_id(order_id: str) -> bool:
+    """Whether a string is an order number from this generator (not a legacy random one)"""
+    body = order_id[len(ORDER_ID_PREFIX):] if order_id.startswith(ORDER_ID_PREFIX) else ''
+    return len(body) == _ENCODED_LENGTH and all(c in _ALPHABET for c in body.upper())
+
+
+class OrderIdGenerator:
+    """
+    Order numbers like AFM-0D2X7K1M4QZ8A
+
+    The 64-bit value packs milliseconds since ORDER_ID_EPOCH_MS, a 10-bit
+    worker id and a 12-bit per-millisecond sequence, encoded as 13
+    Crockford base32 characters. Ids from one worker never repeat, ids
+    from different workers differ in the worker bits, and string order is
+    creation order, so the id doubles as the orders document id.
+
+    If the clock steps backwards, or a millisecond's 4096 sequence numbers
+    run out, the generator keeps counting from its last timestamp instead
+    of waiting, so ids stay unique and increasing.
+    """
+
+    def __init__(self, worker_id: Optional[int] = None):
+        self.worker_id = _default_worker_id() if worker_id is None else worker_id & MAX_WORKER_ID
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self) -> str:
+        with self._lock:
+            now_ms = int(time.time() * 1000) - ORDER_ID_EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            value = (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+        return ORDER_ID_PREFIX + _encode(value)
+
+
+# Singleton instance
+_order_id_generator: Optional[OrderIdGenerator] = None
+
+def get_order_id_generator() -> OrderIdGenerator:
+    """Get OrderIdGenerator singleton instance"""
+    global _order_id_generator
+    if _order_id_generator is None:
+        _order_id_generator = OrderIdGenerator()
+        logger.info(f"Order ids use worker id {_order_id_generator.worker_id}")
+    return _order_id_generator
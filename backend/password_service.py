@@ -0,0 +1,146 @@
+"""
+Password Hashing Service for AfroMarket UK
+Runs bcrypt in a bounded process pool so hashing never blocks the event loop
+"""
+
+import os
+import hmac
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor - raise it as hardware gets faster, existing
+# hashes are upgraded the next time their owner logs in
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+
+# Worker processes dedicated to hashing
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Requests allowed to wait for a worker before new ones are rejected with 503
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', str(PASSWORD_HASH_WORKERS * 8)))
+
+
+# ---- functions executed inside worker processes ----
+
+def _hash(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode()
+
+
+def _check(password: bytes, password_hash: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        # Malformed hash
+        return False
+
+
+def get_bcrypt_rounds(password_hash: str) -> Optional[int]:
+    """Cost factor encoded in a bcrypt hash ($2b$12$...), None if not bcrypt"""
+    parts = (password_hash or '').split('$')
+    if len(parts) >= 4 and parts[1] in ('2a', '2b', '2y') and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+def _is_legacy_sha256(password_hash: str) -> bool:
+    """Hashes written by the old reset-password flow (unsalted SHA-256 hex)"""
+    return len(password_hash or '') == 64 and all(c in '0123456789abcdef' for c in password_hash)
+
+
+class PasswordService:
+    """bcrypt hashing and verification with admission control"""
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_QUEUE):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            logger.info(f"Password hashing pool started with {self.workers} workers (cost {self.rounds})")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        """Run fn in the pool, rejecting the call when the queue is full"""
+        if self._pending >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication service busy, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        return await self._run(_hash, password.encode(), self.rounds)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the hash was made with different parameters than configured"""
+        return get_bcrypt_rounds(password_hash) != self.rounds
+
+    async def verify_password(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password against its stored hash
+
+        Returns:
+            (valid, new_hash) - new_hash is set when the password was valid
+            but the stored hash is outdated and should be replaced
+        """
+        if not password_hash:
+            return False, None
+
+        if get_bcrypt_rounds(password_hash) is None:
+            if not _is_legacy_sha256(password_hash):
+                return False, None
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            valid = hmac.compare_digest(legacy, password_hash)
+        else:
+            valid = await self._run(_check, password.encode(), password_hash.encode())
+
+        if valid and self.needs_rehash(password_hash):
+            return True, await self.hash_password(password)
+        return valid, None
+
+    def get_stats(self) -> dict:
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+_password_service: Optional[PasswordService] = None
+
+def get_password_service() -> PasswordService:
+    """Get PasswordService singleton instance"""
+    global _password_service
+    if _password_service is None:
+        _password_service = PasswordService()
+    return _password_service
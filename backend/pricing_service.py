@@ -0,0 +1,289 @@
+"""
+Pricing Engine for AfroMarket UK
+Prices a basket from live product data instead of trusting client-side totals
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from delivery_service import get_delivery_service, EXPRESS_OPTIONS
+from subscription_models import (
+    VendorTier,
+    MembershipTier,
+    VENDOR_PRICING,
+    CUSTOMER_PRICING,
+    calculate_commission,
+    calculate_service_fee,
+    calculate_premium_discount
+)
+
+logger = logging.getLogger(__name__)
+
+# Most lines and units accepted in one basket
+PRICING_MAX_LINES = int(os.environ.get('PRICING_MAX_LINES', '200'))
+PRICING_MAX_QUANTITY = int(os.environ.get('PRICING_MAX_QUANTITY', '999'))
+# Charge the 2% platform service fee to customers (the checkout page does not show it yet)
+PRICING_CHARGE_SERVICE_FEE = os.environ.get('PRICING_CHARGE_SERVICE_FEE', 'false').lower() == 'true'
+# Client totals further than this from the server price are flagged on the order
+PRICE_MISMATCH_TOLERANCE = 0.01
+
+# Weight assumed for products without a parseable weight (matches the checkout page)
+DEFAULT_ITEM_WEIGHT_KG = 0.5
+
+_WEIGHT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(kg|g|l|ml|litres?|liters?)\b', re.IGNORECASE)
+_WEIGHT_FACTORS = {'kg': 1.0, 'g': 0.001, 'l': 1.0, 'ml': 0.001}
+
+
+def parse_weight_kg(weight) -> float:
+    """Weight in kg from a product's weight field ("1.5kg", "400g", "1L", 2)"""
+    if isinstance(weight, (int, float)):
+        return float(weight) if weight > 0 else DEFAULT_ITEM_WEIGHT_KG
+    match = _WEIGHT_RE.search(str(weight or ''))
+    if not match:
+        return DEFAULT_ITEM_WEIGHT_KG
+    unit = match.group(2).lower()
+    unit = 'l' if unit.startswith('lit') else unit
+    return float(match.group(1)) * _WEIGHT_FACTORS[unit]
+
+
+def _tier(value, enum, default):
+    try:
+        return enum(str(value).lower())
+    except ValueError:
+        return default
+
+
+def _product_vendor_id(product: Dict, item: Dict) -> Optional[str]:
+    return product.get('vendor_id') or product.get('vendorId') or item.get('vendorId')
+
+
+def _in_stock(product: Dict) -> bool:
+    return product.get('in_stock', product.get('inStock', True)) is not False
+
+
+def _available_stock(product: Dict) -> Optional[int]:
+    stock = product.get('stock_quantity', product.get('stock'))
+    return int(stock) if isinstance(stock, (int, float)) else None
+
+
+def normalize_items(items: List[Dict]) -> List[Tuple[str, int, Dict]]:
+    """(product_id, quantity, client item) per product, merging repeated lines"""
+    if not items:
+        raise HTTPException(status_code=400, detail="Your basket is empty")
+    merged: Dict[str, List] = {}
+    for item in items:
+        product_id = item.get('productId') or item.get('product_id') or item.get('id')
+        if not product_id:
+            raise HTTPException(status_code=400, detail="Every basket item needs a product ID")
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid quantity for product {product_id}")
+        if quantity < 1:
+            raise HTTPException(status_code=400, detail=f"Invalid quantity for product {product_id}")
+        if product_id in merged:
+            merged[product_id][1] += quantity
+        else:
+            merged[product_id] = [product_id, quantity, item]
+
+    if len(merged) > PRICING_MAX_LINES:
+        raise HTTPException(status_code=400, detail=f"Baskets are limited to {PRICING_MAX_LINES} products")
+    for product_id, quantity, _ in merged.values():
+        if quantity > PRICING_MAX_QUANTITY:
+            raise HTTPException(status_code=400, detail=f"At most {PRICING_MAX_QUANTITY} of one product per order")
+    return [tuple(line) for line in merged.values()]
+
+
+@dataclass
+class PricedOrder:
+    """A basket priced on the server; the order is written from this"""
+    lines: List[Dict]
+    vendors: List[Dict]
+    subtotal: float
+    membership_tier: str
+    membership_discount: float
+    delivery_option: str
+    delivery_fee: float
+    delivery_zone: Dict
+    service_fee: float
+    total: float
+    # Raw vendor documents for notifications, not part of the quote
+    vendor_docs: Dict[str, Dict] = field(default_factory=dict, repr=False)
+
+    def to_dict(self) -> Dict:
+        return {
+            'lines': self.lines,
+            'vendors': self.vendors,
+            'subtotal': self.subtotal,
+            'membership_tier': self.membership_tier,
+            'membership_discount': self.membership_discount,
+            'delivery_option': self.delivery_option,
+            'delivery_fee': self.delivery_fee,
+            'delivery_zone': self.delivery_zone,
+            'service_fee': self.service_fee,
+            'total': self.total,
+            'currency': 'GBP'
+        }
+
+    def order_items(self) -> List[Dict]:
+        """Line items in the shape stored on orders and shown in order history"""
+        return [
+            {
+                'productId': line['product_id'],
+                'name': line['name'],
+                'brand': line['brand'],
+                'image': line['image'],
+                'price': line['unit_price'],
+                'quantity': line['quantity'],
+                'vendorId': line['vendor_id'],
+                'vendorName': line['vendor_name']
+            }
+            for line in self.lines
+        ]
+
+
+def price_basket(
+    items: List[Tuple[str, int, Dict]],
+    products: Dict[str, Dict],
+    vendors: Dict[str, Dict],
+    postcode: str,
+    delivery_option: str = "standard",
+    membership_tier: str = MembershipTier.FREE.value
+) -> PricedOrder:
+    """
+    Price normalized basket lines against already-loaded products and vendors
+
+    Pure function - all reads happen in PricingEngine.quote, so this single
+    pass is what the benchmark measures.
+    """
+    if delivery_option not in EXPRESS_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown delivery option: {delivery_option}")
+    membership = _tier(membership_tier, MembershipTier, MembershipTier.FREE)
+
+    lines = []
+    shipments: Dict[str, Dict] = {}
+    subtotal = 0.0
+    for product_id, quantity, item in items:
+        product = products.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=400, detail=f"Product {product_id} is no longer available")
+        if not _in_stock(product):
+            raise HTTPException(status_code=409, detail=f"{product.get('name', product_id)} is out of stock")
+        stock = _available_stock(product)
+        if stock is not None and quantity > stock:
+            raise HTTPException(status_code=409,
+                                detail=f"Only {stock} of {product.get('name', product_id)} left in stock")
+
+        unit_price = round(float(product.get('price') or 0), 2)
+        line_total = round(unit_price * quantity, 2)
+        weight_kg = parse_weight_kg(product.get('weight')) * quantity
+        vendor_id = _product_vendor_id(product, item)
+        vendor = vendors.get(vendor_id) or {}
+        subtotal += line_total
+
+        lines.append({
+            'product_id': product_id,
+            'name': product.get('name', ''),
+            'brand': product.get('brand'),
+            'image': product.get('image'),
+            'vendor_id': vendor_id,
+            'vendor_name': vendor.get('business_name', vendor.get('businessName', item.get('vendorName', 'Vendor'))),
+            'unit_price': unit_price,
+            'quantity': quantity,
+            'line_total': line_total,
+            'weight_kg': round(weight_kg, 3)
+        })
+        shipment = shipments.setdefault(vendor_id, {
+            'vendor_id': vendor_id,
+            'origin_postcode': vendor.get('postcode'),
+            'subtotal': 0.0,
+            'weight_kg': 0.0
+        })
+        shipment['subtotal'] += line_total
+        shipment['weight_kg'] += weight_kg
+    subtotal = round(subtotal, 2)
+
+    # Delivery is quoted per vendor shipment; the free threshold applies to the whole basket
+    quote = get_delivery_service().quote_batch(postcode, list(shipments.values()))
+    option_index = list(EXPRESS_OPTIONS).index(delivery_option)
+    delivery_fee = quote['totals'][option_index]['cost']
+    if CUSTOMER_PRICING[membership]['delivery_discount'] >= 1.0:
+        delivery_fee = 0.0
+
+    membership_discount = calculate_premium_discount(subtotal, membership)
+    service_fee = calculate_service_fee(subtotal - membership_discount) if PRICING_CHARGE_SERVICE_FEE else 0.0
+    total = round(subtotal - membership_discount + delivery_fee + service_fee, 2)
+
+    # Commission is taken from each vendor's merchandise sales; discounts are platform funded
+    vendor_lines = []
+    for (vendor_id, shipment), quoted in zip(shipments.items(), quote['shipments']):
+        tier = _tier((vendors.get(vendor_id) or {}).get('tier', VendorTier.BASIC.value), VendorTier, VendorTier.BASIC)
+        vendor_subtotal = round(shipment['subtotal'], 2)
+        commission = calculate_commission(vendor_subtotal, tier)
+        vendor_lines.append({
+            'vendor_id': vendor_id,
+            'subtotal': vendor_subtotal,
+            'weight_kg': round(shipment['weight_kg'], 3),
+            'delivery_fee': 0.0 if delivery_fee == 0 else quoted['options'][option_index]['cost'],
+            'tier': tier.value,
+            'commission_rate': VENDOR_PRICING[tier]['commission_rate'],
+            'commission': commission,
+            'payout': round(vendor_subtotal - commission, 2)
+        })
+
+    return PricedOrder(
+        lines=lines,
+        vendors=vendor_lines,
+        subtotal=subtotal,
+        membership_tier=membership.value,
+        membership_discount=membership_discount,
+        delivery_option=delivery_option,
+        delivery_fee=round(delivery_fee, 2),
+        delivery_zone={
+            'zone': quote['zone'],
+            'zone_name': quote['zone_name'],
+            'estimated_days': quote['totals'][option_index]['estimated_days']
+        },
+        service_fee=service_fee,
+        total=total,
+        vendor_docs=vendors
+    )
+
+
+class PricingEngine:
+    """Loads everything a basket references in batched reads, then prices it in one pass"""
+
+    async def quote(self, user: Dict, items: List[Dict], postcode: str,
+                    delivery_option: str = "standard") -> PricedOrder:
+        from firestore_db import firestore_db
+
+        lines = normalize_items(items)
+        products = await firestore_db.get_products_by_ids([product_id for product_id, _, _ in lines])
+        vendor_ids = list({
+            _product_vendor_id(products[product_id], item)
+            for product_id, _, item in lines if product_id in products
+        } - {None})
+        vendors = await firestore_db.get_vendors_by_ids(vendor_ids)
+
+        return price_basket(
+            lines, products, vendors,
+            postcode=postcode,
+            delivery_option=delivery_option,
+            membership_tier=user.get('membership_tier', MembershipTier.FREE.value)
+        )
+
+
+# Singleton instance
+_pricing_engine: Optional[PricingEngine] = None
+
+def get_pricing_engine() -> PricingEngine:
+    """Get PricingEngine singleton instance"""
+    global _pricing_engine
+    if _pricing_engine is None:
+        _pricing_engine = PricingEngine()
+    return _pricing_engine
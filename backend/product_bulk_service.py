@@ -0,0 +1,464 @@
+"""
+Bulk Product Updates for AfroMarket UK
+Streams vendor stock, price and catalog files and applies them in batched Firestore writes
+"""
+
+import os
+import csv
+import codecs
+import asyncio
+import logging
+import tempfile
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+
+# XLSX catalogs are optional; CSV imports work without openpyxl
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+# Most rows accepted in one bulk request
+PRODUCT_BULK_MAX_ROWS = int(os.environ.get('PRODUCT_BULK_MAX_ROWS', '5000'))
+# Stock level under which a product is reported as low stock
+LOW_STOCK_THRESHOLD = 20
+# Most rows accepted in one catalog import
+PRODUCT_IMPORT_MAX_ROWS = int(os.environ.get('PRODUCT_IMPORT_MAX_ROWS', '50000'))
+# Largest catalog upload accepted, in bytes
+PRODUCT_IMPORT_MAX_BYTES = int(os.environ.get('PRODUCT_IMPORT_MAX_BYTES', str(50 * 1024 * 1024)))
+# Write rate cap for imports, so a large catalog does not starve live traffic
+PRODUCT_IMPORT_MAX_OPS_PER_SECOND = int(os.environ.get('PRODUCT_IMPORT_MAX_OPS_PER_SECOND', '500'))
+# Rows between progress events
+PRODUCT_IMPORT_PROGRESS_EVERY = 500
+# Attempts per document before an import write is reported as failed
+PRODUCT_IMPORT_MAX_ATTEMPTS = 5
+# Uploads smaller than this stay in memory while spooled
+_SPOOL_MEMORY_BYTES = 4 * 1024 * 1024
+
+
+def _ends_in_quoted_field(line: str, quoted: bool) -> bool:
+    """Whether a CSV quoted field is still open at the end of line, given whether it was open at the start"""
+    field_start, closed = not quoted, False
+    for char in line:
+        if quoted:
+            if char == '"':
+                quoted, closed = False, True
+            continue
+        # A quote opens a field only at its start, or right after a closing quote ("" escape)
+        if char == '"' and (field_start or closed):
+            quoted = True
+        field_start, closed = char in ',\r\n', False
+    return quoted
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes],
+                        max_rows: int = PRODUCT_BULK_MAX_ROWS) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """
+    Parse a streamed CSV upload into (record number, row) pairs
+
+    Header names are lower-cased and stripped and blank lines are
+    skipped. Lines are handed to the csv module only once the record they
+    belong to is complete, so quoted fields may contain newlines and span
+    chunks, and the upload is never held in memory whole. Raises
+    HTTPException(413) past max_rows data rows.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    header: Optional[List[str]] = None
+    line_number = 0
+    rows = 0
+    pending = ''
+    # Lines of the current record while one of its quoted fields is still open
+    record: List[str] = []
+    quoted = False
+
+    def parse(lines: List[str]):
+        nonlocal header, line_number, rows
+        for values in csv.reader(lines):
+            line_number += 1
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            rows += 1
+            if rows > max_rows:
+                raise HTTPException(status_code=413, detail=f"At most {max_rows} rows per upload")
+            yield line_number, {name: value.strip() for name, value in zip(header, values)}
+
+    def complete(lines: List[str]):
+        nonlocal record, quoted
+        for line in lines:
+            record.append(line)
+            quoted = _ends_in_quoted_field(line, quoted)
+            if not quoted:
+                yield from parse(record)
+                record = []
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for row in complete([line + '\n' for line in lines]):
+            yield row
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        record.append(pending)
+    if record:
+        # An unterminated quoted field at the end of the file is parsed as it stands
+        for row in parse(record):
+            yield row
+
+
+def _parse_stock(value: Any) -> int:
+    try:
+        stock = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("stock_quantity must be a whole number")
+    if stock < 0 or stock != int(stock):
+        raise ValueError("stock_quantity must be a whole number of 0 or more")
+    return int(stock)
+
+
+def parse_stock_row(raw: Dict) -> Tuple[str, Dict]:
+    """
+    Validate one stock/price row into (product_id, field updates)
+
+    Raises ValueError with a message suitable for the per-row result.
+    """
+    product_id = str(raw.get('product_id') or '').strip()
+    if not product_id:
+        raise ValueError("product_id is required")
+
+    updates: Dict = {}
+    stock = raw.get('stock_quantity')
+    if stock not in (None, ''):
+        updates['stock_quantity'] = _parse_stock(stock)
+        updates['in_stock'] = updates['stock_quantity'] > 0
+
+    price = raw.get('price')
+    if price not in (None, ''):
+        try:
+            price = round(float(price), 2)
+        except (TypeError, ValueError):
+            raise ValueError("price must be a number")
+        if price <= 0:
+            raise ValueError("price must be greater than 0")
+        updates['price'] = price
+
+    if not updates:
+        raise ValueError("Give stock_quantity and/or price")
+    return product_id, updates
+
+
+async def sync_vendor_stock(vendor_id: str, rows: List[Tuple[int, Dict]]) -> Dict:
+    """
+    Apply a vendor's stock and price rows
+
+    Ownership of every row is checked against one batched product read.
+    Rows that fail validation or ownership are reported and skipped, rows
+    that would not change anything are reported as unchanged, and the
+    rest are written in chunked batches together with their inventory
+    shards. Returns per-row results and a summary.
+    """
+    from firestore_db import firestore_db
+    from catalog_cache import get_catalog_cache
+    from inventory_service import get_inventory_service
+
+    results: List[Dict] = []
+    parsed: Dict[str, Tuple[int, Dict]] = {}
+    for row, raw in rows:
+        try:
+            product_id, updates = parse_stock_row(raw)
+        except ValueError as e:
+            results.append({'row': row, 'product_id': raw.get('product_id'), 'status': 'error', 'error': str(e)})
+            continue
+        if product_id in parsed:
+            results.append({'row': row, 'product_id': product_id, 'status': 'error',
+                            'error': f"Duplicate of row {parsed[product_id][0]}"})
+            continue
+        parsed[product_id] = (row, updates)
+
+    products = await firestore_db.get_products_by_ids(list(parsed))
+    writes: Dict[str, Dict] = {}
+    for product_id, (row, updates) in parsed.items():
+        product = products.get(product_id)
+        if not product:
+            results.append({'row': row, 'product_id': product_id, 'status': 'error', 'error': "Product not found"})
+            continue
+        if product.get('vendor_id') != vendor_id:
+            results.append({'row': row, 'product_id': product_id, 'status': 'error',
+                            'error': "Not authorized to update this product"})
+            continue
+        changed = {field: value for field, value in updates.items() if product.get(field) != value}
+        result = {'row': row, 'product_id': product_id, **updates}
+        if 'stock_quantity' in updates:
+            result['low_stock'] = updates['stock_quantity'] < LOW_STOCK_THRESHOLD
+        if changed:
+            # Only changed fields are written, so a price-only change leaves stock shards alone
+            writes[product_id] = changed
+            results.append({**result, 'status': 'updated'})
+        else:
+            results.append({**result, 'status': 'unchanged'})
+
+    if writes:
+        await firestore_db.bulk_update_products(writes)
+        stock = {pid: updates['stock_quantity'] for pid, updates in writes.items() if 'stock_quantity' in updates}
+        if stock:
+            await get_inventory_service().set_stock_many(stock)
+        catalog = get_catalog_cache()
+        for product_id, updates in writes.items():
+            catalog.upsert_product({**products[product_id], **updates})
+        logger.info(f"Vendor {vendor_id} bulk update: {len(writes)} product(s) written")
+
+    results.sort(key=lambda result: result['row'])
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return {
+        'results': results,
+        'summary': {
+            'rows': len(results),
+            'updated': counts.get('updated', 0),
+            'unchanged': counts.get('unchanged', 0),
+            'errors': counts.get('error', 0)
+        }
+    }
+
+
+# ---- catalog import ----
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_bytes: int = PRODUCT_IMPORT_MAX_BYTES) -> BinaryIO:
+    """Copy an upload into a temporary file (in memory while small); raises HTTPException(413) past max_bytes"""
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MEMORY_BYTES)
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise HTTPException(status_code=413, detail=f"Uploads are limited to {max_bytes // (1024 * 1024)}MB")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def _read_chunks(file: BinaryIO, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _iter_xlsx_records(file: BinaryIO, max_rows: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # read_only mode streams rows from the zip instead of loading the whole sheet
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        header: Optional[List[str]] = None
+        rows = 0
+        for line_number, record in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            if not any(value not in (None, '') for value in record):
+                continue
+            if header is None:
+                header = [str(name or '').strip().lower() for name in record]
+                continue
+            rows += 1
+            if rows > max_rows:
+                raise HTTPException(status_code=413, detail=f"At most {max_rows} rows per upload")
+            # Spreadsheets store whole numbers (SKUs, stock) as floats
+            values = [int(v) if isinstance(v, float) and v.is_integer() else v for v in record]
+            yield line_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+async def iter_upload_rows(file: BinaryIO, file_format: str,
+                           max_rows: int = PRODUCT_IMPORT_MAX_ROWS) -> AsyncIterator[Tuple[int, Dict]]:
+    """Rows of a spooled CSV or XLSX upload, parsed as they are consumed"""
+    if file_format == 'csv':
+        async for row in iter_csv_rows(_read_chunks(file), max_rows):
+            yield row
+        return
+    if file_format != 'xlsx':
+        raise HTTPException(status_code=415, detail="Upload a CSV or XLSX file")
+    if openpyxl is None:
+        raise HTTPException(status_code=415, detail="XLSX import is not available on this server, please upload CSV")
+    for count, row in enumerate(_iter_xlsx_records(file, max_rows), start=1):
+        yield row
+        if count % PRODUCT_IMPORT_PROGRESS_EVERY == 0:
+            # Parsing is synchronous, so let other requests run between blocks of rows
+            await asyncio.sleep(0)
+
+
+def xlsx_import_available() -> bool:
+    return openpyxl is not None
+
+
+def upload_format(content_type: str, filename: str = '') -> str:
+    """'csv' or 'xlsx' from a content type or file name"""
+    content_type, filename = (content_type or '').lower(), (filename or '').lower()
+    if 'spreadsheetml' in content_type or filename.endswith('.xlsx'):
+        return 'xlsx'
+    if 'csv' in content_type or filename.endswith('.csv'):
+        return 'csv'
+    return ''
+
+
+def parse_product_row(raw: Dict, model: Type[BaseModel]) -> Tuple[str, Dict]:
+    """
+    Validate one catalog row against the product model into (sku, product fields)
+
+    Besides the model's fields a row needs a sku and may give
+    stock_quantity. Raises ValueError with a message for the row result.
+    """
+    fields = {name: value.strip() if isinstance(value, str) else value for name, value in raw.items() if name}
+    fields = {name: value for name, value in fields.items() if value not in (None, '')}
+    sku = str(fields.pop('sku', '')).strip()
+    if not sku:
+        raise ValueError("sku is required")
+    stock = fields.pop('stock_quantity', None)
+
+    try:
+        product = model(**fields)
+    except ValidationError as e:
+        raise ValueError('; '.join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        ))
+    data = {**product.model_dump(exclude_none=True), 'sku': sku}
+    if stock is not None:
+        data['stock_quantity'] = _parse_stock(stock)
+        data['in_stock'] = data['stock_quantity'] > 0
+    return sku, data
+
+
+async def import_products(vendor_id: str, rows: AsyncIterator[Tuple[int, Dict]], model: Type[BaseModel],
+                          dry_run: bool = False) -> AsyncIterator[Dict]:
+    """
+    Import a vendor catalog, yielding progress and error events as it goes
+
+    Rows are validated against model one at a time and deduplicated on
+    SKU: a SKU repeated in the file is an error, and a SKU the vendor
+    already sells updates that product instead of creating a duplicate.
+    Writes go through a rate-limited BulkWriter that sends batches in
+    parallel and retries failed documents. The catalog cache and search
+    indexes are refreshed once, after the last write.
+
+    Events are dicts with a "type" of "error" (row, sku, error),
+    "progress" (running counts) or, last, "done" (final counts).
+    """
+    from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+    from firestore_db import firestore_db, get_utc_now
+    from catalog_cache import get_catalog_cache
+    from chatbot_cache import get_response_cache
+    from inventory_service import get_inventory_service
+    from wishlist_service import get_wishlist_fanout
+
+    counts = {'rows': 0, 'created': 0, 'updated': 0, 'errors': 0}
+    existing = await firestore_db.get_vendor_product_skus(vendor_id)
+    seen: Dict[str, int] = {}
+    # document path -> (line, sku, 'created' or 'updated', product id, stock)
+    queued: Dict[str, Tuple] = {}
+    pending: List[Tuple] = []
+    failures: List[Tuple[str, str]] = []
+
+    writer = None
+    if not dry_run:
+        writer = firestore_db.db.bulk_writer(options=BulkWriterOptions(
+            initial_ops_per_second=min(500, PRODUCT_IMPORT_MAX_OPS_PER_SECOND),
+            max_ops_per_second=PRODUCT_IMPORT_MAX_OPS_PER_SECOND
+        ))
+
+        def on_write_error(failure, _writer) -> bool:
+            if failure.attempts < PRODUCT_IMPORT_MAX_ATTEMPTS:
+                return True
+            # Runs on the writer's threads; list.append is atomic
+            failures.append((failure.operation.reference.path, failure.message))
+            return False
+
+        writer.on_write_error(on_write_error)
+
+    def enqueue(operations: List[Tuple]) -> None:
+        for kind, ref, data in operations:
+            if kind == 'created':
+                writer.create(ref, data)
+            else:
+                writer.set(ref, data, merge=True)
+
+    async def flush() -> None:
+        operations = pending[:]
+        pending.clear()
+        if writer is not None and operations:
+            # BulkWriter throttles by blocking the caller, so keep it off the event loop
+            await asyncio.to_thread(enqueue, operations)
+
+    now = get_utc_now()
+    aborted = None
+    try:
+        async for line, raw in rows:
+            counts['rows'] += 1
+            sku = str(raw.get('sku') or '').strip()
+            try:
+                sku, data = parse_product_row(raw, model)
+                if sku in seen:
+                    raise ValueError(f"Duplicate SKU, first seen on row {seen[sku]}")
+            except ValueError as e:
+                counts['errors'] += 1
+                yield {'type': 'error', 'row': line, 'sku': sku or None, 'error': str(e)}
+                continue
+            seen[sku] = line
+
+            data.update({'vendor_id': vendor_id, 'updated_at': now})
+            product_id = existing.get(sku)
+            kind = 'updated' if product_id else 'created'
+            if not product_id:
+                data.update({'created_at': now, 'rating': 0, 'review_count': 0})
+                data.setdefault('in_stock', True)
+            counts[kind] += 1
+            if writer is not None:
+                ref = (firestore_db.db.collection('products').document(product_id) if product_id
+                       else firestore_db.db.collection('products').document())
+                queued[ref.path] = (line, sku, kind, ref.id, data.get('stock_quantity'))
+                pending.append((kind, ref, data))
+                if len(pending) >= PRODUCT_IMPORT_PROGRESS_EVERY:
+                    await flush()
+
+            if counts['rows'] % PRODUCT_IMPORT_PROGRESS_EVERY == 0:
+                yield {'type': 'progress', **counts}
+    except HTTPException as e:
+        aborted = e.detail
+    except Exception as e:
+        # A corrupt file; rows read before it are still written
+        logger.error(f"Vendor {vendor_id} catalog import stopped: {e}")
+        aborted = f"Could not read the rest of the file: {e}"
+    if aborted:
+        yield {'type': 'error', 'row': None, 'sku': None, 'error': aborted}
+
+    await flush()
+    if writer is not None:
+        await asyncio.to_thread(writer.close)
+
+    for path, message in failures:
+        line, sku, kind, _, _ = queued.pop(path)
+        counts[kind] -= 1
+        counts['errors'] += 1
+        yield {'type': 'error', 'row': line, 'sku': sku, 'error': f"Write failed: {message}"}
+
+    if writer is not None and (counts['created'] or counts['updated']):
+        # Existing products with sharded stock need their counters reset to the new levels
+        stock = {product_id: level for _, _, kind, product_id, level in queued.values()
+                 if kind == 'updated' and level is not None}
+        if stock:
+            await get_inventory_service().set_stock_many(stock)
+        get_catalog_cache().invalidate()
+        get_response_cache().clear()
+        # Wishlist entries snapshot name/price/image, so re-imported products fan out
+        fanout = get_wishlist_fanout()
+        for _, _, kind, product_id, _ in queued.values():
+            if kind == 'updated':
+                fanout.on_product_changed({'id': product_id}, None, product_id=product_id)
+        logger.info(f"Vendor {vendor_id} catalog import: {counts['created']} created, "
+                    f"{counts['updated']} updated, {counts['errors']} error(s)")
+
+    yield {'type': 'done', **counts, 'dry_run': dry_run, 'aborted': aborted is not None}
@@ -0,0 +1,259 @@
+"""
+Product Facet Engine for AfroMarket UK
+Column-oriented in-memory index for filtering, facet counts and sorting
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Supported sort keys for product listings
+SORT_OPTIONS = ("price_asc", "price_desc", "rating", "newest")
+
+# Rating thresholds reported in the rating facet ("4+ stars", ...)
+RATING_BUCKETS = (4.0, 3.0, 2.0, 1.0)
+
+
+def slugify(value: str) -> str:
+    """Normalise a label so 'Grains & Flours' matches 'grains-flours'"""
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')
+
+
+def _to_timestamp(value) -> float:
+    """Convert a Firestore timestamp, datetime or ISO string to epoch seconds"""
+    if value is None:
+        return 0.0
+    if hasattr(value, 'timestamp'):
+        try:
+            return float(value.timestamp())
+        except Exception:
+            return 0.0
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _to_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _split_values(value) -> List[str]:
+    """Accept a single value, a comma separated string or a list"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return [str(v) for v in value if v is not None]
+
+
+class FacetColumn:
+    """Dictionary-encoded string column (-1 marks a missing value)"""
+
+    def __init__(self, values: Iterable, normalize=str):
+        self.normalize = normalize
+        self.labels: List[str] = []
+        self.lookup: Dict[str, int] = {}
+        codes = []
+        for value in values:
+            if value is None or value == '':
+                codes.append(-1)
+                continue
+            key = normalize(value)
+            code = self.lookup.get(key)
+            if code is None:
+                code = len(self.labels)
+                self.lookup[key] = code
+                self.labels.append(str(value))
+            codes.append(code)
+        self.codes = np.asarray(codes, dtype=np.int32)
+
+    def match(self, wanted) -> np.ndarray:
+        """Boolean mask of rows whose value is one of the wanted labels"""
+        wanted_codes = [self.lookup[self.normalize(v)] for v in _split_values(wanted)
+                        if self.normalize(v) in self.lookup]
+        if not wanted_codes:
+            return np.zeros(len(self.codes), dtype=bool)
+        return np.isin(self.codes, wanted_codes)
+
+    def counts(self, mask: np.ndarray) -> List[Dict]:
+        """Facet counts for the rows selected by mask, most frequent first"""
+        selected = self.codes[mask]
+        selected = selected[selected >= 0]
+        counts = np.bincount(selected, minlength=len(self.labels))
+        order = np.argsort(-counts, kind='stable')
+        return [
+            {'value': self.labels[i], 'count': int(counts[i])}
+            for i in order if counts[i] > 0
+        ]
+
+
+class ProductFacetIndex:
+    """Array-backed product index answering filter, facet and sort queries"""
+
+    def __init__(self, products: List[Dict]):
+        self.products = list(products)
+
+        self.category = FacetColumn((p.get('category') for p in self.products), normalize=slugify)
+        self.vendor = FacetColumn((p.get('vendor_id') for p in self.products))
+        self.brand = FacetColumn((p.get('brand') for p in self.products), normalize=slugify)
+
+        self.in_stock = np.fromiter(
+            (bool(p.get('in_stock', True)) for p in self.products), dtype=bool, count=len(self.products)
+        )
+        self.price = np.fromiter(
+            (_to_float(p.get('price')) for p in self.products), dtype=np.float64, count=len(self.products)
+        )
+        self.rating = np.fromiter(
+            (_to_float(p.get('rating')) for p in self.products), dtype=np.float64, count=len(self.products)
+        )
+        self.created = np.fromiter(
+            (_to_timestamp(p.get('created_at')) for p in self.products), dtype=np.float64, count=len(self.products)
+        )
+
+        # Lower-cased text used by the substring search filter
+        self._haystacks = [
+            ' '.join(str(p.get(field) or '') for field in ('name', 'brand', 'category', 'description')).lower()
+            for p in self.products
+        ]
+
+    def __len__(self):
+        return len(self.products)
+
+    def _search_mask(self, search: str) -> np.ndarray:
+        needle = search.lower().strip()
+        return np.fromiter((needle in h for h in self._haystacks), dtype=bool, count=len(self._haystacks))
+
+    def _top_k(self, rows: np.ndarray, sort: Optional[str], k: int) -> np.ndarray:
+        """Return the first k rows in sort order without fully sorting the result set"""
+        if not sort or k <= 0:
+            return rows[:k]
+
+        if sort == "price_asc":
+            key = self.price[rows]
+        elif sort == "price_desc":
+            key = -self.price[rows]
+        elif sort == "rating":
+            key = -self.rating[rows]
+        elif sort == "newest":
+            key = -self.created[rows]
+        else:
+            raise ValueError(f"Unknown sort option: {sort}")
+
+        if k < len(rows):
+            part = np.argpartition(key, k - 1)[:k]
+            rows, key = rows[part], key[part]
+        return rows[np.argsort(key, kind='stable')]
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        vendor_id: Optional[str] = None,
+        brand: Optional[str] = None,
+        in_stock: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        search: Optional[str] = None,
+        sort: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict:
+        """
+        Filter, count facets and sort in one pass over the columns
+
+        Facet counts for a field ignore that field's own filter so the
+        client can show how many results each alternative would give.
+
+        Returns:
+            Dict with products page, total match count and facet counts
+        """
+        n = len(self.products)
+        base = np.ones(n, dtype=bool)
+
+        if min_price is not None:
+            base &= self.price >= min_price
+        if max_price is not None:
+            base &= self.price <= max_price
+        if min_rating is not None:
+            base &= self.rating >= min_rating
+        if search:
+            base &= self._search_mask(search)
+
+        facet_masks = {}
+        if category:
+            facet_masks['category'] = self.category.match(category)
+        if vendor_id:
+            facet_masks['vendor'] = self.vendor.match(vendor_id)
+        if brand:
+            facet_masks['brand'] = self.brand.match(brand)
+        if in_stock is not None:
+            facet_masks['in_stock'] = self.in_stock == bool(in_stock)
+
+        combined = base.copy()
+        for mask in facet_masks.values():
+            combined &= mask
+
+        def without(name):
+            mask = base.copy()
+            for other, other_mask in facet_masks.items():
+                if other != name:
+                    mask &= other_mask
+            return mask
+
+        stock_mask = without('in_stock')
+        facets = {
+            'category': self.category.counts(without('category')),
+            'vendor': self.vendor.counts(without('vendor')),
+            'brand': self.brand.counts(without('brand')),
+            'in_stock': {
+                'true': int(np.count_nonzero(stock_mask & self.in_stock)),
+                'false': int(np.count_nonzero(stock_mask & ~self.in_stock)),
+            },
+            'rating': [
+                {'min_rating': threshold, 'count': int(np.count_nonzero(combined & (self.rating >= threshold)))}
+                for threshold in RATING_BUCKETS
+            ],
+        }
+
+        rows = np.flatnonzero(combined)
+        total = int(len(rows))
+        if total:
+            prices = self.price[rows]
+            facets['price'] = {'min': round(float(prices.min()), 2), 'max': round(float(prices.max()), 2)}
+        else:
+            facets['price'] = {'min': None, 'max': None}
+
+        page = self._top_k(rows, sort, offset + limit)[offset:offset + limit]
+
+        return {
+            'products': [self.products[i] for i in page],
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'facets': facets,
+        }
+
+
+# Index memoized per catalog snapshot version
+_facet_index: Optional[ProductFacetIndex] = None
+_facet_index_version = None
+
+def get_facet_index(products: List[Dict], version) -> ProductFacetIndex:
+    """Get the facet index for a catalog snapshot, rebuilding on version change"""
+    global _facet_index, _facet_index_version
+    if _facet_index is None or _facet_index_version != version:
+        _facet_index = ProductFacetIndex(products)
+        _facet_index_version = version
+        logger.info(f"Product facet index built for {len(products)} products")
+    return _facet_index
@@ -0,0 +1,17 @@
+"""
+Product Models for AfroMarket UK
+Request models shared by the API and the catalog import script
+"""
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ProductCreate(BaseModel):
+    name: str
+    description: str
+    price: float
+    category: str
+    image: Optional[str] = None
+    weight: Optional[str] = None
+    original_price: Optional[float] = None
@@ -0,0 +1,315 @@
+"""
+Product Autocomplete for AfroMarket UK
+Prefix trie plus trigram index for typo-tolerant search suggestions
+"""
+
+import re
+import math
+import heapq
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Minimum trigram similarity for a fuzzy token match
+FUZZY_THRESHOLD = 0.45
+
+# Only fall back to fuzzy matching for words at least this long
+FUZZY_MIN_LENGTH = 3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric words"""
+    return _WORD_RE.findall(str(text or '').lower())
+
+
+def trigrams(word: str) -> Set[str]:
+    """Padded character trigrams ("egusi" -> "  e", " eg", "egu", ...)"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def popularity(product: Dict) -> float:
+    """Ranking score from rating, review count and sales where available"""
+    rating = float(product.get('rating') or 0)
+    reviews = float(product.get('review_count') or product.get('reviews') or 0)
+    sales = float(product.get('total_sales') or product.get('sales') or product.get('sold_count') or 0)
+    score = rating * math.log1p(reviews) + 2.0 * math.log1p(sales)
+    if product.get('in_stock', True):
+        score += 1.0
+    return score
+
+
+@dataclass
+class Suggestion:
+    key: str
+    text: str
+    kind: str  # product, brand or category
+    score: float = 0.0
+    product_id: Optional[str] = None
+    refs: int = 0  # number of products contributing to a brand/category entry
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.ids: Set[str] = set()
+        self.top: Optional[List[str]] = None  # cached best ids under this prefix
+
+
+class SuggestIndex:
+    """Incrementally maintained autocomplete index over product names, brands and categories"""
+
+    TOP_CACHE_SIZE = 20
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.suggestions: Dict[str, Suggestion] = {}
+        self.tokens: Dict[str, Set[str]] = {}  # token -> suggestion keys
+        self.trigram_index: Dict[str, Set[str]] = {}  # trigram -> tokens
+        self._product_keys: Dict[str, List[str]] = {}  # product id -> suggestion keys
+        self._product_scores: Dict[str, float] = {}
+
+    @classmethod
+    def build(cls, products: List[Dict]) -> 'SuggestIndex':
+        index = cls()
+        for product in products:
+            index.upsert_product(product)
+        # Single-letter prefixes are the widest and most common first keystroke
+        for node in index.root.children.values():
+            index._top_ids(node)
+        return index
+
+    # ---- trie / token maintenance ----
+
+    def _add_token(self, token: str, key: str):
+        node = self.root
+        node.ids.add(key)
+        node.top = None
+        for char in token:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.add(key)
+            node.top = None
+
+        keys = self.tokens.get(token)
+        if keys is None:
+            keys = self.tokens[token] = set()
+            for gram in trigrams(token):
+                self.trigram_index.setdefault(gram, set()).add(token)
+        keys.add(key)
+
+    def _remove_token(self, token: str, key: str):
+        """Unlink key from every trie node on the token's path"""
+        node = self.root
+        node.ids.discard(key)
+        node.top = None
+        for char in token:
+            node = node.children.get(char)
+            if node is None:
+                break
+            node.ids.discard(key)
+            node.top = None
+
+        keys = self.tokens.get(token)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.tokens[token]
+            for gram in trigrams(token):
+                grams = self.trigram_index.get(gram)
+                if grams:
+                    grams.discard(token)
+                    if not grams:
+                        del self.trigram_index[gram]
+
+    def _suggestion_tokens(self, key: str) -> Set[str]:
+        suggestion = self.suggestions.get(key)
+        return set(tokenize(suggestion.text)) if suggestion else set()
+
+    def _add_suggestion(self, key: str, text: str, kind: str, score: float, product_id: str = None):
+        suggestion = self.suggestions.get(key)
+        if suggestion is None:
+            suggestion = Suggestion(key=key, text=text, kind=kind, product_id=product_id)
+            self.suggestions[key] = suggestion
+            for token in set(tokenize(text)):
+                self._add_token(token, key)
+        suggestion.refs += 1
+        if kind == 'product':
+            suggestion.score = score
+        else:
+            suggestion.score += score
+        self._invalidate_tops(key)
+
+    def _release_suggestion(self, key: str, score: float):
+        suggestion = self.suggestions.get(key)
+        if suggestion is None:
+            return
+        suggestion.refs -= 1
+        if suggestion.kind != 'product':
+            suggestion.score -= score
+        if suggestion.refs <= 0:
+            for token in set(tokenize(suggestion.text)):
+                self._remove_token(token, key)
+            del self.suggestions[key]
+        else:
+            self._invalidate_tops(key)
+
+    def _invalidate_tops(self, key: str):
+        for token in self._suggestion_tokens(key):
+            node = self.root
+            node.top = None
+            for char in token:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                node.top = None
+
+    # ---- product updates ----
+
+    def upsert_product(self, product: Dict):
+        """Add or refresh a product's suggestions"""
+        product_id = str(product.get('id', ''))
+        if not product_id:
+            return
+        self.remove_product(product_id)
+
+        score = popularity(product)
+        keys = []
+        name = product.get('name')
+        if name:
+            key = f"product:{product_id}"
+            self._add_suggestion(key, name, 'product', score, product_id=product_id)
+            keys.append(key)
+        for kind in ('brand', 'category'):
+            value = product.get(kind)
+            if value:
+                key = f"{kind}:{str(value).lower()}"
+                self._add_suggestion(key, str(value), kind, score)
+                keys.append(key)
+
+        self._product_keys[product_id] = keys
+        self._product_scores[product_id] = score
+
+    def remove_product(self, product_id: str):
+        """Drop a product's suggestions"""
+        product_id = str(product_id)
+        keys = self._product_keys.pop(product_id, None)
+        if not keys:
+            return
+        score = self._product_scores.pop(product_id, 0.0)
+        for key in keys:
+            self._release_suggestion(key, score)
+
+    # ---- lookup ----
+
+    def _prefix_node(self, prefix: str) -> Optional[_TrieNode]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _top_ids(self, node: _TrieNode) -> List[str]:
+        if node.top is None:
+            node.top = heapq.nlargest(
+                self.TOP_CACHE_SIZE, node.ids, key=lambda k: self.suggestions[k].score
+            )
+        return node.top
+
+    def _fuzzy_keys(self, word: str, partial: bool) -> Set[str]:
+        """Suggestion keys for tokens similar to word (trigram Dice similarity)"""
+        grams = trigrams(word)
+        candidates: Dict[str, int] = {}
+        for gram in grams:
+            for token in self.trigram_index.get(gram, ()):
+                candidates[token] = candidates.get(token, 0) + 1
+
+        keys = set()
+        for token, shared in candidates.items():
+            similarity = 2.0 * shared / (len(grams) + len(trigrams(token)))
+            if partial and len(token) > len(word) + 1:
+                # Compare a partially typed word against the token's prefix
+                head = trigrams(token[:len(word) + 1])
+                similarity = max(similarity, 2.0 * len(grams & head) / (len(grams) + len(head)))
+            if similarity >= FUZZY_THRESHOLD:
+                keys |= self.tokens[token]
+        return keys
+
+    def _word_keys(self, word: str, partial: bool) -> Set[str]:
+        node = self._prefix_node(word) if partial else None
+        if partial:
+            keys = set(node.ids) if node else set()
+        else:
+            keys = set(self.tokens.get(word, ()))
+        if not keys and len(word) >= FUZZY_MIN_LENGTH:
+            keys = self._fuzzy_keys(word, partial)
+        return keys
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict]:
+        """Top suggestions for a partially typed query"""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        if len(words) == 1:
+            node = self._prefix_node(words[0])
+            if node is not None and node.ids:
+                ranked = self._top_ids(node)
+                if len(ranked) < limit and len(node.ids) > len(ranked):
+                    ranked = heapq.nlargest(limit, node.ids, key=lambda k: self.suggestions[k].score)
+                return [self._serialize(k) for k in ranked[:limit]]
+
+        # Multi-word or misspelled query: every word must match, the last as a prefix
+        keys = None
+        for i, word in enumerate(words):
+            word_keys = self._word_keys(word, partial=(i == len(words) - 1))
+            keys = word_keys if keys is None else keys & word_keys
+            if not keys:
+                return []
+
+        ranked = heapq.nlargest(limit, keys, key=lambda k: self.suggestions[k].score)
+        return [self._serialize(k) for k in ranked]
+
+    def _serialize(self, key: str) -> Dict:
+        suggestion = self.suggestions[key]
+        result = {'text': suggestion.text, 'type': suggestion.kind}
+        if suggestion.product_id:
+            result['product_id'] = suggestion.product_id
+        return result
+
+    def __len__(self):
+        return len(self.suggestions)
+
+
+# Index tracked against the catalog snapshot version
+_suggest_index: Optional[SuggestIndex] = None
+_suggest_index_version = None
+
+def get_suggest_index(products: List[Dict], version) -> SuggestIndex:
+    """Get the suggest index for a catalog snapshot, rebuilding on version change"""
+    global _suggest_index, _suggest_index_version
+    if _suggest_index is None or _suggest_index_version != version:
+        _suggest_index = SuggestIndex.build(products)
+        _suggest_index_version = version
+        logger.info(f"Product suggest index built: {len(_suggest_index)} suggestions")
+    return _suggest_index
+
+
+def on_product_changed(product: Optional[Dict], version, product_id: str = None):
+    """Catalog listener applying a single product change incrementally"""
+    global _suggest_index_version
+    if _suggest_index is None or _suggest_index_version != version - 1:
+        # Index is already behind this change and will be rebuilt on next use
+        return
+    if product is None:
+        _suggest_index.remove_product(product_id)
+    else:
+        _suggest_index.upsert_product(product)
+    _suggest_index_version = version
@@ -3,31 +3,51 @@ AfroMarket UK - Server with Firebase/Firestore Database
 Production-ready API server using Firebase as the only database
 """
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, Header, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import StreamingResponse
 import os
 import logging
 import json
 import jwt
-import bcrypt
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env', override=False)
 
 # Import Firestore database
-from firestore_db import firestore_db, seed_firestore_data, get_firebase_app
-from firebase_auth import verify_firebase_token, is_firebase_configured
+from firestore_db import firestore_db, seed_firestore_data, get_firebase_app, CART_MAX_QUANTITY
+from product_models import ProductCreate
+from firebase_auth import verify_firebase_token, is_firebase_configured, get_token_verifier
 from email_service import email_service
 from notification_service import ws_manager, NotificationService, PushNotificationService
 from chatbot_service import get_afrobot
+from chatbot_intents import get_intent_router
+from chatbot_cache import get_response_cache
+from chatbot_retrieval import on_product_changed as on_retrieval_product_changed
+from llm_governor import get_llm_governor
+from chat_session_store import get_session_store
+from catalog_cache import get_catalog_cache
+from checkout_service import get_checkout_service
+from pricing_service import get_pricing_engine, normalize_items
+from inventory_service import get_inventory_service
+from idempotency_service import get_idempotency_store, request_fingerprint
+from product_facets import get_facet_index, SORT_OPTIONS
+from product_suggest import get_suggest_index, on_product_changed
+from wishlist_service import get_wishlist_fanout
+from product_bulk_service import (
+    iter_csv_rows, sync_vendor_stock, PRODUCT_BULK_MAX_ROWS,
+    spool_upload, iter_upload_rows, upload_format, import_products, xlsx_import_available
+)
+from password_service import get_password_service
+from oauth.keys import close_http_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -83,6 +103,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Idempotent-Replayed"],
 )
 
 
@@ -124,20 +145,29 @@ class VendorRegisterRequest(BaseModel):
     postcode: str
     ownerName: Optional[str] = None
 
-class ProductCreate(BaseModel):
-    name: str
-    description: str
-    price: float
-    category: str
-    image: Optional[str] = None
-    weight: Optional[str] = None
-    original_price: Optional[float] = None
-
 class OrderCreate(BaseModel):
     items: list
     shipping_info: dict
     payment_info: dict
     total: float
+    delivery_option: str = "standard"
+    reservation_id: Optional[str] = None
+
+class PricingQuoteRequest(BaseModel):
+    items: list
+    postcode: str
+    delivery_option: str = "standard"
+
+class ReservationRequest(BaseModel):
+    items: list
+
+class CartOperation(BaseModel):
+    op: str  # 'add', 'set' or 'remove'
+    product_id: str
+    quantity: int = 1
+
+class CartBulkRequest(BaseModel):
+    operations: List[CartOperation]
 
 class ContactForm(BaseModel):
     name: str
@@ -228,7 +258,7 @@ async def register_user(user_data: UserRegister):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    password_hash = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode()
+    password_hash = await get_password_service().hash_password(user_data.password)
     
     # Create user
     user = await firestore_db.create_user({
@@ -262,9 +292,19 @@ async def login_user(credentials: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not bcrypt.checkpw(credentials.password.encode(), user['password_hash'].encode()):
+    valid, new_hash = await get_password_service().verify_password(
+        credentials.password, user.get('password_hash', '')
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade hashes made with outdated cost parameters
+    if new_hash:
+        try:
+            await firestore_db.update_user(user['id'], {'password_hash': new_hash})
+        except Exception as e:
+            logger.error(f"Failed to rehash password for user {user['id']}: {e}")
+    
     # Generate token
     token = create_jwt_token(user['id'], user['email'], user.get('is_admin', False))
     
@@ -287,7 +327,7 @@ async def firebase_auth(auth_data: FirebaseAuthRequest):
         raise HTTPException(status_code=500, detail="Firebase not configured")
     
     # Verify Firebase token
-    firebase_user = verify_firebase_token(auth_data.idToken)
+    firebase_user = await verify_firebase_token(auth_data.idToken)
     if not firebase_user:
         raise HTTPException(status_code=401, detail="Invalid Firebase token")
     
@@ -405,8 +445,7 @@ async def reset_password(request: Request):
                 raise HTTPException(status_code=400, detail="Reset token has expired")
         
         # Hash new password and update user
-        import hashlib
-        password_hash = hashlib.sha256(new_password.encode()).hexdigest()
+        password_hash = await get_password_service().hash_password(new_password)
         
         await firestore_db.update_user(user['id'], {
             'password_hash': password_hash,
@@ -446,15 +485,73 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 async def get_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
-    limit: int = Query(50, le=100)
+    vendor_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: Optional[str] = Query(None, description="price_asc, price_desc, rating or newest"),
+    offset: int = Query(0, ge=0),
+    include_facets: bool = Query(False, description="Return facet counts alongside products"),
+    limit: int = Query(50, ge=1, le=100)
 ):
-    """Get all products"""
-    if search:
-        products = await firestore_db.search_products(search, limit)
-    else:
-        products = await firestore_db.get_all_products(category=category, limit=limit)
+    """Get products with optional filters, sorting and facet counts"""
+    if sort and sort not in SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Use one of: {', '.join(SORT_OPTIONS)}")
+    
+    catalog = get_catalog_cache()
+    catalog_products = await catalog.get_products()
+    
+    if not catalog_products:
+        # Catalog snapshot unavailable - fall back to direct Firestore queries,
+        # which only support the baseline category/vendor/stock filters
+        if brand or sort or offset or min_rating is not None or min_price is not None or max_price is not None:
+            raise HTTPException(status_code=503, detail="Product filtering is temporarily unavailable")
+        if search:
+            products = await firestore_db.search_products(search, limit)
+            if vendor_id:
+                products = [p for p in products if p.get('vendor_id') == vendor_id]
+            if in_stock is not None:
+                products = [p for p in products if p.get('in_stock') == in_stock]
+        else:
+            products = await firestore_db.get_all_products(
+                category=category, vendor_id=vendor_id, in_stock=in_stock, limit=limit
+            )
+        if include_facets:
+            return {'products': products, 'total': len(products), 'offset': 0, 'limit': limit, 'facets': {}}
+        return products
+    
+    index = get_facet_index(catalog_products, catalog.version)
+    result = index.query(
+        category=category,
+        vendor_id=vendor_id,
+        brand=brand,
+        in_stock=in_stock,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        search=search,
+        sort=sort,
+        limit=limit,
+        offset=offset
+    )
     
-    return products
+    if include_facets:
+        return result
+    return result['products']
+
+
+@api_router.get("/products/suggest")
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """Typo-tolerant autocomplete over product names, brands and categories"""
+    catalog = get_catalog_cache()
+    products = await catalog.get_products()
+    index = get_suggest_index(products, catalog.version)
+    return {'query': q, 'suggestions': index.suggest(q, limit)}
 
 
 @api_router.get("/products/{product_id}")
@@ -485,6 +582,8 @@ async def create_product(
         **product_data.dict()
     })
     
+    get_catalog_cache().upsert_product(product)
+    
     return {'success': True, 'product': product}
 
 
@@ -934,6 +1033,89 @@ async def get_vendor_products(current_user: dict = Depends(get_current_user)):
     }
 
 
+@api_router.put("/vendor/products/stock-bulk")
+async def bulk_update_product_stock(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update stock and/or price for many products at once
+    
+    Accepts JSON ({"items": [{"product_id", "stock_quantity", "price"}]})
+    or a CSV upload (Content-Type: text/csv) with the same columns.
+    Returns a result per row; invalid rows do not stop the others.
+    """
+    vendor = await firestore_db.get_vendor_by_email(current_user.get('email'))
+    if not vendor:
+        raise HTTPException(status_code=403, detail="Vendor account not found")
+    
+    if 'csv' in request.headers.get('content-type', ''):
+        rows = [row async for row in iter_csv_rows(request.stream())]
+    else:
+        body = await request.json()
+        items = body.get('items') if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a list of items")
+        if len(items) > PRODUCT_BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {PRODUCT_BULK_MAX_ROWS} rows per upload")
+        rows = [(i + 1, item if isinstance(item, dict) else {}) for i, item in enumerate(items)]
+    
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to update")
+    
+    result = await sync_vendor_stock(vendor['id'], rows)
+    return {'success': True, **result}
+
+
+@api_router.post("/vendor/products/import")
+async def import_vendor_products(
+    request: Request,
+    filename: str = Query(''),
+    dry_run: bool = Query(False),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import a CSV or XLSX catalog, streaming progress as server-sent events
+    
+    Columns are the ProductCreate fields plus sku (required) and
+    stock_quantity. Products whose SKU the vendor already sells are
+    updated. Emits "error" events per rejected row, "progress" events
+    with running counts, and a final "done" event.
+    """
+    vendor = await firestore_db.get_vendor_by_user_id(current_user['id'])
+    if not vendor:
+        vendor = await firestore_db.get_vendor_by_email(current_user['email'])
+    
+    if not vendor or vendor.get('status') != 'approved':
+        raise HTTPException(status_code=403, detail="Vendor access required")
+    
+    file_format = upload_format(request.headers.get('content-type', ''), filename)
+    if not file_format:
+        raise HTTPException(status_code=415, detail="Upload a CSV or XLSX file")
+    if file_format == 'xlsx' and not xlsx_import_available():
+        raise HTTPException(status_code=415, detail="XLSX import is not available on this server, please upload CSV")
+    
+    # The body is spooled before responding: a streaming response cannot keep reading it
+    upload = await spool_upload(request.stream())
+    
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    async def event_stream():
+        try:
+            rows = iter_upload_rows(upload, file_format)
+            async for event in import_products(vendor['id'], rows, ProductCreate, dry_run=dry_run):
+                yield sse(event['type'], event)
+        finally:
+            upload.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @api_router.put("/vendor/products/{product_id}/stock")
 async def update_product_stock(
     product_id: str,
@@ -966,6 +1148,13 @@ async def update_product_stock(
         'in_stock': new_stock > 0,
         'updated_at': datetime.utcnow().isoformat()
     })
+    await get_inventory_service().set_stock(product_id, new_stock)
+    
+    get_catalog_cache().upsert_product({
+        **product,
+        'stock_quantity': new_stock,
+        'in_stock': new_stock > 0
+    })
     
     return {
         'success': True,
@@ -1036,7 +1225,9 @@ async def add_to_wishlist(
     current_user: dict = Depends(get_current_user)
 ):
     """Add product to wishlist"""
-    await firestore_db.add_to_wishlist(current_user['id'], product_id)
+    item = await firestore_db.add_to_wishlist(current_user['id'], product_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Product not found")
     return {'success': True, 'message': 'Added to wishlist'}
 
 
@@ -1052,16 +1243,14 @@ async def toggle_wishlist(
         if not product_id:
             raise HTTPException(status_code=400, detail="product_id is required")
         
-        # Check if product is already in wishlist
-        wishlist = await firestore_db.get_user_wishlist(current_user['id'])
-        is_in_wishlist = any(item.get('product_id') == product_id for item in wishlist)
-        
-        if is_in_wishlist:
-            await firestore_db.remove_from_wishlist(current_user['id'], product_id)
-            return {'success': True, 'in_wishlist': False, 'message': 'Removed from wishlist'}
-        else:
-            await firestore_db.add_to_wishlist(current_user['id'], product_id)
+        in_wishlist = await firestore_db.toggle_wishlist(current_user['id'], product_id)
+        if in_wishlist is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if in_wishlist:
             return {'success': True, 'in_wishlist': True, 'message': 'Added to wishlist'}
+        return {'success': True, 'in_wishlist': False, 'message': 'Removed from wishlist'}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error toggling wishlist: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1109,122 +1298,117 @@ async def get_all_ads(current_user: dict = Depends(get_current_user)):
 
 # ============ ORDER ROUTES ============
 
-@api_router.post("/orders")
-async def create_order(
-    order_data: OrderCreate,
+async def run_idempotent(scope: str, idempotency_key: Optional[str], payload, response: Response, execute):
+    """Run a create endpoint once per Idempotency-Key, replaying the stored result to retries"""
+    if not idempotency_key:
+        return await execute()
+    result, replayed = await get_idempotency_store().run(
+        scope, idempotency_key, request_fingerprint(payload), execute
+    )
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return result
+
+
+@api_router.post("/pricing/quote")
+async def get_pricing_quote(
+    request: PricingQuoteRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Create a new order and send payment notifications"""
-    # Get vendor IDs from items
-    vendor_ids = list(set(item.get('vendorId') for item in order_data.items if item.get('vendorId')))
-    
-    order = await firestore_db.create_order({
-        'user_id': current_user['id'],
-        'items': order_data.items,
-        'shipping_info': order_data.shipping_info,
-        'payment_info': {k: v for k, v in order_data.payment_info.items() if k != 'cardNumber'},
-        'total': order_data.total,
-        'vendor_ids': vendor_ids,
-        'status': 'confirmed'  # Payment confirmed
-    })
-    
-    # Prepare data for email notifications
-    order_id = order['order_id']
-    
-    # Get vendor details and prepare vendor-specific data
-    vendors_data = []
-    for vendor_id in vendor_ids:
-        vendor_items = [i for i in order_data.items if i.get('vendorId') == vendor_id]
-        vendor_total = sum(i.get('price', 0) * i.get('quantity', 1) for i in vendor_items)
-        
-        # Get vendor info from database
-        vendor = await firestore_db.get_vendor_by_id(vendor_id)
-        if vendor:
-            # Add vendor name to items for email
-            for item in vendor_items:
-                item['vendor_name'] = vendor.get('business_name', vendor.get('businessName', 'Vendor'))
-            
-            vendors_data.append({
-                'id': vendor_id,
-                'name': vendor.get('business_name', vendor.get('businessName', 'Vendor')),
-                'email': vendor.get('email', ''),
-                'items': vendor_items
-            })
-        
-        # Create in-app notification for vendor
-        await firestore_db.create_notification({
-            'vendor_id': vendor_id,
-            'type': 'order',
-            'title': f"🛒 New Order #{order_id}!",
-            'message': f"New order with {len(vendor_items)} item(s) totaling £{vendor_total:.2f}",
-            'link': f"/vendor/dashboard?tab=orders&order={order_id}",
-            'data': {'order_id': order_id, 'total': vendor_total}
-        })
-        
-        # WebSocket notification
-        await ws_manager.send_to_vendor(vendor_id, {
-            'type': 'notification',
-            'notification': {
-                'type': 'order',
-                'title': f"🛒 New Order #{order_id}!",
-                'message': f"New order with {len(vendor_items)} item(s) totaling £{vendor_total:.2f}",
-                'link': "/vendor/dashboard?tab=orders"
-            }
-        })
+    """Server-side price for a basket, as it will be charged at checkout"""
+    priced = await get_pricing_engine().quote(
+        current_user, request.items, request.postcode, request.delivery_option
+    )
+    return {'success': True, 'quote': priced.to_dict()}
+
+
+@api_router.post("/checkout/reserve")
+async def reserve_checkout_stock(
+    request: ReservationRequest,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Hold stock for a basket while the customer pays"""
+    async def reserve():
+        quantities = {product_id: quantity for product_id, quantity, _ in normalize_items(request.items)}
+        hold = await get_inventory_service().reserve(current_user['id'], quantities)
+        return {
+            'success': True,
+            'reservation_id': hold['id'],
+            'expires_at': hold['expires_at'].isoformat()
+        }
+
+    return await run_idempotent(f"reserve:{current_user['id']}", idempotency_key, request, response, reserve)
+
+
+@api_router.delete("/checkout/reservations/{reservation_id}")
+async def release_checkout_stock(
+    reservation_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Release held stock, e.g. when payment is cancelled or fails"""
+    inventory = get_inventory_service()
+    hold = await inventory.get_hold(reservation_id)
+    if not hold or hold.get('user_id') != current_user['id']:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    released = await inventory.release(reservation_id)
+    return {'success': True, 'released': released}
+
+
+@api_router.get("/owner/inventory/stats")
+async def get_inventory_stats(current_user: dict = Depends(get_current_user)):
+    """Stock reservation statistics for the owner dashboard"""
+    if not current_user.get('is_admin') and current_user.get('email') != 'sotubodammy@gmail.com':
+        raise HTTPException(status_code=403, detail="Owner access required")
     
-    # Calculate delivery info
-    subtotal = sum(i.get('price', 0) * i.get('quantity', 1) for i in order_data.items)
-    delivery_fee = order_data.total - subtotal
-    
-    # Prepare order data for emails
-    email_order_data = {
-        'order_id': order_id,
-        'items': order_data.items,
-        'shipping_info': order_data.shipping_info,
-        'delivery_info': {
-            'estimated_days': '2-4 days',  # Default estimate
-            'zone_name': 'Standard',
-            'delivery_option': 'Standard Delivery',
-            'delivery_fee': delivery_fee
-        },
-        'subtotal': subtotal,
-        'delivery_fee': delivery_fee,
-        'total': order_data.total,
-        'payment_method': order_data.payment_info.get('method', 'Card')
+    return {
+        "success": True,
+        "inventory": get_inventory_service().get_stats()
     }
+
+
+@api_router.get("/owner/idempotency/stats")
+async def get_idempotency_stats(current_user: dict = Depends(get_current_user)):
+    """Idempotency key statistics for the owner dashboard"""
+    if not current_user.get('is_admin') and current_user.get('email') != 'sotubodammy@gmail.com':
+        raise HTTPException(status_code=403, detail="Owner access required")
     
-    # Customer info
-    customer_info = {
-        'name': current_user.get('name', 'Customer'),
-        'email': current_user.get('email', '')
+    return {
+        "success": True,
+        "idempotency": get_idempotency_store().get_stats()
     }
-    
-    # Send all payment notifications asynchronously (don't block order completion)
-    try:
-        import asyncio
-        asyncio.create_task(
-            email_service.send_all_payment_notifications(
-                order_data=email_order_data,
-                customer_info=customer_info,
-                vendors_data=vendors_data
-            )
+
+
+@api_router.post("/orders")
+async def create_order(
+    order_data: OrderCreate,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Create a new order and send payment notifications"""
+    async def place_order():
+        order = await get_checkout_service().place_order(
+            user=current_user,
+            items=order_data.items,
+            shipping_info=order_data.shipping_info,
+            payment_info=order_data.payment_info,
+            client_total=order_data.total,
+            delivery_option=order_data.delivery_option,
+            reservation_id=order_data.reservation_id
         )
-        logger.info(f"Payment notifications queued for order #{order_id}")
-    except Exception as e:
-        logger.error(f"Failed to queue payment notifications: {str(e)}")
-    
-    # Clear cart
-    await firestore_db.clear_user_cart(current_user['id'])
-    
-    return {
-        'success': True,
-        'order': {
-            'id': order['id'],
-            'orderId': order_id,
-            'total': order['total'],
-            'status': order['status']
+        return {
+            'success': True,
+            'order': {
+                'id': order['id'],
+                'orderId': order['order_id'],
+                'total': order['total'],
+                'status': order['status']
+            }
         }
-    }
+
+    return await run_idempotent(f"orders:{current_user['id']}", idempotency_key, order_data, response, place_order)
 
 
 @api_router.get("/orders")
@@ -1241,10 +1425,11 @@ async def get_cart(current_user: dict = Depends(get_current_user)):
     """Get user's cart"""
     cart_items = await firestore_db.get_user_cart(current_user['id'])
     
-    # Enrich with product details
+    # Enrich with product details in one batched read
+    products = await firestore_db.get_products_by_ids([item['product_id'] for item in cart_items])
     enriched_items = []
     for item in cart_items:
-        product = await firestore_db.get_product_by_id(item['product_id'])
+        product = products.get(item['product_id'])
         if product:
             enriched_items.append({
                 **item,
@@ -1271,6 +1456,34 @@ async def add_to_cart(
     return {'success': True, 'item': result}
 
 
+@api_router.post("/cart/bulk")
+async def bulk_update_cart(
+    request: CartBulkRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Apply several add/set/remove operations at once, e.g. merging a guest cart after login"""
+    if not request.operations:
+        raise HTTPException(status_code=400, detail="No cart operations given")
+    if len(request.operations) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 cart operations per request")
+    for operation in request.operations:
+        if operation.op not in ('add', 'set', 'remove'):
+            raise HTTPException(status_code=400, detail=f"Unknown cart operation '{operation.op}'")
+        if operation.op == 'add' and operation.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        if operation.op != 'remove' and operation.quantity > CART_MAX_QUANTITY:
+            raise HTTPException(status_code=400, detail=f"Quantity cannot exceed {CART_MAX_QUANTITY}")
+    
+    result = await firestore_db.bulk_update_cart(
+        current_user['id'], [operation.dict() for operation in request.operations]
+    )
+    if result['missing']:
+        raise HTTPException(status_code=404, detail=f"Products not found: {', '.join(result['missing'])}")
+    if result['over_limit']:
+        raise HTTPException(status_code=400, detail=f"Quantity cannot exceed {CART_MAX_QUANTITY} for: {', '.join(result['over_limit'])}")
+    return {'success': True, 'items': result['items']}
+
+
 @api_router.put("/cart/update/{product_id}")
 async def update_cart_item(
     product_id: str,
@@ -1301,23 +1514,23 @@ async def remove_cart_item(
     return {'success': True, 'message': 'Item removed from cart'}
 
 
+@api_router.delete("/cart/clear")
+async def clear_cart(current_user: dict = Depends(get_current_user)):
+    """Clear all items from cart"""
+    await firestore_db.clear_cart(current_user['id'])
+    return {'success': True, 'message': 'Cart cleared'}
+
+
 @api_router.delete("/cart/{item_id}")
 async def remove_from_cart(
     item_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Remove item from cart"""
-    await firestore_db.update_cart_item(item_id, 0)
+    await firestore_db.update_cart_item(current_user['id'], item_id, 0)
     return {'success': True}
 
 
-@api_router.delete("/cart/clear")
-async def clear_cart(current_user: dict = Depends(get_current_user)):
-    """Clear all items from cart"""
-    await firestore_db.clear_cart(current_user['id'])
-    return {'success': True, 'message': 'Cart cleared'}
-
-
 # ============ NOTIFICATION ROUTES ============
 
 @api_router.get("/vendor/notifications")
@@ -1545,7 +1758,8 @@ async def get_chatbot_welcome():
     }
 
 @api_router.post("/chatbot/message")
-async def send_chatbot_message(request: ChatMessageRequest):
+async def send_chatbot_message(request: ChatMessageRequest,
+                               current_user: Optional[dict] = Depends(get_current_user_optional)):
     """Send a message to AfroBot and get response"""
     afrobot = get_afrobot()
     
@@ -1557,7 +1771,8 @@ async def send_chatbot_message(request: ChatMessageRequest):
     # Get AI response
     response = await afrobot.get_chat_response(
         message=request.message,
-        session_id=session_id
+        session_id=session_id,
+        user_id=current_user['id'] if current_user else None
     )
     
     return {
@@ -1567,6 +1782,38 @@ async def send_chatbot_message(request: ChatMessageRequest):
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@api_router.post("/chatbot/message/stream")
+async def stream_chatbot_message(request: ChatMessageRequest,
+                                 current_user: Optional[dict] = Depends(get_current_user_optional)):
+    """Send a message to AfroBot and stream the reply as server-sent events"""
+    afrobot = get_afrobot()
+    
+    session_id = request.session_id
+    if not session_id:
+        session_id = await afrobot.create_chat_session()
+    
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    async def event_stream():
+        yield sse("session", {"session_id": session_id})
+        parts = []
+        user_id = current_user['id'] if current_user else None
+        async for delta in afrobot.stream_chat_response(request.message, session_id, user_id):
+            parts.append(delta)
+            yield sse("token", {"delta": delta})
+        yield sse("done", {
+            "response": "".join(parts),
+            "session_id": session_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/chatbot/quick-replies")
 async def get_chatbot_quick_replies():
     """Get quick reply suggestions"""
@@ -1576,6 +1823,20 @@ async def get_chatbot_quick_replies():
         "quick_replies": afrobot.get_quick_replies()
     }
 
+@api_router.get("/owner/chatbot/stats")
+async def get_chatbot_stats(current_user: dict = Depends(get_current_user)):
+    """AfroBot routing and session statistics for the owner dashboard"""
+    if not current_user.get('is_admin') and current_user.get('email') != 'sotubodammy@gmail.com':
+        raise HTTPException(status_code=403, detail="Owner access required")
+    
+    return {
+        "success": True,
+        "intents": get_intent_router().get_stats(),
+        "response_cache": get_response_cache().get_stats(),
+        "llm": get_llm_governor().get_stats(),
+        "sessions": get_session_store().get_stats()
+    }
+
 
 # ============ DELIVERY API ============
 
@@ -1586,6 +1847,7 @@ class DeliveryCalculateRequest(BaseModel):
     subtotal: float
     weight_kg: float = 1.0
     delivery_option: str = "standard"
+    origin_postcode: Optional[str] = None
 
 @api_router.post("/delivery/calculate")
 async def calculate_delivery(request: DeliveryCalculateRequest):
@@ -1595,7 +1857,8 @@ async def calculate_delivery(request: DeliveryCalculateRequest):
         postcode=request.postcode,
         subtotal=request.subtotal,
         weight_kg=request.weight_kg,
-        option=request.delivery_option
+        option=request.delivery_option,
+        origin_postcode=request.origin_postcode
     )
     return result
 
@@ -1603,14 +1866,16 @@ async def calculate_delivery(request: DeliveryCalculateRequest):
 async def get_delivery_options(
     postcode: str = Query(..., description="UK postcode"),
     subtotal: float = Query(..., description="Order subtotal in GBP"),
-    weight_kg: float = Query(1.0, description="Total weight in kg")
+    weight_kg: float = Query(1.0, description="Total weight in kg"),
+    origin_postcode: Optional[str] = Query(None, description="Vendor's postcode for distance-based pricing")
 ):
     """Get all available delivery options for a postcode"""
     delivery_service = get_delivery_service()
     result = delivery_service.get_options(
         postcode=postcode,
         subtotal=subtotal,
-        weight_kg=weight_kg
+        weight_kg=weight_kg,
+        origin_postcode=origin_postcode
     )
     return result
 
@@ -1623,6 +1888,63 @@ async def get_delivery_zones():
         "free_delivery_threshold": FREE_DELIVERY_THRESHOLD
     }
 
+class DeliveryShipment(BaseModel):
+    vendor_id: str
+    origin_postcode: Optional[str] = None
+    subtotal: float = 0.0
+    weight_kg: float = 1.0
+
+class DeliveryQuoteBatchRequest(BaseModel):
+    postcode: str
+    shipments: List[DeliveryShipment] = Field(..., min_length=1, max_length=100)
+
+@api_router.post("/delivery/quote-batch")
+async def quote_delivery_batch(request: DeliveryQuoteBatchRequest):
+    """Quote all delivery options for every vendor shipment in a basket"""
+    delivery_service = get_delivery_service()
+    return delivery_service.quote_batch(
+        postcode=request.postcode,
+        shipments=[s.dict() for s in request.shipments]
+    )
+
+class ZoneResolveRequest(BaseModel):
+    postcodes: List[str] = Field(..., max_length=10000)
+
+@api_router.get("/owner/delivery/stats")
+async def get_delivery_stats(current_user: dict = Depends(get_current_user)):
+    """Delivery quote cache statistics for the owner dashboard"""
+    if not current_user.get('is_admin') and current_user.get('email') != 'sotubodammy@gmail.com':
+        raise HTTPException(status_code=403, detail="Owner access required")
+    
+    return {
+        "success": True,
+        "quote_cache": get_delivery_service().get_cache_stats()
+    }
+
+
+@api_router.post("/owner/delivery/reload")
+async def reload_delivery_zones(current_user: dict = Depends(get_current_user)):
+    """Re-read the delivery zone CSV files after a pricing change, without a restart"""
+    if not current_user.get('is_admin') and current_user.get('email') != 'sotubodammy@gmail.com':
+        raise HTTPException(status_code=403, detail="Owner access required")
+    
+    try:
+        result = get_delivery_service().reload_zones()
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f"Delivery zone reload failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Delivery zones not reloaded: {e}")
+    logger.info(f"Delivery zones reloaded: {result}")
+    return {"success": True, **result}
+
+
+@api_router.post("/delivery/zones/resolve")
+async def resolve_delivery_zones(request: ZoneResolveRequest):
+    """Resolve the delivery zone for a batch of postcodes"""
+    delivery_service = get_delivery_service()
+    return {
+        "zones": delivery_service.resolve_zones(request.postcodes)
+    }
+
 
 # ============ HEALTH & STATUS ============
 
@@ -1679,16 +2001,33 @@ async def startup():
     """Initialize on startup"""
     logger.info("Starting AfroMarket UK API with Firestore...")
     
+    # Pre-compute delivery quotes for every zone
+    get_delivery_service().warm_quote_cache()
+    
     # Initialize Firebase
     firebase_app = get_firebase_app()
     if firebase_app:
         logger.info("Firebase initialized successfully")
+        catalog = get_catalog_cache()
+        catalog.set_loader(lambda limit: firestore_db.get_all_products(limit=limit))
+        catalog.add_listener(on_product_changed)
+        catalog.add_listener(get_response_cache().on_product_changed)
+        catalog.add_listener(on_retrieval_product_changed)
+        catalog.add_listener(get_wishlist_fanout().on_product_changed)
         
         # Seed data if needed
         try:
             await seed_firestore_data()
         except Exception as e:
             logger.error(f"Failed to seed data: {e}")
+        
+        # Warm Firebase ID token certificates and keep them refreshed
+        token_verifier = get_token_verifier()
+        if token_verifier:
+            await token_verifier.start()
+        
+        # Release abandoned checkout stock holds
+        get_inventory_service().start()
     else:
         logger.error("Firebase initialization failed!")
     
@@ -1699,6 +2038,12 @@ async def startup():
 async def shutdown():
     """Cleanup on shutdown"""
     logger.info("Shutting down AfroMarket UK API...")
+    get_password_service().shutdown()
+    get_inventory_service().stop()
+    token_verifier = get_token_verifier()
+    if token_verifier:
+        await token_verifier.stop()
+    await close_http_client()
 
 
 if __name__ == "__main__":
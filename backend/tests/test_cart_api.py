@@ -0,0 +1,125 @@
+"""
+AfroMarket UK - Cart API Tests
+Testing: Bulk cart operations
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+# Test credentials
+USER_EMAIL = "user@test.com"
+USER_PASSWORD = "123456"
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+@pytest.fixture(scope="module")
+def user_token(api_client):
+    """Get user authentication token"""
+    response = api_client.post(f"{API}/auth/login", json={
+        "email": USER_EMAIL,
+        "password": USER_PASSWORD
+    })
+    if response.status_code == 200:
+        return response.json().get("token")
+    pytest.skip("User authentication failed - skipping cart tests")
+
+
+@pytest.fixture(scope="module")
+def auth_headers(user_token):
+    return {"Authorization": f"Bearer {user_token}"}
+
+
+@pytest.fixture(scope="module")
+def product_ids(api_client):
+    """Two product ids to put in the cart"""
+    response = api_client.get(f"{API}/products", params={"limit": 10})
+    assert response.status_code == 200
+    products = response.json()
+    if len(products) < 2:
+        pytest.skip("Need at least two products")
+    return [products[0]["id"], products[1]["id"]]
+
+
+def quantities(items):
+    return {item["product_id"]: item["quantity"] for item in items}
+
+
+class TestCartBulk:
+    """Bulk cart operation tests"""
+
+    def test_bulk_requires_auth(self, api_client):
+        """Test bulk cart updates need a signed-in user"""
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [{"op": "add", "product_id": "any", "quantity": 1}]
+        })
+        assert response.status_code == 401
+        print("✓ Bulk cart requires authentication")
+
+    def test_bulk_add_set_remove(self, api_client, auth_headers, product_ids):
+        """Test operations are folded per product and applied together"""
+        first, second = product_ids
+        api_client.delete(f"{API}/cart/clear", headers=auth_headers)
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [
+                {"op": "add", "product_id": first, "quantity": 2},
+                {"op": "add", "product_id": first, "quantity": 3},
+                {"op": "set", "product_id": second, "quantity": 4}
+            ]
+        }, headers=auth_headers)
+        assert response.status_code == 200
+        assert quantities(response.json()["items"]) == {first: 5, second: 4}
+
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [{"op": "remove", "product_id": second}]
+        }, headers=auth_headers)
+        assert response.status_code == 200
+        assert quantities(response.json()["items"]) == {first: 5}
+        print("✓ Bulk add, set and remove applied")
+
+    def test_bulk_folded_quantity_capped(self, api_client, auth_headers, product_ids):
+        """Test repeated adds cannot push a line past 100 units"""
+        first = product_ids[0]
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [
+                {"op": "set", "product_id": first, "quantity": 60},
+                {"op": "add", "product_id": first, "quantity": 50}
+            ]
+        }, headers=auth_headers)
+        assert response.status_code == 400
+        print("✓ Folded quantity over 100 rejected")
+
+    def test_bulk_unknown_product(self, api_client, auth_headers):
+        """Test nothing is written when a product does not exist"""
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [{"op": "add", "product_id": "no-such-product", "quantity": 1}]
+        }, headers=auth_headers)
+        assert response.status_code == 404
+        print("✓ Unknown product rejected")
+
+    def test_bulk_invalid_operations(self, api_client, auth_headers, product_ids):
+        """Test unknown ops, empty requests and oversized requests are rejected"""
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [{"op": "double", "product_id": product_ids[0]}]
+        }, headers=auth_headers)
+        assert response.status_code == 400
+
+        response = api_client.post(f"{API}/cart/bulk", json={"operations": []}, headers=auth_headers)
+        assert response.status_code == 400
+
+        response = api_client.post(f"{API}/cart/bulk", json={
+            "operations": [{"op": "add", "product_id": product_ids[0], "quantity": 1}] * 101
+        }, headers=auth_headers)
+        assert response.status_code == 400
+        api_client.delete(f"{API}/cart/clear", headers=auth_headers)
+        print("✓ Invalid bulk requests rejected")
@@ -0,0 +1,95 @@
+"""
+AfroMarket UK - Catalog API Tests
+Testing: Product filters, sorting, facet counts and autocomplete
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+class TestProductFacets:
+    """Product filtering, sorting and facet tests"""
+
+    def test_products_default_shape(self, api_client):
+        """Test products listing still returns a plain list"""
+        response = api_client.get(f"{API}/products")
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        print("✓ Products listing returns a list")
+
+    def test_products_with_facets(self, api_client):
+        """Test facet counts are returned when requested"""
+        response = api_client.get(f"{API}/products", params={"include_facets": "true"})
+        assert response.status_code == 200
+        data = response.json()
+        assert "products" in data
+        assert "total" in data
+        assert "category" in data["facets"]
+        assert "in_stock" in data["facets"]
+        print(f"✓ Facets returned - {data['total']} products, {len(data['facets']['category'])} categories")
+
+    def test_products_price_range_and_sort(self, api_client):
+        """Test price range filter combined with price sort"""
+        response = api_client.get(f"{API}/products", params={
+            "min_price": 3,
+            "max_price": 10,
+            "sort": "price_asc"
+        })
+        assert response.status_code == 200
+        prices = [p["price"] for p in response.json()]
+        assert all(3 <= p <= 10 for p in prices)
+        assert prices == sorted(prices)
+        print(f"✓ Price filter and sort working - {len(prices)} products")
+
+    def test_products_category_slug(self, api_client):
+        """Test category filter accepts URL slugs"""
+        response = api_client.get(f"{API}/products", params={"category": "grains-flours"})
+        assert response.status_code == 200
+        for product in response.json():
+            assert product["category"] == "Grains & Flours"
+        print("✓ Category slug filter working")
+
+    def test_products_invalid_sort(self, api_client):
+        """Test unknown sort option is rejected"""
+        response = api_client.get(f"{API}/products", params={"sort": "cheapest"})
+        assert response.status_code == 400
+        print("✓ Invalid sort rejected")
+
+
+class TestProductSuggest:
+    """Autocomplete endpoint tests"""
+
+    def test_suggest_prefix(self, api_client):
+        """Test prefix suggestions"""
+        response = api_client.get(f"{API}/products/suggest", params={"q": "pal"})
+        assert response.status_code == 200
+        data = response.json()
+        assert any("Palm" in s["text"] for s in data["suggestions"])
+        print(f"✓ Prefix suggestions: {[s['text'] for s in data['suggestions']]}")
+
+    def test_suggest_misspelling(self, api_client):
+        """Test misspelled queries still find the product"""
+        for query, expected in [("egsi", "Egusi"), ("ogbno", "Ogbono"), ("gari", "Garri")]:
+            response = api_client.get(f"{API}/products/suggest", params={"q": query})
+            assert response.status_code == 200
+            texts = [s["text"] for s in response.json()["suggestions"]]
+            assert any(expected in t for t in texts), f"{query} -> {texts}"
+        print("✓ Typo-tolerant suggestions working")
+
+    def test_suggest_requires_query(self, api_client):
+        """Test empty query is rejected"""
+        response = api_client.get(f"{API}/products/suggest")
+        assert response.status_code == 422
+        print("✓ Missing query rejected")
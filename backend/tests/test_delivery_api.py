@@ -0,0 +1,80 @@
+"""
+AfroMarket UK - Delivery API Tests
+Testing: Zone resolution, batch quoting for multi-vendor baskets
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+class TestDeliveryZones:
+    """Postcode to zone resolution tests"""
+
+    def test_resolve_zones_batch(self, api_client):
+        """Test a batch of postcodes resolves in request order"""
+        response = api_client.post(f"{API}/delivery/zones/resolve", json={
+            "postcodes": ["E1 6AN", "M1 1AD", "IV41 8AB", "IV2 3AB"]
+        })
+        assert response.status_code == 200
+        zones = response.json()["zones"]
+        assert zones == ["local", "far", "islands", "far"]
+        print(f"✓ Zones resolved - {zones}")
+
+
+class TestDeliveryQuoteBatch:
+    """Multi-vendor basket quoting tests"""
+
+    def test_quote_batch_per_vendor_and_totals(self, api_client):
+        """Test every option is quoted per vendor and summed"""
+        response = api_client.post(f"{API}/delivery/quote-batch", json={
+            "postcode": "SW1A 1AA",
+            "shipments": [
+                {"vendor_id": "vendor-a", "origin_postcode": "M1 1AD", "subtotal": 30, "weight_kg": 3},
+                {"vendor_id": "vendor-b", "origin_postcode": "B1 2HN", "subtotal": 20}
+            ]
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["shipments"]) == 2
+        assert [o["key"] for o in data["totals"]] == ["standard", "express", "next_day"]
+        for j, total in enumerate(data["totals"]):
+            expected = sum(s["options"][j]["cost"] for s in data["shipments"])
+            assert abs(total["cost"] - expected) < 0.01
+        assert data["qualifies_for_free"] is False
+        print(f"✓ Batch quote - standard total £{data['totals'][0]['cost']}")
+
+    def test_quote_batch_free_threshold_applies_to_basket(self, api_client):
+        """Test the free delivery threshold uses the combined basket subtotal"""
+        response = api_client.post(f"{API}/delivery/quote-batch", json={
+            "postcode": "SW1A 1AA",
+            "shipments": [
+                {"vendor_id": "vendor-a", "subtotal": 60},
+                {"vendor_id": "vendor-b", "subtotal": 50}
+            ]
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["qualifies_for_free"] is True
+        assert all(t["cost"] == 0 for t in data["totals"])
+        print("✓ Basket over £100 ships free from every vendor")
+
+    def test_quote_batch_requires_shipments(self, api_client):
+        """Test an empty basket is rejected"""
+        response = api_client.post(f"{API}/delivery/quote-batch", json={
+            "postcode": "SW1A 1AA",
+            "shipments": []
+        })
+        assert response.status_code == 422
+        print("✓ Empty basket rejected")
@@ -0,0 +1,97 @@
+"""
+AfroMarket UK - Inventory Reservation API Tests
+Testing: Checkout stock holds, release and out-of-stock rejection
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+# Test credentials
+USER_EMAIL = "user@test.com"
+USER_PASSWORD = "123456"
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+@pytest.fixture(scope="module")
+def user_token(api_client):
+    """Get user authentication token"""
+    response = api_client.post(f"{API}/auth/login", json={
+        "email": USER_EMAIL,
+        "password": USER_PASSWORD
+    })
+    if response.status_code == 200:
+        return response.json().get("token")
+    pytest.skip("User authentication failed - skipping reservation tests")
+
+
+@pytest.fixture(scope="module")
+def stocked_product(api_client):
+    """A product with tracked stock to reserve"""
+    response = api_client.get(f"{API}/products", params={"in_stock": "true", "limit": 50})
+    assert response.status_code == 200
+    for product in response.json():
+        if isinstance(product.get("stock_quantity"), int) and product["stock_quantity"] >= 2:
+            return product
+    pytest.skip("No product with tracked stock available")
+
+
+class TestCheckoutReservations:
+    """Stock hold tests"""
+
+    def test_reserve_requires_auth(self, api_client):
+        """Test reservations need a signed-in user"""
+        response = api_client.post(f"{API}/checkout/reserve", json={
+            "items": [{"product_id": "any", "quantity": 1}]
+        })
+        assert response.status_code == 401
+        print("✓ Reservation requires authentication")
+
+    def test_reserve_and_release(self, api_client, user_token, stocked_product):
+        """Test a basket is held and can be released"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = api_client.post(f"{API}/checkout/reserve", json={
+            "items": [{"product_id": stocked_product["id"], "quantity": 1}]
+        }, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] == True
+        assert data["reservation_id"]
+        assert "expires_at" in data
+
+        response = api_client.delete(f"{API}/checkout/reservations/{data['reservation_id']}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["released"] == True
+
+        # A second release is a no-op
+        response = api_client.delete(f"{API}/checkout/reservations/{data['reservation_id']}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["released"] == False
+        print(f"✓ Reserved and released {stocked_product['name']}")
+
+    def test_reserve_more_than_stock(self, api_client, user_token, stocked_product):
+        """Test a basket larger than the stock is rejected"""
+        response = api_client.post(f"{API}/checkout/reserve", json={
+            "items": [{"product_id": stocked_product["id"], "quantity": stocked_product["stock_quantity"] + 1}]
+        }, headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code in [400, 409]
+        print("✓ Over-stock reservation rejected")
+
+    def test_release_unknown_reservation(self, api_client, user_token):
+        """Test releasing someone else's or an unknown hold is a 404"""
+        response = api_client.delete(
+            f"{API}/checkout/reservations/does-not-exist",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == 404
+        print("✓ Unknown reservation not found")
@@ -0,0 +1,79 @@
+"""
+AfroMarket UK - Order API Tests
+Testing: Time-sortable order numbers
+"""
+
+import re
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+# Test credentials
+USER_EMAIL = "user@test.com"
+USER_PASSWORD = "123456"
+
+# AFM- followed by 13 Crockford base32 characters
+ORDER_NUMBER_RE = re.compile(r'^AFM-[0-9A-HJKMNP-TV-Z]{13}$')
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+@pytest.fixture(scope="module")
+def user_token(api_client):
+    """Get user authentication token"""
+    response = api_client.post(f"{API}/auth/login", json={
+        "email": USER_EMAIL,
+        "password": USER_PASSWORD
+    })
+    if response.status_code == 200:
+        return response.json().get("token")
+    pytest.skip("User authentication failed - skipping order tests")
+
+
+@pytest.fixture(scope="module")
+def stocked_product(api_client):
+    """A product that can be ordered"""
+    response = api_client.get(f"{API}/products", params={"in_stock": "true", "limit": 50})
+    assert response.status_code == 200
+    for product in response.json():
+        if product.get("stock_quantity", 0) >= 2:
+            return product
+    pytest.skip("No product in stock to order")
+
+
+def place_order(api_client, user_token, product):
+    return api_client.post(f"{API}/orders", json={
+        "items": [{"product_id": product["id"], "quantity": 1}],
+        "shipping_info": {"name": "Test User", "address": "1 Test Street", "city": "London", "postcode": "SW1A 1AA"},
+        "payment_info": {"method": "Card"},
+        "total": product["price"]
+    }, headers={"Authorization": f"Bearer {user_token}"})
+
+
+class TestOrderNumbers:
+    """Order number format tests"""
+
+    def test_order_number_format(self, api_client, user_token, stocked_product):
+        """Test new orders get a 13-character AFM- number that is also the document id"""
+        response = place_order(api_client, user_token, stocked_product)
+        assert response.status_code == 200
+        order = response.json()["order"]
+        assert ORDER_NUMBER_RE.match(order["orderId"]), order["orderId"]
+        assert order["id"] == order["orderId"]
+        print(f"✓ Order number {order['orderId']}")
+
+    def test_order_numbers_sort_by_creation(self, api_client, user_token, stocked_product):
+        """Test a later order has a larger order number"""
+        first = place_order(api_client, user_token, stocked_product).json()["order"]["orderId"]
+        second = place_order(api_client, user_token, stocked_product).json()["order"]["orderId"]
+        assert second > first
+        print(f"✓ {first} < {second}")
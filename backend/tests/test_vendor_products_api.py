@@ -0,0 +1,234 @@
+"""
+AfroMarket UK - Vendor Product API Tests
+Testing: Bulk stock and price updates, catalog import dry runs
+"""
+
+import json
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://afromarket-staging.preview.emergentagent.com')
+API = f"{BASE_URL}/api"
+
+# Test credentials
+USER_EMAIL = "user@test.com"
+USER_PASSWORD = "123456"
+# Vendor tests only run against an environment with an approved vendor account
+VENDOR_EMAIL = os.environ.get('TEST_VENDOR_EMAIL')
+VENDOR_PASSWORD = os.environ.get('TEST_VENDOR_PASSWORD')
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """Shared requests session"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+@pytest.fixture(scope="module")
+def user_token(api_client):
+    """Get user authentication token"""
+    response = api_client.post(f"{API}/auth/login", json={
+        "email": USER_EMAIL,
+        "password": USER_PASSWORD
+    })
+    if response.status_code == 200:
+        return response.json().get("token")
+    pytest.skip("User authentication failed - skipping vendor product tests")
+
+
+@pytest.fixture(scope="module")
+def vendor_token(api_client):
+    """Get vendor authentication token"""
+    if not VENDOR_EMAIL or not VENDOR_PASSWORD:
+        pytest.skip("TEST_VENDOR_EMAIL/TEST_VENDOR_PASSWORD not set - skipping vendor tests")
+    response = api_client.post(f"{API}/auth/login", json={
+        "email": VENDOR_EMAIL,
+        "password": VENDOR_PASSWORD
+    })
+    if response.status_code == 200:
+        return response.json().get("token")
+    pytest.skip("Vendor authentication failed - skipping vendor tests")
+
+
+@pytest.fixture(scope="module")
+def vendor_product(api_client, vendor_token):
+    """One of the vendor's own products"""
+    response = api_client.get(f"{API}/vendor/products", headers={"Authorization": f"Bearer {vendor_token}"})
+    assert response.status_code == 200
+    products = response.json()["products"]
+    if not products:
+        pytest.skip("Vendor has no products")
+    return products[0]
+
+
+def stock_bulk(api_client, token, items):
+    return api_client.put(
+        f"{API}/vendor/products/stock-bulk",
+        json={"items": items},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+
+def import_catalog(api_client, token, csv_body, dry_run=True):
+    return api_client.post(
+        f"{API}/vendor/products/import",
+        params={"filename": "catalog.csv", "dry_run": str(dry_run).lower()},
+        data=csv_body.encode(),
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+    )
+
+
+def parse_events(body):
+    """Server-sent events as (event, data) pairs"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return events
+
+
+class TestStockBulk:
+    """Bulk stock and price update tests"""
+
+    def test_stock_bulk_requires_auth(self, api_client):
+        """Test bulk updates need a signed-in user"""
+        response = api_client.put(f"{API}/vendor/products/stock-bulk", json={
+            "items": [{"product_id": "any", "stock_quantity": 1}]
+        })
+        assert response.status_code == 401
+        print("✓ Bulk stock update requires authentication")
+
+    def test_stock_bulk_requires_vendor(self, api_client, user_token):
+        """Test customers cannot bulk update stock"""
+        response = stock_bulk(api_client, user_token, [{"product_id": "any", "stock_quantity": 1}])
+        assert response.status_code == 403
+        print("✓ Bulk stock update requires a vendor account")
+
+    def test_stock_bulk_empty(self, api_client, vendor_token):
+        """Test an empty upload is rejected"""
+        response = stock_bulk(api_client, vendor_token, [])
+        assert response.status_code == 400
+        print("✓ Empty bulk update rejected")
+
+    def test_stock_bulk_json_update(self, api_client, vendor_token, vendor_product):
+        """Test a JSON stock change is applied and a repeat is unchanged"""
+        stock = vendor_product.get("stock_quantity", 0)
+        response = stock_bulk(api_client, vendor_token, [
+            {"product_id": vendor_product["id"], "stock_quantity": stock + 1}
+        ])
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] == True
+        assert data["results"][0]["status"] == "updated"
+        assert data["results"][0]["stock_quantity"] == stock + 1
+        assert data["summary"]["updated"] == 1
+
+        # Restore the original stock level
+        response = stock_bulk(api_client, vendor_token, [
+            {"product_id": vendor_product["id"], "stock_quantity": stock}
+        ])
+        assert response.json()["results"][0]["status"] == "updated"
+
+        response = stock_bulk(api_client, vendor_token, [
+            {"product_id": vendor_product["id"], "stock_quantity": stock}
+        ])
+        assert response.json()["results"][0]["status"] == "unchanged"
+        assert response.json()["summary"]["unchanged"] == 1
+        print(f"✓ Stock of {vendor_product['name']} updated and restored")
+
+    def test_stock_bulk_csv(self, api_client, vendor_token, vendor_product):
+        """Test a CSV upload is accepted with line-numbered results"""
+        csv_body = f"product_id,stock_quantity\n{vendor_product['id']},{vendor_product.get('stock_quantity', 0)}\n"
+        response = api_client.put(
+            f"{API}/vendor/products/stock-bulk",
+            data=csv_body.encode(),
+            headers={"Authorization": f"Bearer {vendor_token}", "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        result = response.json()["results"][0]
+        assert result["row"] == 2
+        assert result["product_id"] == vendor_product["id"]
+        assert result["status"] in ["updated", "unchanged"]
+        print("✓ CSV bulk update accepted")
+
+    def test_stock_bulk_row_errors(self, api_client, vendor_token, vendor_product):
+        """Test invalid rows are reported without stopping valid ones"""
+        response = stock_bulk(api_client, vendor_token, [
+            {"product_id": "no-such-product", "stock_quantity": 5},
+            {"product_id": vendor_product["id"], "stock_quantity": -1},
+            {"product_id": vendor_product["id"], "stock_quantity": vendor_product.get("stock_quantity", 0)}
+        ])
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["status"] == "error"
+        assert results[0]["error"] == "Product not found"
+        assert results[1]["status"] == "error"
+        assert results[2]["status"] in ["updated", "unchanged"]
+        assert response.json()["summary"]["errors"] == 2
+        print("✓ Row errors reported per row")
+
+
+class TestCatalogImport:
+    """Catalog import dry run tests"""
+
+    def test_import_requires_auth(self, api_client):
+        """Test imports need a signed-in user"""
+        response = api_client.post(
+            f"{API}/vendor/products/import",
+            params={"filename": "catalog.csv", "dry_run": "true"},
+            data=b"sku,name\n",
+            headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 401
+        print("✓ Catalog import requires authentication")
+
+    def test_import_requires_vendor(self, api_client, user_token):
+        """Test customers cannot import a catalog"""
+        response = import_catalog(api_client, user_token, "sku,name\n")
+        assert response.status_code == 403
+        print("✓ Catalog import requires an approved vendor")
+
+    def test_import_unknown_format(self, api_client, vendor_token):
+        """Test files that are neither CSV nor XLSX are rejected"""
+        response = api_client.post(
+            f"{API}/vendor/products/import",
+            params={"filename": "catalog.txt", "dry_run": "true"},
+            data=b"sku,name\n",
+            headers={"Authorization": f"Bearer {vendor_token}", "Content-Type": "text/plain"}
+        )
+        assert response.status_code == 415
+        print("✓ Unknown upload format rejected")
+
+    def test_import_dry_run(self, api_client, vendor_token):
+        """Test a dry run validates rows and reports counts without writing"""
+        sku = f"TEST-{uuid.uuid4().hex[:8]}"
+        csv_body = (
+            "sku,name,description,price,category,stock_quantity\n"
+            f"{sku},Test Plantain Chips,Dry run product,2.50,Snacks,10\n"
+            ",No SKU,Missing sku,1.00,Snacks,1\n"
+            f"{sku}-BAD,Bad Price,Price is not a number,abc,Snacks,1\n"
+            f"{sku},Duplicate,Repeated sku,2.50,Snacks,1\n"
+        )
+        response = import_catalog(api_client, vendor_token, csv_body)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = parse_events(response.text)
+        event, done = events[-1]
+        assert event == "done"
+        assert done["dry_run"] == True
+        assert done["aborted"] == False
+        assert done["created"] == 1
+        assert done["updated"] == 0
+        assert done["errors"] == 3
+        error_rows = [data["row"] for event, data in events if event == "error"]
+        assert error_rows == [3, 4, 5]
+
+        # Nothing was written
+        response = api_client.get(f"{API}/vendor/products", headers={"Authorization": f"Bearer {vendor_token}"})
+        assert all(product.get("sku") != sku for product in response.json()["products"])
+        print(f"✓ Dry run: {done['created']} valid row(s), {done['errors']} error(s)")
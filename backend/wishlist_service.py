@@ -0,0 +1,89 @@
+"""
+Wishlist Snapshots for AfroMarket UK
+Keeps the product snapshots on wishlist entries in step with the catalog
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class WishlistFanout:
+    """
+    Refreshes wishlist snapshots when a product changes
+
+    Registered as a catalog cache listener, so it runs in the worker that
+    made the change. Refreshes run in the background and are coalesced per
+    product: a burst of updates to one product (e.g. stock edits) queues
+    at most one more refresh, which writes the latest state.
+    """
+
+    def __init__(self):
+        # Latest known state per product waiting to be fanned out (None = deleted)
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.refreshes = 0
+        self.entries_written = 0
+
+    def on_product_changed(self, product: Optional[Dict], version, product_id: str = None) -> None:
+        """Catalog listener scheduling a snapshot refresh"""
+        product_id = product_id or (product or {}).get('id')
+        if not product_id:
+            return
+        self._pending[product_id] = product
+        if product_id in self._running:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._drain(product_id))
+        except RuntimeError:
+            # No event loop (e.g. scripts); the next change or read will catch up
+            self._pending.pop(product_id, None)
+            return
+        self._running.add(product_id)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, product_id: str) -> None:
+        from firestore_db import firestore_db
+
+        try:
+            while product_id in self._pending:
+                product = self._pending.pop(product_id)
+                try:
+                    if product is not None and 'name' not in product:
+                        # Partial update (e.g. stock only) - snapshot the stored product
+                        product = await firestore_db.get_product_by_id(product_id)
+                    written = await firestore_db.refresh_wishlist_snapshots(product_id, product)
+                    self.entries_written += written
+                    self.refreshes += 1
+                except Exception as e:
+                    logger.error(f"Wishlist snapshot refresh failed for product {product_id}: {e}")
+        finally:
+            self._running.discard(product_id)
+
+    async def wait(self) -> None:
+        """Wait for scheduled refreshes, e.g. before a script exits"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            'refreshes': self.refreshes,
+            'entries_written': self.entries_written,
+            'pending': len(self._pending),
+            'running': len(self._running)
+        }
+
+
+# Singleton instance
+_wishlist_fanout: Optional[WishlistFanout] = None
+
+def get_wishlist_fanout() -> WishlistFanout:
+    """Get WishlistFanout singleton instance"""
+    global _wishlist_fanout
+    if _wishlist_fanout is None:
+        _wishlist_fanout = WishlistFanout()
+    return _wishlist_fanout
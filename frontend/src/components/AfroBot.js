@@ -83,10 +83,13 @@ const AfroBot = () => {
     setShowQuickReplies(false);
 
     try {
+      // Signed-in customers can ask about their own orders by number
+      const token = localStorage.getItem('afroToken');
       const response = await fetch(`${BACKEND_URL}/api/chatbot/message`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
         },
         body: JSON.stringify({
           message: messageText.trim(),